@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Las vistas async (core/views_async.py) y el stream en vivo /live/ necesitan
+un servidor ASGI, por ejemplo: uvicorn config.asgi:application
 """
 
 import os
@@ -53,10 +53,17 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.tenancy.TenantMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.RequestMetricsMiddleware',
 ]
 
+# Métricas por request (Server-Timing + /metrics). Fracción de requests medidos
+# y cuántas repeticiones de la misma consulta se consideran N+1.
+METRICS_SAMPLE_RATE = float(os.getenv("METRICS_SAMPLE_RATE", "1.0" if DEBUG else "0.1"))
+METRICS_N_PLUS_ONE_THRESHOLD = int(os.getenv("METRICS_N_PLUS_ONE_THRESHOLD", "5"))
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -99,9 +106,39 @@ else:
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
+            # Varios procesos escribiendo (run_workers --concurrency N): se espera
+            # el lock de escritura hasta 20 s. La cola de trabajos abre sus
+            # transacciones con BEGIN IMMEDIATE (core/jobs.py)
+            "OPTIONS": {"timeout": 20},
+        }
+    }
+
+
+# Cache
+# locmem por defecto (por proceso); con CACHE_BACKEND=file se comparte entre
+# workers del mismo host sin servicios externos.
+
+if os.getenv("CACHE_BACKEND", "locmem") == "file":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("CACHE_LOCATION", str(BASE_DIR / ".cache")),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "ecoenergy",
         }
     }
 
+# Caché del dashboard por organización (core/cache.py): TTL de respaldo y
+# lock anti-estampida (segundos)
+DASHBOARD_CACHE_TTL = int(os.getenv("DASHBOARD_CACHE_TTL", "30"))
+CACHE_LOCK_TIMEOUT = int(os.getenv("CACHE_LOCK_TIMEOUT", "10"))
+CACHE_LOCK_WAIT = float(os.getenv("CACHE_LOCK_WAIT", "2"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -148,3 +185,103 @@ LOGIN_URL = "/login/"
 LOGIN_REDIRECT_URL = "/"
 LOGOUT_REDIRECT_URL = "/login/"
 
+# Paginación por cursor de los listados (core/pagination.py)
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "50"))
+LIST_MAX_PAGE_SIZE = int(os.getenv("LIST_MAX_PAGE_SIZE", "500"))
+
+# Admin sobre tablas grandes (core/pagination.py EstimatedCountPaginator y
+# los inlines acotados de core/admin.py)
+ADMIN_ESTIMATE_THRESHOLD = int(os.getenv("ADMIN_ESTIMATE_THRESHOLD", "100000"))
+ADMIN_COUNT_LIMIT = int(os.getenv("ADMIN_COUNT_LIMIT", "10000"))
+ADMIN_INLINE_PAGE_SIZE = int(os.getenv("ADMIN_INLINE_PAGE_SIZE", "20"))
+
+# Acciones masivas sobre alertas (core/workflow.py): filas por UPDATE y
+# segundos por request; lo que no entra se completa repitiendo la acción.
+ALERT_ACTION_CHUNK_SIZE = int(os.getenv("ALERT_ACTION_CHUNK_SIZE", "500"))
+ALERT_ACTION_TIME_BUDGET = float(os.getenv("ALERT_ACTION_TIME_BUDGET", "10"))
+
+# Ingesta masiva de mediciones (core/ingest.py)
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "1000"))
+INGEST_MAX_ROWS = int(os.getenv("INGEST_MAX_ROWS", "50000"))
+
+# Exportaciones en streaming (core/exports.py): filas por lectura a la base
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "2000"))
+
+# Benchmarks (manage.py benchmark y BenchmarkTests)
+BENCHMARK_BASELINE = Path(os.getenv("BENCHMARK_BASELINE", BASE_DIR / "benchmarks" / "baseline.json"))
+BENCHMARK_THRESHOLD = float(os.getenv("BENCHMARK_THRESHOLD", "0.25"))
+
+# Rollups minute/hour/day (core/rollups.py). Con ROLLUP_ON_INGEST=False se
+# actualizan solo con `manage.py rollup` (p. ej. desde cron).
+ROLLUP_BATCH_SIZE = int(os.getenv("ROLLUP_BATCH_SIZE", "10000"))
+ROLLUP_ON_INGEST = os.getenv("ROLLUP_ON_INGEST", "True") == "True"
+# Un hueco en los ids nuevos (transacción todavía sin commit) frena la marca de
+# agua hasta WATERMARK_GAP_SECONDS; después se da por definitivo y se salta.
+WATERMARK_GAP_SECONDS = float(os.getenv("WATERMARK_GAP_SECONDS", "60"))
+# Bloques por llamada cuando rollups/anomalías corren al final del request
+# (JOBS_IN_BACKGROUND=False): lo que quede lo sigue la próxima ingesta o el comando.
+INGEST_INLINE_MAX_BATCHES = int(os.getenv("INGEST_INLINE_MAX_BATCHES", "2"))
+
+# Push en vivo por SSE (core/live.py). Requiere servir con ASGI (config/asgi.py):
+# con ASGI_LIVE=False (o bajo WSGI) el dashboard no abre el stream y /live/ responde 204.
+ASGI_LIVE = os.getenv("ASGI_LIVE", "False") == "True"
+LIVE_POLL_INTERVAL = float(os.getenv("LIVE_POLL_INTERVAL", "2"))
+LIVE_HEARTBEAT = float(os.getenv("LIVE_HEARTBEAT", "15"))
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "100"))
+LIVE_MAX_BATCH = int(os.getenv("LIVE_MAX_BATCH", "200"))
+LIVE_RETRY_MS = int(os.getenv("LIVE_RETRY_MS", "3000"))
+# Como WATERMARK_GAP_SECONDS pero para el cursor del stream: más corto, porque
+# mientras el hueco espera no se emiten las filas que vienen después.
+LIVE_GAP_SECONDS = float(os.getenv("LIVE_GAP_SECONDS", "5"))
+
+# Retención de Measurement (core/retention.py, `manage.py prune_measurements`).
+# MEASUREMENT_RETENTION_DAYS rige para las organizaciones sin RetentionPolicy;
+# vacío = no se poda. PARTITION_MONTHS_AHEAD: particiones futuras (solo MySQL).
+MEASUREMENT_RETENTION_DAYS = int(os.getenv("MEASUREMENT_RETENTION_DAYS")) if os.getenv("MEASUREMENT_RETENTION_DAYS") else None
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "5000"))
+RETENTION_SOFT_DELETE_DAYS = int(os.getenv("RETENTION_SOFT_DELETE_DAYS", "30"))
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+
+# Archivo frío de mediciones (core/archive.py): .npy por dispositivo y mes
+ARCHIVE_ROOT = Path(os.getenv("ARCHIVE_ROOT", BASE_DIR / "archive"))
+
+# Serie reducida de /devices/<id>/series/ (core/series.py)
+SERIES_POINTS = int(os.getenv("SERIES_POINTS", "1000"))
+SERIES_MAX_POINTS = int(os.getenv("SERIES_MAX_POINTS", "5000"))
+SERIES_DEFAULT_HOURS = int(os.getenv("SERIES_DEFAULT_HOURS", "24"))
+
+# Estadísticas por dispositivo (core/stats.py)
+STATS_ROLLING_WINDOW = int(os.getenv("STATS_ROLLING_WINDOW", "20"))
+STATS_Z_THRESHOLD = float(os.getenv("STATS_Z_THRESHOLD", "3"))
+STATS_CACHE_TTL = int(os.getenv("STATS_CACHE_TTL", "300"))
+
+# Detección de anomalías EWMA (core/anomaly.py, `manage.py detect_anomalies`).
+# ANOMALY_Z_BANDS: |z| para medio, alto y grave. Con ANOMALY_ON_INGEST=False
+# corre solo con el comando (p. ej. `detect_anomalies --follow`).
+ANOMALY_ALPHA = float(os.getenv("ANOMALY_ALPHA", "0.05"))
+ANOMALY_MIN_SAMPLES = int(os.getenv("ANOMALY_MIN_SAMPLES", "30"))
+ANOMALY_Z_BANDS = tuple(float(z) for z in os.getenv("ANOMALY_Z_BANDS", "4,6,8").split(","))
+ANOMALY_BATCH_SIZE = int(os.getenv("ANOMALY_BATCH_SIZE", "50000"))
+ANOMALY_ON_INGEST = os.getenv("ANOMALY_ON_INGEST", "True") == "True"
+
+# Cola de trabajos en la base (core/jobs.py, `manage.py run_workers`).
+# JOBS_IN_BACKGROUND=True: la ingesta encola rollups y detección de anomalías
+# en vez de correrlos al final del request (hace falta un worker corriendo).
+JOBS_IN_BACKGROUND = os.getenv("JOBS_IN_BACKGROUND", "False") == "True"
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_BACKOFF_SECONDS = float(os.getenv("JOB_BACKOFF_SECONDS", "30"))
+JOB_BACKOFF_MAX = float(os.getenv("JOB_BACKOFF_MAX", "3600"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+JOB_HEARTBEAT = float(os.getenv("JOB_HEARTBEAT", "30"))
+JOB_STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", "300"))
+JOB_OUTPUT_ROOT = Path(os.getenv("JOB_OUTPUT_ROOT", BASE_DIR / "job_output"))
+
+# Estado materializado por dispositivo (core/device_state.py): sin lecturas
+# en DEVICE_OFFLINE_MINUTES el dispositivo figura "sin conexión".
+DEVICE_OFFLINE_MINUTES = int(os.getenv("DEVICE_OFFLINE_MINUTES", "15"))
+
+# device_list (core/device_search.py): opciones de filtros cacheadas por
+# organización y, en MySQL, largo mínimo de ?q= para usar el índice FULLTEXT
+# ngram (igual a ngram_token_size del servidor; por debajo, prefijo del nombre).
+DEVICE_FILTERS_CACHE_TTL = int(os.getenv("DEVICE_FILTERS_CACHE_TTL", "300"))
+DEVICE_SEARCH_NGRAM_MIN = int(os.getenv("DEVICE_SEARCH_NGRAM_MIN", "2"))
@@ -1,31 +1,45 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
 from django.contrib.auth.models import User
-from django.http import HttpResponse
+from django.conf import settings
+from django.db.models import Subquery
+from django.forms.models import BaseInlineFormSet
+from django.http import HttpResponse, QueryDict
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from datetime import timedelta
 import csv
+import hashlib
 
-from .models import Organization, Category, Zone, Device, Measurement, Alert, Account
+from .exports import export_response, export_rows, parse_bound, FORMAT_CSV, FORMAT_NDJSON
+from .pagination import EstimatedCountPaginator
+
+from .models import (
+    Organization, Category, Zone, Device, Measurement, Alert, Account, AlertThreshold, RetentionPolicy,
+    AnomalyState, AlertAudit, DeviceState, Job,
+)
+from .tenancy import tenant_for
+from . import workflow
 
 
 # ===============================
 # Helpers de rol / organización
 # ===============================
 
+# Leen del contexto de tenant memorizado por request (core/tenancy.py)
+
 def user_org(user):
-    acc = getattr(user, "account", None)
-    return acc.organization if acc and acc.organization_id else None
+    return tenant_for(user).organization
 
 def is_org_admin(user):
-    acc = getattr(user, "account", None)
-    return bool(acc and acc.role == Account.Role.ORG_ADMIN)
+    return tenant_for(user).role == Account.Role.ORG_ADMIN
 
 def is_member(user):
-    acc = getattr(user, "account", None)
-    return bool(acc and acc.role == Account.Role.MEMBER)
+    return tenant_for(user).role == Account.Role.MEMBER
 
 def is_verifier(user):
-    acc = getattr(user, "account", None)
-    return bool(acc and acc.role == Account.Role.VERIFIER)
+    return tenant_for(user).role == Account.Role.VERIFIER
 
 
 # ===============================
@@ -38,8 +52,13 @@ class AccountInline(admin.StackedInline):
     fk_name = "user"
     extra = 0
     fields = ("organization", "role")
+    autocomplete_fields = ("organization",)
     verbose_name_plural = "Account (Organization & Role)"
 
+    def get_queryset(self, request):
+        # Account.__str__ recorre user y organization
+        return super().get_queryset(request).select_related("user", "organization")
+
 
 class UserAdmin(DjangoUserAdmin):
     inlines = [AccountInline]
@@ -65,6 +84,40 @@ admin.site.unregister(User)
 admin.site.register(User, UserAdmin)
 
 
+# ===============================
+# Borrado lógico en el admin
+# ===============================
+
+def _show_deleted(request, model):
+    return hasattr(model, "all_objects") and request.GET.get(DeletedFilter.parameter_name) in ("deleted", "all")
+
+
+class DeletedFilter(admin.SimpleListFilter):
+    """Por defecto solo lo vivo; "Deleted"/"All" pasan a all_objects (ver get_queryset)."""
+    title = "estado"
+    parameter_name = "deleted"
+
+    def lookups(self, request, model_admin):
+        return (("deleted", "Borrados"), ("all", "Todos"))
+
+    def queryset(self, request, queryset):
+        if self.value() == "deleted":
+            return queryset.filter(deleted_at__isnull=False)
+        return queryset
+
+
+@admin.action(description="Borrar (lógico) seleccionados")
+def soft_delete_selected(modeladmin, request, queryset):
+    updated = queryset.soft_delete()
+    modeladmin.message_user(request, f"{updated} registro(s) borrados (se pueden restaurar).")
+
+
+@admin.action(description="Restaurar seleccionados")
+def restore_selected(modeladmin, request, queryset):
+    restored = queryset.restore()
+    modeladmin.message_user(request, f"{restored} registro(s) restaurados.")
+
+
 # ===============================
 # Mixin base: scoping por organización
 # ===============================
@@ -75,10 +128,23 @@ class OrgScopedAdmin(admin.ModelAdmin):
     - Org Admin: CRUD dentro de su Organization.
     - Verifier: solo lectura pero puede ejecutar acciones definidas.
     - Member: solo lectura.
+
+    Changelists sin COUNT(*) exacto: total estimado/acotado (EstimatedCountPaginator)
+    y sin el segundo conteo de "N en total".
     """
 
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
     def get_queryset(self, request):
-        qs = super().get_queryset(request)
+        if _show_deleted(request, self.model):
+            # El manager por defecto oculta lo borrado: se parte de all_objects
+            qs = self.model.all_objects.get_queryset()
+            ordering = self.get_ordering(request)
+            if ordering:
+                qs = qs.order_by(*ordering)
+        else:
+            qs = super().get_queryset(request)
         if request.user.is_superuser:
             return qs
 
@@ -90,6 +156,8 @@ class OrgScopedAdmin(admin.ModelAdmin):
             return qs.filter(organization=org)
         if hasattr(self.model, "device"):
             return qs.filter(device__organization=org)
+        if hasattr(self.model, "alert"):
+            return qs.filter(alert__device__organization=org)
         return qs.none()
 
     def has_view_permission(self, request, obj=None):
@@ -169,6 +237,20 @@ class OrgScopedAdmin(admin.ModelAdmin):
             return True
         return bool(user_org(request.user))
 
+    def get_list_filter(self, request):
+        filters = list(super().get_list_filter(request))
+        if hasattr(self.model, "all_objects"):
+            filters.insert(0, DeletedFilter)
+        return filters
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        if hasattr(self.model, "all_objects") and self.has_change_permission(request):
+            for action in (soft_delete_selected, restore_selected):
+                name = action.__name__
+                actions[name] = self.get_action(action)
+        return actions
+
 
 # ===============================
 # Admin por cada modelo
@@ -197,6 +279,7 @@ class CategoryAdmin(OrgScopedAdmin):
     list_filter = ("organization",)
     search_fields = ("name", "organization__name")
     ordering = ("name",)
+    autocomplete_fields = ("organization",)
 
 
 @admin.register(Zone)
@@ -207,15 +290,52 @@ class ZoneAdmin(OrgScopedAdmin):
     list_filter = ("organization",)
     search_fields = ("name", "organization__name")
     ordering = ("name",)
+    autocomplete_fields = ("organization",)
+
+
+class PagedInlineFormSet(BaseInlineFormSet):
+    """Formset de inline que carga una sola página de filas (page / per_page)."""
+    page = 1
+    per_page = 20
+    page_param = "page"
+    has_next = False
+
+    def get_queryset(self):
+        if not hasattr(self, "_page_queryset"):
+            qs = super().get_queryset()
+            start = (self.page - 1) * self.per_page
+            self.has_next = qs[start + self.per_page:].exists()
+            self._page_queryset = qs[start:start + self.per_page]
+            # Se evalúa ya: el formset indexa qs[i] por form y sin caché sería una query por fila
+            len(self._page_queryset)
+        return self._page_queryset
 
 
 class MeasurementInline(admin.TabularInline):
+    """
+    Últimas mediciones del dispositivo, ADMIN_INLINE_PAGE_SIZE por página
+    (?measurements_page=N); el historial completo está en el changelist.
+    """
     model = Measurement
+    formset = PagedInlineFormSet
+    template = "admin/core/device/measurement_inline.html"
+    page_param = "measurements_page"
     extra = 0
     fields = ("value", "created_at")
     readonly_fields = ("created_at",)
+    ordering = ("-created_at", "-id")
     can_delete = True
 
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        try:
+            formset.page = max(1, int(request.GET.get(self.page_param, 1)))
+        except ValueError:
+            formset.page = 1
+        formset.per_page = settings.ADMIN_INLINE_PAGE_SIZE
+        formset.page_param = self.page_param
+        return formset
+
 
 @admin.register(Device)
 class DeviceAdmin(OrgScopedAdmin):
@@ -225,16 +345,55 @@ class DeviceAdmin(OrgScopedAdmin):
     list_filter = ("organization", "category", "zone")
     search_fields = ("name", "category__name", "zone__name", "organization__name")
     ordering = ("name",)
+    autocomplete_fields = ("category", "zone", "organization")
     inlines = [MeasurementInline]
 
 
+# ===============================
+# Exportación (usa el queryset del changelist, ya acotado por get_queryset)
+# ===============================
+
+# Con "seleccionar todas" en mediciones también sale el archivo frío de los
+# dispositivos del changelist, acotado por el filtro de fecha si lo hay (igual
+# que /measurements/export/). Las filas marcadas a mano son solo esas.
+
+def _export(modeladmin, request, queryset, fmt):
+    params = QueryDict(mutable=True)
+    archived_devices = None
+    try:
+        if queryset.model is Measurement and request.POST.get("select_across") == "1":
+            params["start"] = request.GET.get("created_at__gte", "")
+            if request.GET.get("created_at__lt"):
+                # El filtro del admin es "< fecha"; end en export_rows es inclusivo
+                params["end"] = (parse_bound(request.GET["created_at__lt"]) - timedelta(microseconds=1)).isoformat()
+            archived_devices = Device.objects.filter(id__in=Subquery(queryset.order_by().values("device_id")))
+        queryset, extra_rows = export_rows(queryset, params, archived_devices)
+    except ValueError as exc:
+        modeladmin.message_user(request, str(exc), level=messages.ERROR)
+        return None
+    return export_response(queryset, fmt, modeladmin.model._meta.model_name, extra_rows)
+
+
+@admin.action(description="Exportar seleccionados a CSV")
+def export_csv(modeladmin, request, queryset):
+    return _export(modeladmin, request, queryset, FORMAT_CSV)
+
+
+@admin.action(description="Exportar seleccionados a NDJSON")
+def export_ndjson(modeladmin, request, queryset):
+    return _export(modeladmin, request, queryset, FORMAT_NDJSON)
+
+
 @admin.register(Measurement)
 class MeasurementAdmin(OrgScopedAdmin):
     list_display = ("id", "device", "value", "created_at")
     list_select_related = ("device",)
-    list_filter = ("device__organization",)
+    list_filter = ("device__organization", "created_at")
     search_fields = ("device__name",)
     ordering = ("-created_at",)
+    autocomplete_fields = ("device",)
+
+    actions = [export_csv, export_ndjson]
 
     def save_model(self, request, obj, form, change):
         obj.full_clean()
@@ -245,29 +404,223 @@ class MeasurementAdmin(OrgScopedAdmin):
 # Alert Admin con acciones
 # ===============================
 
+# Con "seleccionar todas" el queryset es el changelist filtrado completo
+# (p. ej. prioridad medio + zona + "más de 7 días"): core/workflow.py lo
+# procesa por bloques y deja registro en AlertAudit. Si no termina, el cursor
+# queda en la sesión y volver a ejecutar la misma acción sobre la misma
+# selección sigue desde ahí (no vuelve a escalar ni a posponer lo ya hecho).
+
+_WORKFLOW_SESSION_KEY = "alert_workflow_resume"
+
+
+def _selection_key(request, action):
+    """Identifica acción + selección del changelist (filtros del GET, marcadas o "todas")."""
+    selection = [
+        action,
+        request.GET.urlencode(),
+        request.POST.get("select_across", "0"),
+        ",".join(sorted(request.POST.getlist(helpers.ACTION_CHECKBOX_NAME))),
+    ]
+    return hashlib.sha1("|".join(selection).encode()).hexdigest()
+
+
+def _run_workflow(modeladmin, request, queryset, action, label, until=None):
+    key = _selection_key(request, action)
+    resume = request.session.get(_WORKFLOW_SESSION_KEY) or {}
+    after = 0
+    if resume.get("key") == key:
+        after = resume["cursor"]
+        if resume.get("until"):
+            until = parse_datetime(resume["until"])
+    updated, cursor, done = workflow.apply(action, queryset, user=request.user, until=until, after=after)
+    message = f"{updated} alerta(s) {label}."
+    if done:
+        request.session.pop(_WORKFLOW_SESSION_KEY, None)
+    else:
+        request.session[_WORKFLOW_SESSION_KEY] = {
+            "key": key, "cursor": cursor, "until": until.isoformat() if until else None,
+        }
+        message += " Quedan más: vuelve a ejecutar la acción para continuar."
+    modeladmin.message_user(request, message)
+
+
 @admin.action(description="Marcar como atendidas")
 def mark_as_acknowledged(modeladmin, request, queryset):
-    updated = queryset.update(acknowledged=True)
-    modeladmin.message_user(request, f"{updated} alerta(s) marcadas como atendidas.")
+    _run_workflow(modeladmin, request, queryset, workflow.ACKNOWLEDGE, "marcadas como atendidas")
+
+
+@admin.action(description="Escalar prioridad")
+def escalate_alerts(modeladmin, request, queryset):
+    _run_workflow(modeladmin, request, queryset, workflow.ESCALATE, "escaladas")
+
+
+@admin.action(description="Posponer 1 hora")
+def snooze_1h(modeladmin, request, queryset):
+    until = timezone.now() + timedelta(hours=1)
+    _run_workflow(modeladmin, request, queryset, workflow.SNOOZE, "pospuestas", until)
+
+
+@admin.action(description="Posponer 24 horas")
+def snooze_24h(modeladmin, request, queryset):
+    until = timezone.now() + timedelta(hours=24)
+    _run_workflow(modeladmin, request, queryset, workflow.SNOOZE, "pospuestas", until)
+
+
+@admin.action(description="Cerrar")
+def close_alerts(modeladmin, request, queryset):
+    _run_workflow(modeladmin, request, queryset, workflow.CLOSE, "cerradas")
+
+
+WORKFLOW_ACTIONS = ["mark_as_acknowledged", "escalate_alerts", "snooze_1h", "snooze_24h", "close_alerts"]
+
+
+class AgeFilter(admin.SimpleListFilter):
+    """"Más viejas que": combinado con prioridad/zona permite cerrar por filtro."""
+    title = "antigüedad"
+    parameter_name = "older_than"
+
+    def lookups(self, request, model_admin):
+        return (("1h", "Más de 1 hora"), ("24h", "Más de 24 horas"), ("7d", "Más de 7 días"), ("30d", "Más de 30 días"))
+
+    def queryset(self, request, queryset):
+        ages = {"1h": timedelta(hours=1), "24h": timedelta(hours=24), "7d": timedelta(days=7), "30d": timedelta(days=30)}
+        if self.value() in ages:
+            return queryset.filter(created_at__lt=timezone.now() - ages[self.value()])
+        return queryset
 
 
 @admin.register(Alert)
 class AlertAdmin(OrgScopedAdmin):
-    list_display = ("id", "device", "priority", "acknowledged", "created_at")
+    list_display = ("id", "device", "priority", "acknowledged", "snoozed_until", "closed_at", "created_at")
     list_select_related = ("device",)
-    list_filter = ("priority", "acknowledged", "device__organization")
+    list_filter = (
+        "priority", "acknowledged", AgeFilter, "device__zone", "device__category",
+        "device__organization", "created_at",
+    )
     search_fields = ("device__name", "message")
     ordering = ("-created_at",)
+    autocomplete_fields = ("device",)
 
-    actions = [mark_as_acknowledged]
+    actions = [
+        mark_as_acknowledged, escalate_alerts, snooze_1h, snooze_24h, close_alerts,
+        export_csv, export_ndjson,
+    ]
 
     def get_actions(self, request):
         actions = super().get_actions(request)
         if not (request.user.is_superuser or is_org_admin(request.user) or is_verifier(request.user)):
-            actions.pop("mark_as_acknowledged", None)
+            for name in WORKFLOW_ACTIONS:
+                actions.pop(name, None)
         return actions
 
 
+@admin.register(AlertAudit)
+class AlertAuditAdmin(OrgScopedAdmin):
+    # Solo lectura: lo escribe core/workflow.py
+    list_display = ("id", "alert", "action", "user", "detail", "created_at")
+    list_select_related = ("alert__device", "user")
+    list_filter = ("action", "created_at")
+    search_fields = ("alert__device__name", "user__username")
+    ordering = ("-created_at",)
+    raw_id_fields = ("alert",)
+
+    def get_queryset(self, request):
+        # Alert.__str__ (columna y campo "alert") recorre device
+        return super().get_queryset(request).select_related("alert__device", "user")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+
+@admin.register(AlertThreshold)
+class AlertThresholdAdmin(OrgScopedAdmin):
+    list_display = ("id", "category", "device", "medio", "alto", "grave", "organization")
+    list_select_related = ("category", "device", "organization")
+    list_filter = ("organization",)
+    search_fields = ("category__name", "device__name")
+    autocomplete_fields = ("category", "device", "organization")
+
+
+@admin.register(RetentionPolicy)
+class RetentionPolicyAdmin(OrgScopedAdmin):
+    list_display = ("id", "organization", "keep_days", "updated_at")
+    list_select_related = ("organization",)
+    autocomplete_fields = ("organization",)
+
+
+@admin.register(AnomalyState)
+class AnomalyStateAdmin(OrgScopedAdmin):
+    # Lo escribe core.anomaly; en el admin solo se consulta
+    list_display = ("device", "mean", "var", "count", "updated_at")
+    list_select_related = ("device",)
+    search_fields = ("device__name",)
+    readonly_fields = ("device", "mean", "var", "count", "updated_at")
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(DeviceState)
+class DeviceStateAdmin(OrgScopedAdmin):
+    # Lo mantiene core.device_state (y rebuild_device_state); en el admin solo se consulta
+    list_display = ("device", "last_value", "last_seen_at", "open_alert_count", "highest_open_priority", "updated_at")
+    list_select_related = ("device",)
+    list_filter = ("highest_open_priority",)
+    search_fields = ("device__name",)
+    readonly_fields = list_display
+
+    def has_add_permission(self, request):
+        return False
+
+
+# ===============================
+# Cola de trabajos (core/jobs.py)
+# ===============================
+
+@admin.action(description="Reintentar ahora")
+def retry_jobs(modeladmin, request, queryset):
+    updated = queryset.filter(status__in=[Job.Status.FAILED, Job.Status.CANCELLED, Job.Status.PENDING]).update(
+        status=Job.Status.PENDING, attempts=0, run_after=timezone.now(), worker="", error="",
+    )
+    modeladmin.message_user(request, f"{updated} trabajo(s) en la cola.")
+
+
+@admin.action(description="Cancelar pendientes")
+def cancel_jobs(modeladmin, request, queryset):
+    updated = queryset.filter(status=Job.Status.PENDING).update(status=Job.Status.CANCELLED, finished_at=timezone.now())
+    modeladmin.message_user(request, f"{updated} trabajo(s) cancelados.")
+
+
+@admin.register(Job)
+class JobAdmin(OrgScopedAdmin):
+    list_display = ("id", "kind", "status", "priority", "progress_display", "attempts", "run_after", "worker", "created_at")
+    list_select_related = ("organization",)
+    list_filter = ("status", "kind", "organization")
+    search_fields = ("kind", "message")
+    ordering = ("-created_at",)
+    readonly_fields = (
+        "kind", "payload", "status", "organization", "created_by", "attempts", "progress", "total", "message",
+        "result", "error", "worker", "started_at", "heartbeat_at", "finished_at", "created_at",
+    )
+    actions = [retry_jobs, cancel_jobs]
+
+    @admin.display(description="Progreso")
+    def progress_display(self, obj):
+        if obj.percent is not None:
+            return f"{obj.percent}% ({obj.progress}/{obj.total})"
+        return obj.message or "-"
+
+    def has_add_permission(self, request):
+        # Se encolan desde el código (jobs.enqueue), no a mano
+        return False
+
+
 @admin.register(Account)
 class AccountAdmin(admin.ModelAdmin):
     list_display = ("id", "user", "organization", "role")
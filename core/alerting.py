@@ -0,0 +1,139 @@
+import numpy as np
+from django.db import transaction
+
+from .models import Device, Alert, AlertThreshold
+from . import device_state
+
+
+# ===============================
+# Motor de alertas por umbrales
+# ===============================
+# Se evalúa el lote completo de mediciones con NumPy (sin bucle por lectura)
+# y se deduplica contra las alertas abiertas (acknowledged=False): solo se
+# crea una alerta si el lote alcanza una prioridad mayor a la ya abierta.
+
+PRIORITIES = ["medio", "alto", "grave"]
+PRIORITY_RANK = {p: i + 1 for i, p in enumerate(PRIORITIES)}
+
+# Lotes de ids para consultas IN (SQLite limita la cantidad de parámetros)
+_ID_CHUNK = 500
+
+
+def _chunks(ids):
+    for i in range(0, len(ids), _ID_CHUNK):
+        yield ids[i:i + _ID_CHUNK]
+
+
+def band_matrix(device_ids):
+    """
+    Matriz (len(device_ids), 3) con los umbrales medio/alto/grave de cada
+    dispositivo (NaN = sin umbral). La regla del Device reemplaza a la de su Category.
+    """
+    device_ids = [int(d) for d in device_ids]
+    bands = np.full((len(device_ids), 3), np.nan)
+
+    category_of, by_device, by_category = {}, {}, {}
+    for chunk in _chunks(device_ids):
+        category_of.update(Device.objects.filter(id__in=chunk).values_list("id", "category_id"))
+        for rule in AlertThreshold.objects.filter(device_id__in=chunk):
+            by_device[rule.device_id] = rule
+    for chunk in _chunks(sorted(set(category_of.values()))):
+        for rule in AlertThreshold.objects.filter(category_id__in=chunk):
+            by_category[rule.category_id] = rule
+
+    for i, device_id in enumerate(device_ids):
+        rule = by_device.get(device_id) or by_category.get(category_of.get(device_id))
+        if rule is not None:
+            bands[i] = [np.nan if b is None else b for b in (rule.medio, rule.alto, rule.grave)]
+    return bands
+
+
+def classify(values, row_bands):
+    """
+    Nivel por lectura: 0 = sin alerta, 1 = medio, 2 = alto, 3 = grave.
+    Las comparaciones contra NaN dan False, así que las bandas vacías no disparan.
+    """
+    with np.errstate(invalid="ignore"):
+        hits = values[:, None] >= row_bands
+    # Índice de la banda más alta alcanzada (+1), 0 si ninguna
+    reached = hits * np.arange(1, 4)
+    return reached.max(axis=1) if len(values) else np.zeros(0, dtype=np.int64)
+
+
+def open_alert_ranks(device_ids):
+    """Prioridad máxima de las alertas abiertas por dispositivo."""
+    ranks = {}
+    for chunk in _chunks([int(d) for d in device_ids]):
+        rows = (
+            Alert.objects.filter(device_id__in=chunk, acknowledged=False)
+            .values_list("device_id", "priority").distinct()
+        )
+        for device_id, priority in rows:
+            ranks[device_id] = max(ranks.get(device_id, 0), PRIORITY_RANK.get(priority, 0))
+    return ranks
+
+
+def raise_alerts(device_ids, levels, scores, message):
+    """
+    Crea como máximo una alerta por dispositivo con el nivel más alto del lote
+    (1..3, 0 = nada), si supera a la que ya tiene abierta. `scores` elige la
+    peor lectura dentro de ese nivel y message(fila, nivel) arma el texto.
+    Devuelve las alertas creadas (y las suma a DeviceState).
+    """
+    if not levels.any():
+        return []
+    unique_ids, inverse = np.unique(device_ids, return_inverse=True)
+
+    # Por dispositivo: nivel máximo del lote y la fila con el peor score en ese nivel
+    device_level = np.zeros(len(unique_ids), dtype=np.int64)
+    np.maximum.at(device_level, inverse, levels)
+    rows = np.flatnonzero(levels == device_level[inverse])
+    rows = rows[np.lexsort((scores[rows], inverse[rows]))]
+    groups = inverse[rows]
+    last = np.r_[groups[1:] != groups[:-1], True]
+    worst_row = dict(zip(groups[last].tolist(), rows[last].tolist()))
+
+    candidates = np.flatnonzero(device_level)
+    with transaction.atomic():
+        # Dos lotes concurrentes del mismo dispositivo podrían pasar ambos el
+        # chequeo de alertas abiertas: se bloquean las filas de Device (en orden
+        # de id) hasta crear las alertas. En SQLite select_for_update no hace
+        # nada; ahí la base ya serializa las transacciones que escriben.
+        for chunk in _chunks(unique_ids[candidates].tolist()):
+            list(Device.all_objects.select_for_update().filter(id__in=chunk).order_by("id").values_list("id"))
+        open_ranks = open_alert_ranks(unique_ids[candidates])
+
+        alerts = []
+        for i in candidates:
+            device_id, level = int(unique_ids[i]), int(device_level[i])
+            if open_ranks.get(device_id, 0) >= level:
+                continue
+            alerts.append(Alert(
+                device_id=device_id,
+                priority=PRIORITIES[level - 1],
+                message=message(worst_row[i], level),
+            ))
+        alerts = Alert.objects.bulk_create(alerts)
+        device_state.alerts_created(alerts)
+    return alerts
+
+
+def evaluate_batch(device_ids, values):
+    """
+    Evalúa un lote (arreglos device_ids / values) contra los umbrales y crea
+    como máximo una alerta por dispositivo: la de la prioridad más alta
+    alcanzada, si supera a la que ya tiene abierta. Devuelve las alertas creadas.
+    """
+    device_ids = np.asarray(device_ids, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    if not len(device_ids):
+        return []
+
+    unique_ids, inverse = np.unique(device_ids, return_inverse=True)
+    bands = band_matrix(unique_ids)
+    levels = classify(values, bands[inverse])
+
+    def message(row, level):
+        return f"Valor {values[row]:g} sobre el umbral {PRIORITIES[level - 1]} ({bands[inverse[row], level - 1]:g})"
+
+    return raise_alerts(device_ids, levels, values, message)
@@ -0,0 +1,256 @@
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .models import AnomalyState, Device, Measurement, RollupWatermark
+from .alerting import raise_alerts
+from .cache import invalidate_org
+from .rollups import next_high_id
+from . import live
+
+
+# ===============================
+# Detección de anomalías en streaming (EWMA)
+# ===============================
+# Por dispositivo se lleva media y varianza con promedio móvil exponencial
+# (ANOMALY_ALPHA). Cada lectura se compara con el estado ANTERIOR a ella:
+# z = (valor - media) / desvío, y |z| contra ANOMALY_Z_BANDS da medio/alto/grave.
+# El estado vive en arrays de tamaño fijo (un slot por dispositivo) dentro de
+# un Detector con __slots__, se actualiza por lotes en orden de llegada (id) y
+# se guarda en AnomalyState junto con la marca de agua en RollupWatermark: un
+# reinicio retoma desde ahí, sin releer el historial.
+
+WATERMARK_NAME = "anomaly_detector"
+
+# Lotes de ids para consultas IN (SQLite limita la cantidad de parámetros)
+_ID_CHUNK = 500
+
+# Rondas con menos dispositivos que esto pasan al bucle escalar
+_MIN_ROUND_WIDTH = 32
+
+
+class Detector:
+    """Estado EWMA en memoria de todos los dispositivos vistos."""
+
+    __slots__ = ("alpha", "min_samples", "bands", "index", "mean", "var", "count", "watermark")
+
+    def __init__(self, alpha=None, min_samples=None, bands=None, capacity=1024):
+        self.alpha = alpha or settings.ANOMALY_ALPHA
+        self.min_samples = min_samples or settings.ANOMALY_MIN_SAMPLES
+        self.bands = np.asarray(bands or settings.ANOMALY_Z_BANDS, dtype=float)
+        self.index = {}  # device_id -> slot
+        self.mean = np.zeros(capacity)
+        self.var = np.zeros(capacity)
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.watermark = None
+
+    def reset(self, watermark=None):
+        """Olvida el estado en memoria; se vuelve a cargar de AnomalyState al necesitarlo."""
+        self.index = {}
+        self.count[:] = 0
+        self.watermark = watermark
+
+    def _grow(self, size):
+        capacity = len(self.mean)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        extra = capacity - len(self.mean)
+        self.mean = np.r_[self.mean, np.zeros(extra)]
+        self.var = np.r_[self.var, np.zeros(extra)]
+        self.count = np.r_[self.count, np.zeros(extra, dtype=np.int64)]
+
+    def _slots(self, device_ids):
+        """Slot de cada lectura; los dispositivos nuevos se cargan desde el checkpoint."""
+        unique_ids, inverse = np.unique(device_ids, return_inverse=True)
+        unknown = [d for d in unique_ids.tolist() if d not in self.index]
+        if unknown:
+            first = len(self.index)
+            self._grow(first + len(unknown))
+            for offset, device_id in enumerate(unknown):
+                self.index[device_id] = first + offset
+            self.count[first:first + len(unknown)] = 0
+            for i in range(0, len(unknown), _ID_CHUNK):
+                rows = AnomalyState.objects.filter(device_id__in=unknown[i:i + _ID_CHUNK]).values_list(
+                    "device_id", "mean", "var", "count",
+                )
+                for device_id, mean, var, count in rows:
+                    slot = self.index[device_id]
+                    self.mean[slot], self.var[slot], self.count[slot] = mean, var, count
+        return np.array([self.index[d] for d in unique_ids.tolist()], dtype=np.int64)[inverse]
+
+    def _step(self, slots, x):
+        """Una lectura por slot (sin repetidos): z contra el estado previo y actualización."""
+        mean, var, count = self.mean[slots], self.var[slots], self.count[slots]
+        std = np.sqrt(var)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = (x - mean) / std
+        z = np.where((count >= self.min_samples) & (std > 1e-12), z, 0.0)
+        diff = x - mean
+        incr = self.alpha * diff
+        fresh = count == 0
+        self.mean[slots] = np.where(fresh, x, mean + incr)
+        self.var[slots] = np.where(fresh, 0.0, (1 - self.alpha) * (var + diff * incr))
+        self.count[slots] = count + 1
+        return z
+
+    def _scalar(self, slot, xs):
+        """Lo mismo que _step para muchas lecturas seguidas de UN dispositivo."""
+        alpha, keep, min_samples = self.alpha, 1 - self.alpha, self.min_samples
+        mean, var, count = float(self.mean[slot]), float(self.var[slot]), int(self.count[slot])
+        zs = []
+        for x in xs:
+            std = var ** 0.5
+            zs.append((x - mean) / std if count >= min_samples and std > 1e-12 else 0.0)
+            if count == 0:
+                mean, var = x, 0.0
+            else:
+                diff = x - mean
+                incr = alpha * diff
+                mean += incr
+                var = keep * (var + diff * incr)
+            count += 1
+        self.mean[slot], self.var[slot], self.count[slot] = mean, var, count
+        return zs
+
+    def update(self, device_ids, values):
+        """
+        Procesa el lote en orden y devuelve el z de cada lectura. Se avanza por
+        rondas (la k-ésima lectura de cada dispositivo, vectorizada); la cola de
+        rondas angostas (pocos dispositivos con muchas lecturas) va por el bucle escalar.
+        """
+        device_ids = np.asarray(device_ids, dtype=np.int64)
+        values = np.asarray(values, dtype=float)
+        n = len(values)
+        z = np.zeros(n)
+        if not n:
+            return z
+
+        slots = self._slots(device_ids)
+        order = np.argsort(slots, kind="stable")
+        sorted_slots = slots[order]
+        starts = np.flatnonzero(np.r_[True, sorted_slots[1:] != sorted_slots[:-1]])
+        counts = np.diff(np.r_[starts, n])
+        rank = np.arange(n) - np.repeat(starts, counts)
+
+        # widths[r] = dispositivos con más de r lecturas (no creciente)
+        widths = np.bincount(rank)
+        vector_rounds = int((widths >= _MIN_ROUND_WIDTH).sum())
+        by_round = np.argsort(rank, kind="stable")
+        bounds = np.r_[0, np.cumsum(widths)]
+        for r in range(vector_rounds):
+            rows = order[by_round[bounds[r]:bounds[r + 1]]]
+            z[rows] = self._step(slots[rows], values[rows])
+
+        tail = order[rank >= vector_rounds]
+        if len(tail):
+            tail_slots = slots[tail]
+            cuts = np.flatnonzero(tail_slots[1:] != tail_slots[:-1]) + 1
+            for rows in np.split(tail, cuts):
+                z[rows] = self._scalar(int(slots[rows[0]]), values[rows].tolist())
+        return z
+
+    def levels(self, z):
+        """0 = normal, 1..3 = medio/alto/grave según |z|."""
+        return np.searchsorted(self.bands, np.abs(z), side="right")
+
+    def checkpoint(self, device_ids):
+        """Guarda (upsert en bloque) el estado de esos dispositivos en AnomalyState."""
+        states = []
+        for device_id in np.unique(device_ids).tolist():
+            slot = self.index[device_id]
+            states.append(AnomalyState(
+                device_id=device_id,
+                mean=float(self.mean[slot]),
+                var=float(self.var[slot]),
+                count=int(self.count[slot]),
+            ))
+        AnomalyState.objects.bulk_create(
+            states,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=["device"],
+            update_fields=["mean", "var", "count", "updated_at"],
+        )
+
+
+_detector = None
+_lock = threading.Lock()
+
+
+def _default_detector():
+    global _detector
+    if _detector is None:
+        _detector = Detector()
+    return _detector
+
+
+def _notify(device_ids):
+    org_ids = set()
+    for i in range(0, len(device_ids), _ID_CHUNK):
+        org_ids.update(
+            Device.all_objects.filter(id__in=device_ids[i:i + _ID_CHUNK])
+            .values_list("organization_id", flat=True).distinct()
+        )
+    transaction.on_commit(lambda: invalidate_org(*org_ids))
+    transaction.on_commit(lambda: live.notify(*org_ids))
+
+
+def process(detector, device_ids, values):
+    """Pasa un lote por el detector y crea las alertas (dedupe de core.alerting)."""
+    z = detector.update(device_ids, values)
+
+    def message(row, level):
+        return f"Lectura anómala {values[row]:g} (z = {z[row]:+.1f})"
+
+    alerts = raise_alerts(device_ids, detector.levels(z), np.abs(z), message)
+    if alerts:
+        _notify(sorted({a.device_id for a in alerts}))
+    detector.checkpoint(device_ids)
+    return alerts
+
+
+def run(batch_size=None, detector=None, max_batches=None):
+    """
+    Procesa las mediciones nuevas (id mayor a la marca de agua) en bloques de
+    batch_size, cada uno en su transacción, como mucho max_batches bloques
+    (None = hasta ponerse al día). La marca de agua no pasa ids que todavía
+    pueden aparecer (rollups.next_high_id). Devuelve (mediciones, alertas creadas).
+    """
+    batch_size = batch_size or settings.ANOMALY_BATCH_SIZE
+    detector = detector or _default_detector()
+    processed = created = batches = 0
+    with _lock:
+        while max_batches is None or batches < max_batches:
+            try:
+                with transaction.atomic():
+                    watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=WATERMARK_NAME)
+                    if watermark.last_measurement_id != detector.watermark:
+                        # Otro proceso avanzó (o es el primer lote): el estado en memoria no vale
+                        detector.reset(watermark.last_measurement_id)
+                    high_id = next_high_id(watermark, batch_size)
+                    if high_id is None:
+                        break
+                    rows = list(
+                        Measurement.objects.filter(id__gt=watermark.last_measurement_id, id__lte=high_id)
+                        .order_by("id").values_list("id", "device_id", "value")
+                    )
+                    alerts = []
+                    if rows:
+                        _, device_ids, values = zip(*rows)
+                        alerts = process(detector, np.array(device_ids, dtype=np.int64), np.array(values, dtype=float))
+
+                    watermark.last_measurement_id = high_id
+                    watermark.save(update_fields=["last_measurement_id", "updated_at"])
+            except Exception:
+                # El estado en memoria pudo avanzar sin que se guarde: se recarga
+                detector.reset()
+                raise
+            detector.watermark = high_id
+            processed += len(rows)
+            created += len(alerts)
+            batches += 1
+    return processed, created
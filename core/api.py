@@ -0,0 +1,60 @@
+import base64
+from functools import wraps
+
+from django.contrib.auth import authenticate
+from django.http import JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.views.decorators.csrf import csrf_exempt
+
+
+# ===============================
+# Autenticación para endpoints JSON
+# ===============================
+
+def _basic_auth_user(request):
+    header = request.META.get("HTTP_AUTHORIZATION", "")
+    scheme, _, encoded = header.partition(" ")
+    if scheme.lower() != "basic" or not encoded:
+        return None
+    try:
+        username, _, password = base64.b64decode(encoded).decode("utf-8").partition(":")
+    except (ValueError, UnicodeDecodeError):
+        return None
+    user = authenticate(request, username=username, password=password)
+    if user is None or not user.is_active:
+        return None
+    return user
+
+
+def _session_user(request):
+    # Con sesión de navegador seguimos exigiendo el token CSRF
+    if not request.user.is_authenticated:
+        return None
+    reason = CsrfViewMiddleware(lambda req: None).process_view(request, None, (), {})
+    if reason is not None:
+        return None
+    return request.user
+
+
+def api_login_required(view_func):
+    """
+    Decorador para endpoints de la API:
+    - Dispositivos/scripts: HTTP Basic (usuario/contraseña de Django).
+    - Navegador: sesión normal + CSRF.
+    Responde 401 en JSON en vez de redirigir al login.
+    """
+    @csrf_exempt
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if "HTTP_AUTHORIZATION" in request.META:
+            user = _basic_auth_user(request)
+        else:
+            user = _session_user(request)
+        if user is None:
+            response = JsonResponse({"detail": "Authentication required."}, status=401)
+            response["WWW-Authenticate"] = 'Basic realm="api"'
+            return response
+        request.user = user
+        return view_func(request, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,159 @@
+import os
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .models import Measurement
+
+
+# ===============================
+# Archivo frío de mediciones
+# ===============================
+# Un archivo .npy por dispositivo y mes: ARCHIVE_ROOT/<device_id>/<YYYY-MM>.npy
+# con un array estructurado (id, ts en µs UTC, value) ordenado por ts, 24 bytes
+# por fila. Se guarda sin comprimir a propósito: así np.load(mmap_mode="r")
+# lee solo las páginas que toca searchsorted y el rango pedido, no el mes entero.
+# Las filas llegan acá desde retention (prune_measurements --archive /
+# archive_measurements) y se borran de la tabla después de escribir el archivo.
+#
+# Cada lote se escribe como un segmento aparte (<YYYY-MM>.<primer id>.seg.npy)
+# sin releer lo ya archivado; al terminar la corrida compact() une los
+# segmentos al archivo del mes: una reescritura por mes y corrida, no por lote.
+# Mientras tanto read() y latest() combinan archivo y segmentos.
+
+DTYPE = np.dtype([("id", "<i8"), ("ts", "<i8"), ("value", "<f8")])
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_US = timedelta(microseconds=1)
+
+
+def to_us(dt):
+    return (dt - EPOCH) // _US
+
+
+def from_us(us):
+    return EPOCH + timedelta(microseconds=int(us))
+
+
+def device_dir(device_id):
+    return Path(settings.ARCHIVE_ROOT) / str(device_id)
+
+
+def _write(path, rows):
+    # Escritura atómica: un corte a mitad de camino no deja un archivo roto
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as fh:
+        np.save(fh, rows)
+    os.replace(tmp, path)
+
+
+def _merge(parts):
+    """Une partes del mismo dispositivo: sin ids repetidos y ordenado por ts."""
+    merged = np.concatenate(parts)
+    _, first = np.unique(merged["id"], return_index=True)
+    merged = merged[first]
+    return merged[np.argsort(merged["ts"], kind="stable")]
+
+
+def write_rows(rows):
+    """
+    Agrega filas (id, device_id, created_at, value) como segmentos nuevos por
+    dispositivo/mes y devuelve los (device_id, mes) tocados, para compact().
+    Idempotente por id: si se corta antes de borrar de la base, la próxima
+    corrida reescribe el mismo segmento o lo deduplica al compactar.
+    """
+    touched = set()
+    if not rows:
+        return touched
+    device_ids = np.fromiter((r[1] for r in rows), dtype=np.int64, count=len(rows))
+    data = np.array([(r[0], to_us(r[2]), r[3]) for r in rows], dtype=DTYPE)
+    months = data["ts"].astype("datetime64[us]").astype("datetime64[M]")
+
+    for device_id in np.unique(device_ids):
+        of_device = device_ids == device_id
+        for month in np.unique(months[of_device]):
+            chunk = data[of_device & (months == month)]
+            chunk = chunk[np.argsort(chunk["ts"], kind="stable")]
+            _write(device_dir(int(device_id)) / f"{month}.{int(chunk['id'].min())}.seg.npy", chunk)
+            touched.add((int(device_id), str(month)))
+    return touched
+
+
+def _segments(device_id, month):
+    return sorted(device_dir(device_id).glob(f"{month}.*.seg.npy"))
+
+
+def compact(touched):
+    """Une los segmentos de cada (device_id, mes) al archivo del mes y los borra."""
+    for device_id, month in sorted(touched):
+        segments = _segments(device_id, month)
+        if not segments:
+            continue
+        path = device_dir(device_id) / f"{month}.npy"
+        parts = [np.load(p) for p in segments]
+        if path.exists():
+            parts.insert(0, np.load(path))
+        # Si se corta entre el replace y los unlink, los segmentos quedan repetidos: se deduplican
+        _write(path, _merge(parts))
+        for segment in segments:
+            segment.unlink()
+
+
+def _months(device_id, start=None, end=None):
+    """Meses con archivo o segmentos, de más viejo a más nuevo."""
+    folder = device_dir(device_id)
+    if not folder.is_dir():
+        return []
+    low = f"{start:%Y-%m}" if start else None
+    high = f"{end:%Y-%m}" if end else None
+    months = {path.name[:7] for path in folder.glob("*.npy")}
+    return sorted(m for m in months if (low is None or m >= low) and (high is None or m <= high))
+
+
+def _month_parts(device_id, month):
+    """Arrays del mes (archivo mapeado en memoria + segmentos sin compactar)."""
+    path = device_dir(device_id) / f"{month}.npy"
+    parts = [np.load(path, mmap_mode="r")] if path.exists() else []
+    return parts + [np.load(p, mmap_mode="r") for p in _segments(device_id, month)]
+
+
+def read(device_id, start=None, end=None):
+    """Filas archivadas del dispositivo con start <= ts <= end, ordenadas por ts."""
+    parts, segmented = [], False
+    for month in _months(device_id, start, end):
+        month_parts = _month_parts(device_id, month)
+        segmented = segmented or len(month_parts) > 1
+        for arr in month_parts:
+            ts = arr["ts"]
+            lo = int(np.searchsorted(ts, to_us(start))) if start else 0
+            hi = int(np.searchsorted(ts, to_us(end), side="right")) if end else len(arr)
+            if hi > lo:
+                parts.append(np.array(arr[lo:hi]))
+    if not parts:
+        return np.empty(0, dtype=DTYPE)
+    return _merge(parts) if segmented else np.concatenate(parts)
+
+
+def latest(device, limit):
+    """Las `limit` mediciones archivadas más nuevas (instancias sin guardar, nuevas primero)."""
+    result = []
+    for month in reversed(_months(device.id)):
+        parts = _month_parts(device.id, month)
+        arr = parts[0] if len(parts) == 1 else _merge(parts)
+        for row in arr[::-1][:limit - len(result)]:
+            result.append(Measurement(
+                id=int(row["id"]), device=device, value=float(row["value"]), created_at=from_us(row["ts"]),
+            ))
+        if len(result) >= limit:
+            break
+    return result
+
+
+def iter_export_rows(devices, start=None, end=None):
+    """Tuplas con el formato de EXPORT_FIELDS[Measurement] para (id, name) de cada dispositivo."""
+    for device_id, name in devices:
+        for row in read(device_id, start, end):
+            yield int(row["id"]), device_id, name, float(row["value"]), from_us(row["ts"])
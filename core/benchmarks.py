@@ -0,0 +1,161 @@
+import io
+import json
+import os
+import statistics
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from .models import Organization, Device, Account
+
+
+# ===============================
+# Benchmarks de las vistas
+# ===============================
+# Mide cada ruta de core.urls y los changelists del admin con el Client de
+# Django: tiempo (mediana), cantidad de queries y pico de memoria. Los
+# resultados se comparan contra un baseline JSON, que guarda también el
+# tamaño del dataset: solo se compara contra un baseline del mismo dataset.
+# Se mide con una caché propia en memoria (BENCH_CACHES): vaciarla entre
+# requests nunca toca la caché configurada del proyecto.
+
+BENCH_USERNAME = "bench@example.com"
+BENCH_PASSWORD = "bench"
+
+ADMIN_CHANGELISTS = ["device", "measurement", "alert", "category", "zone"]
+
+BENCH_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "benchmarks"},
+}
+
+
+class BaselineMismatch(Exception):
+    """El baseline se grabó con otro dataset: los números no son comparables."""
+
+
+def seed_dataset(orgs=1, devices=50, measurements_per_device=100, seed=42):
+    """Carga el dataset y devuelve sus parámetros (se guardan con el baseline)."""
+    call_command(
+        "seed", orgs=orgs, devices=devices, measurements_per_device=measurements_per_device,
+        seed=seed, rollups=True, stdout=io.StringIO(),
+    )
+    return {"orgs": orgs, "devices": devices, "measurements_per_device": measurements_per_device, "seed": seed}
+
+
+def bench_client():
+    """Cliente logueado como Org Admin (staff) de la primera organización."""
+    org = Organization.objects.order_by("id").first()
+    user, _ = User.objects.get_or_create(username=BENCH_USERNAME, defaults={"email": BENCH_USERNAME, "is_staff": True})
+    user.set_password(BENCH_PASSWORD)
+    user.is_staff = True
+    user.save()
+    Account.objects.update_or_create(user=user, defaults={"organization": org, "role": Account.Role.ORG_ADMIN})
+
+    client = Client(SERVER_NAME=settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else "testserver")
+    client.force_login(user)
+    return client, org
+
+
+def endpoints(org):
+    device = Device.objects.filter(organization=org).order_by("id").first()
+    urls = {
+        "dashboard": reverse("dashboard"),
+        "device_list": reverse("device_list"),
+        # Búsqueda por prefijo y orden por última lectura (core/device_search.py)
+        "device_list_search": reverse("device_list") + "?q=a&status=online&sort=-last_seen",
+        "measurement_list": reverse("measurement_list"),
+        "alert_list": reverse("alert_list"),
+        "alerts_week": reverse("alerts_week"),
+    }
+    if device:
+        urls["device_detail"] = reverse("device_detail", args=[device.id])
+        # Formulario con el inline de mediciones (acotado a una página)
+        urls["admin_device_change"] = reverse("admin:core_device_change", args=[device.id])
+    for model_name in ADMIN_CHANGELISTS:
+        urls[f"admin_{model_name}"] = reverse(f"admin:core_{model_name}_changelist")
+    return urls
+
+
+def measure(client, url, repeat=5):
+    """
+    Un request de calentamiento, uno bajo tracemalloc (pico de memoria) y
+    `repeat` cronometrados. La caché se vacía antes de cada uno: se mide el camino frío.
+    """
+    cache.clear()
+    client.get(url)
+
+    cache.clear()
+    tracemalloc.start()
+    response = client.get(url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings, queries = [], 0
+    for _ in range(repeat):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries = len(ctx.captured_queries)
+
+    return {
+        "status": response.status_code,
+        "wall_ms": round(statistics.median(timings), 2),
+        "queries": queries,
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(repeat=5):
+    with override_settings(CACHES=BENCH_CACHES):
+        client, org = bench_client()
+        return {name: measure(client, url, repeat) for name, url in endpoints(org).items()}
+
+
+def load_baseline(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, results, dataset):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as fh:
+        json.dump({"dataset": dataset, "results": results}, fh, indent=2, sort_keys=True)
+        fh.write("\n")
+
+
+def compare(results, baseline, threshold, dataset):
+    """
+    Lista de regresiones [(endpoint, métrica, baseline, actual)].
+    Tiempo y memoria toleran `threshold` (0.25 = +25 %); las queries no toleran ninguna extra.
+    Lanza BaselineMismatch si el baseline es de otro dataset.
+    """
+    if baseline.get("dataset") != dataset:
+        raise BaselineMismatch(
+            f"Baseline recorded with dataset {baseline.get('dataset')}, this run used {dataset}."
+        )
+    regressions = []
+    for name, current in results.items():
+        if current["status"] != 200:
+            regressions.append((name, "status", 200, current["status"]))
+        previous = baseline["results"].get(name)
+        if not previous:
+            continue
+        if current["queries"] > previous["queries"]:
+            regressions.append((name, "queries", previous["queries"], current["queries"]))
+        for metric in ("wall_ms", "peak_kb"):
+            if current[metric] > previous[metric] * (1 + threshold):
+                regressions.append((name, metric, previous[metric], current[metric]))
+    return regressions
@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+
+# ===============================
+# Caché por organización
+# ===============================
+# Cada organización tiene un número de versión en la caché que forma parte de
+# todas sus claves. Invalidar = incrementar la versión (las entradas viejas
+# quedan huérfanas y expiran solas). La "org" None es la vista global del
+# superuser, que se invalida junto con cualquier organización.
+
+GLOBAL = "all"
+
+
+def _org_key(org_id):
+    return GLOBAL if org_id is None else str(org_id)
+
+
+def _version_key(org_key):
+    return f"org:{org_key}:version"
+
+
+def org_version(org_id):
+    key = _version_key(_org_key(org_id))
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, None)
+        version = cache.get(key, 1)
+    return version
+
+
+def _bump(org_key):
+    key = _version_key(org_key)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # No existía todavía: cualquier valor distinto del inicial sirve
+        cache.set(key, int(time.time()), None)
+
+
+def invalidate_org(*org_ids):
+    """Descarta todo lo cacheado de esas organizaciones (y la vista global)."""
+    for org_id in {o for o in org_ids if o is not None}:
+        _bump(str(org_id))
+    _bump(GLOBAL)
+
+
+def org_cache_key(org_id, name):
+    return f"org:{_org_key(org_id)}:v{org_version(org_id)}:{name}"
+
+
+def cached_for_org(org_id, name, compute, ttl=None):
+    """
+    Devuelve compute() cacheado por (org, versión, name).
+
+    Protección contra estampida: la entrada guarda su propio vencimiento "blando"
+    (ttl) y vive el doble en la caché. Solo el worker que consigue el lock
+    (cache.add) recalcula; los demás sirven el valor vencido mientras tanto, o
+    si no hay ninguno esperan un poco a que aparezca.
+    """
+    ttl = ttl or settings.DASHBOARD_CACHE_TTL
+    key = org_cache_key(org_id, name)
+    entry = cache.get(key)
+    now = time.time()
+    if entry is not None and now < entry[1]:
+        return entry[0]
+
+    lock_key = f"{key}:lock"
+    if cache.add(lock_key, 1, settings.CACHE_LOCK_TIMEOUT):
+        try:
+            value = compute()
+            cache.set(key, (value, time.time() + ttl), ttl * 2)
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    if entry is not None:
+        return entry[0]
+
+    deadline = now + settings.CACHE_LOCK_WAIT
+    while time.time() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    return compute()
+
+
+async def acached_for_org(org_id, name, acompute, ttl=None):
+    """Versión async de cached_for_org: acompute es una corrutina sin argumentos."""
+    ttl = ttl or settings.DASHBOARD_CACHE_TTL
+    key = await sync_to_async(org_cache_key)(org_id, name)
+    entry = await cache.aget(key)
+    now = time.time()
+    if entry is not None and now < entry[1]:
+        return entry[0]
+
+    lock_key = f"{key}:lock"
+    if await cache.aadd(lock_key, 1, settings.CACHE_LOCK_TIMEOUT):
+        try:
+            value = await acompute()
+            await cache.aset(key, (value, time.time() + ttl), ttl * 2)
+            return value
+        finally:
+            await cache.adelete(lock_key)
+
+    if entry is not None:
+        return entry[0]
+
+    deadline = now + settings.CACHE_LOCK_WAIT
+    while time.time() < deadline:
+        await asyncio.sleep(0.05)
+        entry = await cache.aget(key)
+        if entry is not None:
+            return entry[0]
+    return await acompute()
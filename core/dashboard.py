@@ -0,0 +1,150 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Count, DateTimeField, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Device, DeviceState, Measurement, Alert, Category, Zone
+from .rollups import hourly_series, ahourly_series
+
+
+# ===============================
+# Capa de datos del dashboard
+# ===============================
+# Todas las cifras salen de consultas agrupadas: la cantidad de queries es
+# constante sin importar cuántas categorías o zonas tenga la organización.
+# Ninguna ordena en memoria (manage.py explain_dashboard lo verifica): los
+# "últimos N" recorren el índice de created_at en orden y cortan en el LIMIT.
+
+LATEST_MEASUREMENTS = 10
+RECENT_ALERTS = 5
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _owned_by(queryset, devices):
+    """
+    Filtra por dispositivo con (device_id + 0) IN (...): sin poder usar el
+    índice de device_id, la base recorre el de created_at de más nuevo a más
+    viejo y corta en el LIMIT, en vez de juntar todas las filas de la
+    organización y ordenarlas.
+    """
+    return queryset.alias(owner=F("device_id") + 0).filter(owner__in=Subquery(devices.values("id")))
+
+
+def _device_count(field):
+    """Dispositivos vivos por categoría/zona, como subconsulta correlacionada (sin GROUP BY ni sort)."""
+    devices = Device.objects.filter(**{field: OuterRef("pk")}).order_by().values(field)
+    return Coalesce(Subquery(devices.annotate(n=Count("id")).values("n")), 0)
+
+
+def dashboard_querysets(org):
+    """
+    Querysets (perezosos) del dashboard. org=None = superuser, sin filtro.
+    Lo usan la vista y el comando explain_dashboard.
+    """
+    device_filter = Q(device__deleted_at__isnull=True)
+    if org:
+        device_filter &= Q(device__organization=org)
+
+    categories = Category.objects.order_by("name")
+    zones = Zone.objects.order_by("name")
+    devices = Device.objects.select_related("category", "zone", "organization", "state")
+    states = DeviceState.objects.filter(device__deleted_at__isnull=True, last_seen_at__isnull=False)
+    weekly_alerts = Alert.objects.filter(device_filter, created_at__gte=timezone.now() - timedelta(days=7))
+
+    if org:
+        categories = categories.filter(organization=org)
+        zones = zones.filter(organization=org)
+        devices = devices.filter(organization=org)
+        states = states.filter(organization=org)
+
+    # Las últimas N mediciones son de los N dispositivos con lectura más nueva:
+    # nada es anterior a la N-ésima last_seen_at (DeviceState), y eso acota el
+    # recorrido del índice. Sin N dispositivos con lecturas no hay cota.
+    nth_seen = states.order_by("-last_seen_at").values("last_seen_at")[LATEST_MEASUREMENTS - 1:LATEST_MEASUREMENTS]
+    latest_measurements = _owned_by(Measurement.objects.select_related("device"), devices).filter(
+        created_at__gte=Coalesce(Subquery(nth_seen), Value(_EPOCH), output_field=DateTimeField()),
+    ).order_by("-created_at")
+    # Las alertas de dispositivos borrados (lógicamente) no cuentan
+    recent_alerts = _owned_by(Alert.objects.select_related("device"), devices).order_by("-created_at")
+
+    return {
+        "categories": categories.annotate(device_count=_device_count("category")),
+        "zones": zones.annotate(device_count=_device_count("zone")),
+        "devices": devices,
+        "latest_measurements": latest_measurements[:LATEST_MEASUREMENTS],
+        "recent_alerts": recent_alerts[:RECENT_ALERTS],
+        "weekly_alerts": weekly_alerts,
+    }
+
+
+def _weekly_aggregates():
+    return {
+        "grave_count": Count("id", filter=Q(priority="grave")),
+        "alto_count": Count("id", filter=Q(priority="alto")),
+        "medio_count": Count("id", filter=Q(priority="medio")),
+    }
+
+
+def weekly_counts(weekly_alerts):
+    """Grave/alto/medio de la semana en un solo SELECT con COUNT(... FILTER)."""
+    return weekly_alerts.aggregate(**_weekly_aggregates())
+
+
+def dashboard_data(org):
+    """
+    Evalúa las cifras del dashboard (6 queries, fijas). El resultado es
+    serializable: la vista lo guarda en la caché por organización.
+    """
+    qs = dashboard_querysets(org)
+    categories = list(qs["categories"])
+    zones = list(qs["zones"])
+
+    data = {
+        "categories": categories,
+        "zones": zones,
+        "devices_by_category": {c.name: c.device_count for c in categories},
+        "devices_by_zone": {z.name: z.device_count for z in zones},
+        "latest_measurements": list(qs["latest_measurements"]),
+        "recent_alerts": list(qs["recent_alerts"]),
+        "hourly_series": hourly_series(24, org=org),
+    }
+    data.update(weekly_counts(qs["weekly_alerts"]))
+    return data
+
+
+async def adashboard_data(org):
+    """
+    Igual que dashboard_data pero con el ORM async. Las consultas van una
+    detrás de otra: el ORM async pasa por un único executor thread-sensitive
+    (una conexión por request), así que lanzarlas juntas no las solapa. Lo que
+    se gana es que el event loop queda libre mientras se espera a la base.
+    """
+    qs = dashboard_querysets(org)
+
+    async def as_list(queryset):
+        return [obj async for obj in queryset]
+
+    categories = await as_list(qs["categories"])
+    zones = await as_list(qs["zones"])
+    latest = await as_list(qs["latest_measurements"])
+    recent = await as_list(qs["recent_alerts"])
+    weekly = await qs["weekly_alerts"].aaggregate(**_weekly_aggregates())
+    hourly = await ahourly_series(24, org=org)
+    data = {
+        "categories": categories,
+        "zones": zones,
+        "devices_by_category": {c.name: c.device_count for c in categories},
+        "devices_by_zone": {z.name: z.device_count for z in zones},
+        "latest_measurements": latest,
+        "recent_alerts": recent,
+        "hourly_series": hourly,
+    }
+    data.update(weekly)
+    return data
+
+
+def dashboard_devices(org):
+    """Grid de dispositivos (perezoso: la vista le aplica los filtros del GET)."""
+    return dashboard_querysets(org)["devices"]
@@ -0,0 +1,139 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Lookup
+
+from .models import Category, Device, Zone
+from . import device_state
+
+
+# ===============================
+# Búsqueda, filtros y orden de device_list
+# ===============================
+# Todo se resuelve en la base sobre índices de (organization, ...): el nombre
+# por prefijo (o el índice FULLTEXT ngram en MySQL), categorías/zonas múltiples,
+# estado materializado (DeviceState) y orden por nombre o por última lectura
+# con paginación por cursor. Las opciones de los filtros (categorías y zonas de
+# la organización) se cachean por organización y se descartan cuando cambia
+# alguna Category/Zone (core/signals.py).
+
+# Orden -> claves de paginación por cursor (siempre terminan en una clave única).
+# Por última lectura el desempate es state.device_id (no device.id): es la clave
+# que trae el índice de last_seen_at, así no hace falta ordenar en memoria.
+SORTS = {
+    "name": ("name", "id"),
+    "-name": ("-name", "-id"),
+    "-last_seen": ("-state__last_seen_at", "-state__device_id"),
+    "last_seen": ("state__last_seen_at", "state__device_id"),
+}
+DEFAULT_SORT = "name"
+
+# Largo máximo de ?q= (el nombre tiene max_length=100)
+_MAX_QUERY = 100
+
+
+class NgramMatch(Lookup):
+    """name__ngram_match=texto -> MATCH(name) AGAINST('"texto"' IN BOOLEAN MODE) (solo MySQL)."""
+
+    lookup_name = "ngram_match"
+
+    def get_db_prep_lookup(self, value, connection):
+        # Frase exacta: el parser ngram la parte en tokens consecutivos
+        return "%s", ['"' + value.replace('"', " ") + '"']
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"MATCH ({lhs}) AGAINST ({rhs} IN BOOLEAN MODE)", [*lhs_params, *rhs_params]
+
+
+Device._meta.get_field("name").register_lookup(NgramMatch)
+
+
+def _ids(values):
+    ids = []
+    for value in values:
+        try:
+            ids.append(int(value))
+        except ValueError:
+            # "all" u otro valor no numérico: se ignora
+            continue
+    return ids
+
+
+def search_name(devices, q):
+    """
+    Prefijo del nombre (sin distinguir mayúsculas), con el índice (organization, name).
+    En MySQL, desde DEVICE_SEARCH_NGRAM_MIN caracteres, usa el índice FULLTEXT
+    ngram: encuentra el texto en cualquier parte del nombre.
+    """
+    if connection.vendor == "mysql" and len(q) >= settings.DEVICE_SEARCH_NGRAM_MIN:
+        return devices.filter(name__ngram_match=q)
+    return devices.filter(name__istartswith=q)
+
+
+def filter_devices(devices, params, org=None):
+    """
+    Aplica los filtros del GET (q, category y zone repetibles, status,
+    offline_minutes, sort) a los dispositivos de org (None = superuser) y
+    devuelve (queryset, ordering, selección para la plantilla).
+    """
+    q = params.get("q", "").strip()[:_MAX_QUERY]
+    category_ids = _ids(params.getlist("category"))
+    zone_ids = _ids(params.getlist("zone"))
+    status, offline_minutes = device_state.status_params(params)
+    sort = params.get("sort", DEFAULT_SORT)
+    if sort not in SORTS:
+        sort = DEFAULT_SORT
+
+    if q:
+        devices = search_name(devices, q)
+    if category_ids:
+        devices = devices.filter(category_id__in=category_ids)
+    if zone_ids:
+        devices = devices.filter(zone_id__in=zone_ids)
+    devices = device_state.filter_status(devices, status, offline_minutes)
+    if sort.endswith("last_seen"):
+        # Filtro sobre DeviceState.organization: el orden sale recorriendo el
+        # índice (organization, last_seen_at, device) en vez de ordenar todos
+        # los dispositivos. Hay un DeviceState por dispositivo (core/signals.py,
+        # ingesta y rebuild_device_state).
+        devices = devices.filter(state__organization=org) if org else devices.filter(state__isnull=False)
+
+    selected = {
+        "q": q,
+        "categories": category_ids,
+        "zones": zone_ids,
+        "status": status,
+        "offline_minutes": offline_minutes,
+        "sort": sort,
+    }
+    return devices, SORTS[sort], selected
+
+
+def _options_key(org_id):
+    return f"device_filters:{org_id or 'all'}"
+
+
+def filter_options(org):
+    """Categorías y zonas para los filtros: [(id, name), ...], cacheadas por organización."""
+    org_id = org.id if org else None
+    key = _options_key(org_id)
+    options = cache.get(key)
+    if options is None:
+        categories = Category.objects.order_by("name")
+        zones = Zone.objects.order_by("name")
+        if org:
+            categories = categories.filter(organization=org)
+            zones = zones.filter(organization=org)
+        options = {
+            "categories": list(categories.values_list("id", "name")),
+            "zones": list(zones.values_list("id", "name")),
+        }
+        cache.set(key, options, settings.DEVICE_FILTERS_CACHE_TTL)
+    return options
+
+
+def invalidate_filter_options(org_id):
+    """Al cambiar una Category/Zone: la entrada de su organización y la global (superuser)."""
+    cache.delete_many([_options_key(org_id), _options_key(None)])
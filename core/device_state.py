@@ -0,0 +1,192 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Case, Count, DateTimeField, F, FloatField, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import Alert, Device, DeviceState, Measurement
+from . import alerting
+
+
+# ===============================
+# Estado materializado por dispositivo
+# ===============================
+# DeviceState guarda la última lectura y el resumen de alertas abiertas de cada
+# dispositivo para que device_list y el dashboard lo lean con un JOIN en vez de
+# buscar "la última medición" por dispositivo. Se mantiene al escribir:
+# - ingesta: un UPDATE por bloque, que solo avanza last_seen_at (y last_value)
+#   si la lectura es más nueva que la guardada;
+# - alertas nuevas: open_alert_count + n y GREATEST(prioridad) con F(), sin leer antes;
+# - reconocer/cerrar/escalar o borrar alertas: se recalcula el resumen de esos
+#   dispositivos con subconsultas (refresh_alerts).
+# rebuild() (manage.py rebuild_device_state) recalcula todo por conjuntos.
+
+# Lotes de ids para consultas IN (SQLite limita la cantidad de parámetros)
+_ID_CHUNK = 500
+
+# Los UPDATE con CASE llevan 3-4 parámetros por dispositivo
+_CASE_CHUNK = 200
+
+STATUSES = ["online", "offline", "alerts", "grave"]
+
+
+def _chunks(ids, size=_ID_CHUNK):
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def ensure(device_ids):
+    """Crea las filas que falten (sin tocar las existentes)."""
+    for chunk in _chunks(sorted({int(d) for d in device_ids})):
+        rows = Device.all_objects.filter(id__in=chunk).values_list("id", "organization_id")
+        DeviceState.objects.bulk_create(
+            [DeviceState(device_id=d, organization_id=org_id) for d, org_id in rows], ignore_conflicts=True,
+        )
+
+
+def _update(device_ids, create=True, **fields):
+    """
+    UPDATE idempotente sobre esos dispositivos. Lo normal es que las filas ya
+    existan (una sola query); si falta alguna se crea (create=True) y se repite.
+    """
+    rows = DeviceState.objects.filter(device_id__in=device_ids)
+    if rows.update(**fields) < len(device_ids) and create:
+        ensure(device_ids)
+        rows.update(**fields)
+
+
+def record_readings(device_ids, values, timestamps):
+    """
+    Registra un lote de lecturas (arreglos paralelos). Por dispositivo se queda
+    la más nueva del lote y se aplica solo si supera a la guardada: lotes
+    atrasados o concurrentes nunca hacen retroceder el estado.
+    """
+    latest = {}
+    for device_id, value, ts in zip(device_ids, values, timestamps):
+        device_id = int(device_id)
+        current = latest.get(device_id)
+        if current is None or ts >= current[1]:
+            latest[device_id] = (float(value), ts)
+    if not latest:
+        return
+    now = timezone.now()
+    for chunk in _chunks(sorted(latest), _CASE_CHUNK):
+        newer = [
+            Q(device_id=d) & (Q(last_seen_at__isnull=True) | Q(last_seen_at__lt=latest[d][1]))
+            for d in chunk
+        ]
+        # last_value va primero: MySQL evalúa el SET de izquierda a derecha y
+        # la condición tiene que ver el last_seen_at anterior
+        _update(
+            chunk,
+            last_value=Case(
+                *[When(cond, then=Value(latest[d][0])) for cond, d in zip(newer, chunk)],
+                default=F("last_value"), output_field=FloatField(),
+            ),
+            last_seen_at=Case(
+                *[When(cond, then=Value(latest[d][1])) for cond, d in zip(newer, chunk)],
+                default=F("last_seen_at"), output_field=DateTimeField(),
+            ),
+            updated_at=now,
+        )
+
+
+def alerts_created(alerts):
+    """Suma alertas nuevas (abiertas) al resumen de sus dispositivos."""
+    by_device = {}
+    for alert in alerts:
+        count, rank = by_device.get(alert.device_id, (0, 0))
+        by_device[alert.device_id] = (count + 1, max(rank, alerting.PRIORITY_RANK.get(alert.priority, 0)))
+    if not by_device:
+        return
+    ensure(by_device)
+    # Un UPDATE por combinación (cantidad, prioridad): casi siempre una o tres
+    groups = {}
+    for device_id, key in by_device.items():
+        groups.setdefault(key, []).append(device_id)
+    now = timezone.now()
+    for (count, rank), ids in groups.items():
+        for chunk in _chunks(sorted(ids)):
+            DeviceState.objects.filter(device_id__in=chunk).update(
+                open_alert_count=F("open_alert_count") + count,
+                highest_open_priority=Greatest(F("highest_open_priority"), Value(rank)),
+                updated_at=now,
+            )
+
+
+def _rank():
+    whens = [When(priority=p, then=Value(r)) for p, r in alerting.PRIORITY_RANK.items()]
+    return Case(*whens, default=Value(0), output_field=IntegerField())
+
+
+def refresh_alerts(device_ids, create=True):
+    """
+    Recalcula cantidad y prioridad máxima de alertas abiertas de esos
+    dispositivos. Con create=True crea las filas que falten; desde un borrado
+    va create=False: el dispositivo puede estar borrándose en la misma transacción.
+    """
+    open_alerts = Alert.objects.filter(device_id=OuterRef("device_id"), acknowledged=False).order_by()
+    count = open_alerts.values("device_id").annotate(n=Count("id")).values("n")[:1]
+    rank = open_alerts.annotate(rank=_rank()).order_by("-rank").values("rank")[:1]
+    now = timezone.now()
+    for chunk in _chunks(sorted({int(d) for d in device_ids})):
+        _update(
+            chunk,
+            create=create,
+            open_alert_count=Coalesce(Subquery(count), 0),
+            highest_open_priority=Coalesce(Subquery(rank), 0),
+            updated_at=now,
+        )
+
+
+def rebuild(batch_size=None):
+    """
+    Recalcula el estado de todos los dispositivos (incluidos los archivados)
+    desde Measurement y Alert, por rangos de ids. Devuelve cuántos procesó.
+    """
+    batch_size = batch_size or _ID_CHUNK
+    latest = Measurement.objects.filter(device_id=OuterRef("device_id")).order_by("-created_at", "-id")
+    device = Device.all_objects.filter(id=OuterRef("device_id"))
+    device_ids = list(Device.all_objects.order_by("id").values_list("id", flat=True))
+    for chunk in _chunks(device_ids, batch_size):
+        # refresh_alerts crea las filas que falten
+        refresh_alerts(chunk)
+        DeviceState.objects.filter(device_id__in=chunk).update(
+            last_value=Subquery(latest.values("value")[:1]),
+            last_seen_at=Subquery(latest.values("created_at")[:1]),
+            organization_id=Subquery(device.values("organization_id")[:1]),
+            updated_at=timezone.now(),
+        )
+    return len(device_ids)
+
+
+def status_params(params):
+    """?status= y ?offline_minutes= de device_list (valores inválidos: todos / DEVICE_OFFLINE_MINUTES)."""
+    status = params.get("status", "all")
+    if status not in STATUSES:
+        status = "all"
+    try:
+        minutes = int(params.get("offline_minutes", ""))
+    except ValueError:
+        minutes = 0
+    return status, minutes if minutes > 0 else settings.DEVICE_OFFLINE_MINUTES
+
+
+def filter_status(devices, status, offline_minutes):
+    """
+    Filtra un queryset de Device por estado: online / offline (sin lecturas en
+    offline_minutes, o nunca) / alerts (alguna alerta abierta) / grave.
+    """
+    cutoff = timezone.now() - timedelta(minutes=offline_minutes)
+    if status == "online":
+        return devices.filter(state__last_seen_at__gte=cutoff)
+    if status == "offline":
+        return devices.filter(
+            Q(state__isnull=True) | Q(state__last_seen_at__isnull=True) | Q(state__last_seen_at__lt=cutoff)
+        )
+    if status == "alerts":
+        return devices.filter(state__open_alert_count__gt=0)
+    if status == "grave":
+        return devices.filter(state__highest_open_priority__gte=alerting.PRIORITY_RANK["grave"])
+    return devices
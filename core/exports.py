@@ -0,0 +1,163 @@
+import csv
+import itertools
+import json
+from datetime import datetime, time
+
+from django.conf import settings
+from django.db import connections
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Measurement, Alert
+from . import archive
+
+
+# ===============================
+# Exportación en streaming (CSV / NDJSON)
+# ===============================
+# Se recorren tuplas de values_list por bloques, sin instanciar modelos ni
+# armar la respuesta completa en memoria: el consumo es el mismo para 1k o 50M filas.
+
+FORMAT_CSV = "csv"
+FORMAT_NDJSON = "ndjson"
+
+EXPORT_FIELDS = {
+    Measurement: ("id", "device_id", "device__name", "value", "created_at"),
+    Alert: ("id", "device_id", "device__name", "priority", "acknowledged", "message", "created_at"),
+}
+
+
+class Echo:
+    """Pseudo-buffer para csv.writer: devuelve la línea en vez de guardarla."""
+    def write(self, value):
+        return value
+
+
+def parse_bound(raw, end=False):
+    """
+    Fecha ("2026-01-10") o fecha/hora ISO. Una fecha sola abarca el día
+    entero: como end es inclusiva hasta las 23:59:59.999999. ValueError si no parsea.
+    """
+    if not raw:
+        return None
+    # La fecha va primero: parse_datetime también acepta "2026-01-10" (como 00:00)
+    day = parse_date(raw)
+    if day is not None:
+        dt = datetime.combine(day, time.max if end else time.min)
+    else:
+        dt = parse_datetime(raw)
+        if dt is None:
+            raise ValueError(f"Invalid date: {raw}")
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
+
+
+def export_bounds(params):
+    """
+    (start, end, device_ids) de ?start=&end= (fecha o fecha/hora ISO) y
+    ?device= (repetible). Lanza ValueError con parámetros inválidos.
+    """
+    start = parse_bound(params.get("start"))
+    end = parse_bound(params.get("end"), end=True)
+    try:
+        device_ids = [int(d) for d in params.getlist("device") if d]
+    except ValueError:
+        raise ValueError("Invalid device id.")
+    return start, end, device_ids
+
+
+def filter_export(queryset, params):
+    """Aplica los filtros comunes de export_bounds al queryset."""
+    start, end, device_ids = export_bounds(params)
+    if start:
+        queryset = queryset.filter(created_at__gte=start)
+    if end:
+        queryset = queryset.filter(created_at__lte=end)
+    if device_ids:
+        queryset = queryset.filter(device_id__in=device_ids)
+    return queryset
+
+
+def export_rows(queryset, params, archived_devices=None):
+    """
+    (queryset filtrado, extra_rows) para ?start=&end=&device=. Lo comparten el
+    export sync, el Job "export" y el admin: mismos filtros, mismo archivo. archived_devices:
+    dispositivos cuyo archivo frío se emite antes de las filas vivas.
+    Lanza ValueError con parámetros inválidos.
+    """
+    start, end, device_ids = export_bounds(params)
+    queryset = filter_export(queryset, params)
+    if queryset.model is Alert:
+        # Como en alert_list: las alertas de dispositivos borrados no se exportan
+        # (las mediciones ya caen con el dispositivo en el borrado lógico)
+        queryset = queryset.filter(device__deleted_at__isnull=True)
+    extra_rows = None
+    if archived_devices is not None:
+        if device_ids:
+            archived_devices = archived_devices.filter(id__in=device_ids)
+        extra_rows = archive.iter_export_rows(
+            archived_devices.order_by("id").values_list("id", "name").iterator(), start, end,
+        )
+    return queryset, extra_rows
+
+
+def iter_values(queryset, fields, chunk_size=None):
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    queryset = queryset.order_by("pk")
+    if connections[queryset.db].vendor == "mysql":
+        # El driver de MySQL bufferiza el resultado completo: recorremos por bloques de pk
+        last_pk = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk).values_list("pk", *fields)[:chunk_size])
+            if not batch:
+                return
+            for row in batch:
+                yield row[1:]
+            last_pk = batch[-1][0]
+    else:
+        yield from queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+def _csv_lines(rows, header):
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _json_default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _ndjson_lines(rows, header):
+    for row in rows:
+        yield json.dumps(dict(zip(header, row)), default=_json_default, ensure_ascii=False) + "\n"
+
+
+def export_lines(queryset, fmt, extra_rows=None):
+    """Líneas de texto del export. extra_rows: tuplas con el mismo formato que se emiten antes."""
+    fields = EXPORT_FIELDS[queryset.model]
+    header = [f.replace("__", "_") for f in fields]
+    rows = iter_values(queryset, fields)
+    if extra_rows is not None:
+        rows = itertools.chain(extra_rows, rows)
+    if fmt == FORMAT_NDJSON:
+        return _ndjson_lines(rows, header)
+    return _csv_lines(rows, header)
+
+
+def export_response(queryset, fmt, filename, extra_rows=None):
+    """extra_rows: tuplas con el mismo formato que se emiten antes (p. ej. el archivo frío)."""
+    lines = export_lines(queryset, fmt, extra_rows)
+    if fmt == FORMAT_NDJSON:
+        response = StreamingHttpResponse(lines, content_type="application/x-ndjson")
+        filename = f"{filename}.ndjson"
+    else:
+        response = StreamingHttpResponse(lines, content_type="text/csv")
+        filename = f"{filename}.csv"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
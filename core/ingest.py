@@ -0,0 +1,300 @@
+import csv
+import io
+import json
+import logging
+import re
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Device, Measurement
+from .rollups import refresh_rollups
+from .cache import invalidate_org
+from .alerting import evaluate_batch
+from . import anomaly, device_state, jobs, live
+
+logger = logging.getLogger(__name__)
+
+
+# ===============================
+# Ingesta masiva de mediciones
+# ===============================
+
+FORMAT_CSV = "csv"
+FORMAT_NDJSON = "ndjson"
+
+# Lotes de ids para consultas IN (SQLite limita la cantidad de parámetros)
+_ID_CHUNK = 500
+
+
+# Los ids van a un arreglo int64
+_MAX_ID = np.iinfo(np.int64).max
+
+_WHITESPACE = re.compile(r"\s*")
+
+
+class IngestError(Exception):
+    """El payload completo no se puede interpretar (no es un rechazo por fila)."""
+
+
+def detect_format(content_type, requested=None):
+    if requested in (FORMAT_CSV, FORMAT_NDJSON):
+        return requested
+    if content_type in ("text/csv", "application/csv"):
+        return FORMAT_CSV
+    return FORMAT_NDJSON
+
+
+def _iter_records(body, fmt):
+    """
+    Devuelve tuplas (fila, dict | None, error | None).
+    Las filas se numeran desde 1 (en CSV sin contar el encabezado).
+    """
+    try:
+        text = body.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise IngestError("Payload must be UTF-8.")
+
+    if fmt == FORMAT_CSV:
+        reader = csv.DictReader(io.StringIO(text))
+        if not reader.fieldnames or not {"device", "value"} <= set(reader.fieldnames):
+            raise IngestError("CSV header must include 'device' and 'value'.")
+        for row_no, record in enumerate(reader, start=1):
+            yield row_no, record, None
+        return
+
+    stripped = text.strip()
+    if stripped.startswith("["):
+        # También aceptamos un arreglo JSON clásico, leído elemento por elemento
+        for row_no, record in enumerate(_iter_json_array(stripped), start=1):
+            if isinstance(record, dict):
+                yield row_no, record, None
+            else:
+                yield row_no, None, "Row must be a JSON object."
+        return
+
+    row_no = 0
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        row_no += 1
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield row_no, None, "Invalid JSON line."
+            continue
+        if isinstance(record, dict):
+            yield row_no, record, None
+        else:
+            yield row_no, None, "Row must be a JSON object."
+
+
+def _iter_json_array(text):
+    """
+    Elementos de un arreglo JSON de a uno (raw_decode), sin armar la lista
+    completa: parse_batch corta en INGEST_MAX_ROWS sin decodificar el resto.
+    """
+    decoder = json.JSONDecoder()
+    pos = _WHITESPACE.match(text, 1).end()
+    if text.startswith("]", pos):
+        pos += 1
+    else:
+        while True:
+            try:
+                record, pos = decoder.raw_decode(text, pos)
+            except ValueError:
+                raise IngestError("Invalid JSON array.")
+            yield record
+            pos = _WHITESPACE.match(text, pos).end()
+            if text.startswith(",", pos):
+                pos = _WHITESPACE.match(text, pos + 1).end()
+            elif text.startswith("]", pos):
+                pos += 1
+                break
+            else:
+                raise IngestError("Invalid JSON array.")
+    if text[pos:].strip():
+        raise IngestError("Invalid JSON array.")
+
+
+def _to_int(raw):
+    """Id de dispositivo; -1 (rechazo por fila) si no es un entero que entre en int64."""
+    if isinstance(raw, bool):
+        return -1
+    try:
+        value = int(raw)
+    except (TypeError, ValueError, OverflowError):
+        return -1
+    return value if 0 < value <= _MAX_ID else -1
+
+
+def _to_float(raw):
+    if raw is None or raw == "":
+        return np.nan
+    try:
+        return float(raw)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _to_datetime(raw, default):
+    if raw in (None, ""):
+        return default
+    try:
+        dt = parse_datetime(str(raw))
+    except ValueError:
+        return None
+    if dt is None:
+        return None
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
+
+
+def parse_batch(body, fmt, max_rows=None):
+    """
+    Convierte el payload en arreglos columnares:
+    rows, device_ids, values, timestamps y errores de parseo por fila.
+    Corta apenas se pasa de max_rows (INGEST_MAX_ROWS), sin parsear el resto.
+    """
+    max_rows = max_rows or settings.INGEST_MAX_ROWS
+    now = timezone.now()
+    rows, device_ids, values, timestamps, parse_errors = [], [], [], [], {}
+
+    for row_no, record, error in _iter_records(body, fmt):
+        if row_no > max_rows:
+            raise IngestError(f"Batch too large (max {max_rows} rows).")
+        rows.append(row_no)
+        if error:
+            parse_errors[row_no] = {"row": error}
+            device_ids.append(-1)
+            values.append(np.nan)
+            timestamps.append(None)
+            continue
+        device_ids.append(_to_int(record.get("device")))
+        values.append(_to_float(record.get("value")))
+        ts = _to_datetime(record.get("created_at"), now)
+        if ts is None:
+            parse_errors[row_no] = {"created_at": "Invalid datetime."}
+        timestamps.append(ts)
+
+    return (
+        np.asarray(rows, dtype=np.int64),
+        np.asarray(device_ids, dtype=np.int64),
+        np.asarray(values, dtype=np.float64),
+        timestamps,
+        parse_errors,
+    )
+
+
+def _allowed_device_ids(device_ids, org):
+    """Ids (del lote) que existen y pertenecen a la organización."""
+    unique_ids = np.unique(device_ids[device_ids > 0]).tolist()
+    allowed = []
+    for i in range(0, len(unique_ids), _ID_CHUNK):
+        qs = Device.objects.filter(id__in=unique_ids[i:i + _ID_CHUNK])
+        if org:
+            qs = qs.filter(organization=org)
+        allowed.extend(qs.values_list("id", flat=True))
+    return np.asarray(allowed, dtype=np.int64)
+
+
+def _organization_ids(device_ids):
+    unique_ids = np.unique(device_ids).tolist()
+    org_ids = set()
+    for i in range(0, len(unique_ids), _ID_CHUNK):
+        org_ids.update(
+            Device.objects.filter(id__in=unique_ids[i:i + _ID_CHUNK])
+            .values_list("organization_id", flat=True).distinct()
+        )
+    return list(org_ids)
+
+
+def validate_batch(device_ids, values, org):
+    """
+    Validación vectorizada de todo el lote (misma regla que Measurement.clean).
+    Devuelve las máscaras (ok_device, ok_value).
+    """
+    ok_device = np.isin(device_ids, _allowed_device_ids(device_ids, org))
+    with np.errstate(invalid="ignore"):
+        ok_value = (
+            np.isfinite(values)
+            & (values >= Measurement.VALUE_MIN)
+            & (values <= Measurement.VALUE_MAX)
+        )
+    return ok_device, ok_value
+
+
+def _deferred(kind, fn):
+    """
+    Con JOBS_IN_BACKGROUND se encola un Job (uno pendiente alcanza) en vez de
+    correr fn en el request. Si corre en el request (on_commit) se acota a
+    INGEST_INLINE_MAX_BATCHES bloques y un error solo se registra: las
+    mediciones ya están guardadas y la marca de agua retoma en la próxima corrida.
+    """
+    if settings.JOBS_IN_BACKGROUND:
+        return lambda: jobs.enqueue(kind, unique=True)
+
+    def run():
+        try:
+            fn(max_batches=settings.INGEST_INLINE_MAX_BATCHES)
+        except Exception:
+            logger.exception("%s after ingest failed", kind)
+    return run
+
+
+def ingest(body, fmt, org=None, batch_size=None):
+    """
+    Inserta las filas válidas con bulk_create por bloques, evalúa los umbrales
+    de alerta sobre el lote y devuelve:
+    {"accepted": n, "rejected": [{"row": i, "errors": {...}}, ...], "alerts_created": k}
+    Las filas inválidas no abortan el resto del lote.
+    """
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    rows, device_ids, values, timestamps, parse_errors = parse_batch(body, fmt)
+
+    ok_device, ok_value = validate_batch(device_ids, values, org)
+    ok_parse = np.ones(len(rows), dtype=bool)
+    if parse_errors:
+        ok_parse[np.isin(rows, list(parse_errors))] = False
+    ok = ok_device & ok_value & ok_parse
+
+    rejected = []
+    value_msg = f"Value must be between {Measurement.VALUE_MIN} and {Measurement.VALUE_MAX}."
+    for i in np.flatnonzero(~ok):
+        row_no = int(rows[i])
+        errors = dict(parse_errors.get(row_no, {}))
+        if "row" not in errors:
+            if not ok_device[i]:
+                errors["device"] = "Unknown device."
+            if not ok_value[i]:
+                errors["value"] = value_msg
+        rejected.append({"row": row_no, "errors": errors})
+
+    accepted_idx = np.flatnonzero(ok)
+    with transaction.atomic():
+        if len(accepted_idx):
+            # bulk_create no dispara post_save: caché y stream en vivo a mano
+            org_ids = [org.id] if org else _organization_ids(device_ids[accepted_idx])
+            transaction.on_commit(lambda: invalidate_org(*org_ids))
+            transaction.on_commit(lambda: live.notify(*org_ids))
+        if settings.ROLLUP_ON_INGEST and len(accepted_idx):
+            transaction.on_commit(_deferred("refresh_rollups", refresh_rollups))
+        if settings.ANOMALY_ON_INGEST and len(accepted_idx):
+            transaction.on_commit(_deferred("detect_anomalies", anomaly.run))
+        for start in range(0, len(accepted_idx), batch_size):
+            chunk = accepted_idx[start:start + batch_size]
+            Measurement.objects.bulk_create(
+                [
+                    Measurement(device_id=int(device_ids[i]), value=float(values[i]), created_at=timestamps[i])
+                    for i in chunk
+                ],
+                batch_size=batch_size,
+            )
+        device_state.record_readings(device_ids[accepted_idx], values[accepted_idx], [timestamps[i] for i in accepted_idx])
+        alerts = evaluate_batch(device_ids[accepted_idx], values[accepted_idx])
+
+    return {"accepted": int(len(accepted_idx)), "rejected": rejected, "alerts_created": len(alerts)}
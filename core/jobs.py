@@ -0,0 +1,319 @@
+import logging
+import os
+import socket
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from django.http import QueryDict
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+# ===============================
+# Cola de trabajos en la base
+# ===============================
+# Sin Redis ni Celery: los trabajos son filas de Job. Un worker elige los
+# próximos pendientes (prioridad, run_after) y los toma con
+#   UPDATE core_job SET status='running' ... WHERE id=%s AND status='pending'
+# solo el UPDATE que afecta 1 fila gana, así que varios workers (o procesos)
+# nunca corren el mismo trabajo, igual en SQLite que en MySQL. Mientras corre,
+# un hilo actualiza heartbeat_at; si un worker muere, su trabajo vuelve a la
+# cola pasado JOB_STALE_AFTER. Los errores se reintentan con backoff exponencial.
+# En SQLite esas escrituras van en transacciones BEGIN IMMEDIATE (_write_lock).
+
+Status = Job.Status
+
+_TASKS = {}
+
+# Candidatos que se prueban por vuelta (si otro worker gana uno se pasa al siguiente)
+_CLAIM_CANDIDATES = 10
+
+
+@contextmanager
+def _write_lock():
+    """
+    atomic() que en SQLite empieza con BEGIN IMMEDIATE: toma el lock de
+    escritura al empezar y espera (OPTIONS timeout) en vez de fallar con
+    "database is locked" al pasar de lectura a escritura cuando varios workers
+    compiten. Solo acá: el resto de las transacciones siguen siendo DEFERRED.
+    """
+    if connection.vendor != "sqlite" or connection.in_atomic_block:
+        with transaction.atomic():
+            yield
+        return
+    # get_connection_params() reinicia transaction_mode al conectar
+    connection.ensure_connection()
+    mode = connection.transaction_mode
+    connection.transaction_mode = "IMMEDIATE"
+    try:
+        with transaction.atomic():
+            connection.transaction_mode = mode
+            yield
+    finally:
+        connection.transaction_mode = mode
+
+
+def task(name):
+    """Registra fn(job, **payload) como el trabajo `name`. Lo que devuelve queda en Job.result."""
+    def register(fn):
+        _TASKS[name] = fn
+        return fn
+    return register
+
+
+def enqueue(kind, payload=None, priority=0, organization=None, user=None, run_after=None,
+            max_attempts=None, unique=False):
+    """
+    Crea un Job pendiente. unique=True: si ya hay uno pendiente del mismo
+    tipo y payload se devuelve ese (útil para rollups o anomalías, que procesan
+    todo lo nuevo de una vez).
+    """
+    if kind not in _TASKS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    payload = payload or {}
+    if unique:
+        existing = Job.objects.filter(kind=kind, status=Status.PENDING, payload=payload).first()
+        if existing:
+            return existing
+    return Job.objects.create(
+        kind=kind,
+        payload=payload,
+        priority=priority,
+        organization=organization,
+        created_by=user if getattr(user, "is_authenticated", False) else None,
+        run_after=run_after or timezone.now(),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+def report(job, progress, total=None, message=None):
+    """Avance del trabajo (visible en el admin y en /api/jobs/<id>/)."""
+    fields = {"progress": progress, "heartbeat_at": timezone.now()}
+    if total is not None:
+        fields["total"] = total
+    if message is not None:
+        fields["message"] = message[:200]
+    Job.objects.filter(id=job.id).update(**fields)
+    for name, value in fields.items():
+        setattr(job, name, value)
+
+
+def claim(worker):
+    """Toma el próximo trabajo pendiente o devuelve None."""
+    now = timezone.now()
+    with _write_lock():
+        candidates = list(
+            Job.objects.filter(status=Status.PENDING, run_after__lte=now)
+            .order_by("-priority", "run_after", "id")
+            .values_list("id", flat=True)[:_CLAIM_CANDIDATES]
+        )
+        for job_id in candidates:
+            won = Job.objects.filter(id=job_id, status=Status.PENDING).update(
+                status=Status.RUNNING, worker=worker, attempts=F("attempts") + 1,
+                started_at=now, heartbeat_at=now, finished_at=None,
+            )
+            if won:
+                return Job.objects.get(id=job_id)
+    return None
+
+
+def requeue_stale(now=None):
+    """Vuelve a la cola los trabajos 'running' sin heartbeat reciente (worker caído)."""
+    now = now or timezone.now()
+    stale = Job.objects.filter(
+        status=Status.RUNNING, heartbeat_at__lt=now - timedelta(seconds=settings.JOB_STALE_AFTER),
+    )
+    with _write_lock():
+        failed = stale.filter(attempts__gte=F("max_attempts")).update(
+            status=Status.FAILED, error="Worker lost (no heartbeat).", finished_at=now,
+        )
+        return failed + stale.update(status=Status.PENDING, worker="", run_after=now)
+
+
+def backoff(attempts):
+    return min(settings.JOB_BACKOFF_SECONDS * 2 ** (attempts - 1), settings.JOB_BACKOFF_MAX)
+
+
+class _Heartbeat(threading.Thread):
+    """Marca heartbeat_at cada JOB_HEARTBEAT segundos mientras el trabajo corre."""
+
+    def __init__(self, job_id):
+        super().__init__(daemon=True)
+        self.job_id = job_id
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(settings.JOB_HEARTBEAT):
+                try:
+                    Job.objects.filter(id=self.job_id, status=Status.RUNNING).update(heartbeat_at=timezone.now())
+                except DatabaseError:
+                    # SQLite bloqueado por la escritura del propio trabajo: se reintenta en la próxima vuelta
+                    pass
+        finally:
+            connection.close()
+
+
+def run_job(job):
+    """Ejecuta un trabajo ya tomado y deja su estado final (o lo reprograma)."""
+    mine = Job.objects.filter(id=job.id, status=Status.RUNNING, worker=job.worker)
+    fn = _TASKS.get(job.kind)
+    if fn is None:
+        mine.update(status=Status.FAILED, error=f"Unknown job kind: {job.kind}", finished_at=timezone.now())
+        return
+    heartbeat = _Heartbeat(job.id)
+    heartbeat.start()
+    try:
+        result = fn(job, **job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning("Job %s (%s) failed, attempt %s/%s", job.id, job.kind, job.attempts, job.max_attempts)
+        now = timezone.now()
+        with _write_lock():
+            if job.attempts < job.max_attempts:
+                mine.update(status=Status.PENDING, error=error, worker="", run_after=now + timedelta(seconds=backoff(job.attempts)))
+            else:
+                mine.update(status=Status.FAILED, error=error, finished_at=now)
+    else:
+        with _write_lock():
+            mine.update(status=Status.DONE, result=result, error="", finished_at=timezone.now())
+    finally:
+        heartbeat.stopped.set()
+        heartbeat.join()
+
+
+def worker_name(index=0):
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+def work(name=None, burst=False, poll_interval=None, stop=None):
+    """
+    Bucle de un worker: toma y ejecuta trabajos hasta que `stop` (Event) se
+    active. burst=True: termina cuando la cola queda vacía. Devuelve cuántos corrió.
+    """
+    name = name or worker_name()
+    poll_interval = settings.JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+    stop = stop or threading.Event()
+    ran = 0
+    while not stop.is_set():
+        requeue_stale()
+        job = claim(name)
+        if job is None:
+            if burst:
+                break
+            stop.wait(poll_interval)
+            continue
+        run_job(job)
+        ran += 1
+    return ran
+
+
+# ===============================
+# Trabajos disponibles
+# ===============================
+# Los imports van dentro de cada función: ingest/views importan este módulo.
+
+@task("refresh_rollups")
+def _refresh_rollups(job, batch_size=None):
+    from .rollups import refresh_rollups
+    return {"aggregated": refresh_rollups(batch_size)}
+
+
+@task("detect_anomalies")
+def _detect_anomalies(job, batch_size=None):
+    from . import anomaly
+    processed, created = anomaly.run(batch_size)
+    return {"processed": processed, "alerts_created": created}
+
+
+@task("prune_measurements")
+def _prune_measurements(job, org_ids=None, batch_size=None, dry_run=False, archive=False):
+    from .retention import prune
+    report(job, 0, message="Podando mediciones")
+    result = prune(org_ids=org_ids, batch_size=batch_size, dry_run=dry_run, archive=archive)
+    return {
+        "deleted": {str(org_id): n for org_id, n in result["deleted"].items()},
+        "soft_deleted": result["soft_deleted"],
+    }
+
+
+@task("alert_action")
+def _alert_action(job, action, filter, until=None):
+    """
+    La misma acción de /api/alerts/bulk/, continuada con el cursor hasta
+    terminar. Solo toca las alertas que ya existían al empezar: cada vuelta
+    avanza al menos un bloque, así que alcanza con total / bloque vueltas.
+    """
+    from .models import Alert
+    from . import workflow
+    alerts = Alert.objects.all()
+    if job.organization_id:
+        alerts = alerts.filter(device__organization_id=job.organization_id)
+    alerts = workflow.filter_alerts(alerts, filter)
+    alerts = alerts.filter(id__lte=alerts.order_by("-id").values_list("id", flat=True).first() or 0)
+    until = parse_datetime(until) if until else None
+    total = workflow.eligible(action, alerts, until).count()
+    chunk_size = settings.ALERT_ACTION_CHUNK_SIZE
+    updated, cursor, done = 0, 0, False
+    for _ in range(total // chunk_size + 1):
+        n, cursor, done = workflow.apply(
+            action, alerts, user=job.created_by, until=until, chunk_size=chunk_size, after=cursor,
+        )
+        updated += n
+        report(job, updated, total)
+        if done:
+            break
+    return {"updated": updated, "done": done}
+
+
+EXPORT_MODELS = ("measurement", "alert")
+
+
+@task("export")
+def _export(job, model, query="", format="csv"):
+    """Export CSV/NDJSON a JOB_OUTPUT_ROOT/<id>.<format> (se baja por /api/jobs/<id>/download/)."""
+    from .models import Alert, Device, Measurement
+    from . import exports
+    params = QueryDict(query)
+    archived_devices = None
+    if model == "measurement":
+        queryset = Measurement.objects.all()
+        archived_devices = Device.objects.all()
+        if job.organization_id:
+            archived_devices = archived_devices.filter(organization_id=job.organization_id)
+    else:
+        queryset = Alert.objects.all()
+    if job.organization_id:
+        queryset = queryset.filter(device__organization_id=job.organization_id)
+    queryset, extra_rows = exports.export_rows(queryset, params, archived_devices)
+
+    total = queryset.count()
+    report(job, 0, total, "Exportando")
+    path = export_path(job, format)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    written = 0
+    with open(tmp, "w", encoding="utf-8", newline="") as fh:
+        for line in exports.export_lines(queryset, format, extra_rows):
+            fh.write(line)
+            written += 1
+            if written % settings.EXPORT_CHUNK_SIZE == 0:
+                report(job, written, max(total, written))
+    os.replace(tmp, path)
+    report(job, written, written, "Listo")
+    return {"file": path.name, "lines": written}
+
+
+def export_path(job, fmt=None):
+    fmt = fmt or job.payload.get("format", "csv")
+    return settings.JOB_OUTPUT_ROOT / f"{job.id}.{fmt}"
+
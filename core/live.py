@@ -0,0 +1,229 @@
+import asyncio
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+
+from .models import Measurement, Alert
+from .rollups import _contiguous
+
+logger = logging.getLogger(__name__)
+
+
+# ===============================
+# Push en vivo (Server-Sent Events)
+# ===============================
+# Un canal por organización y por proceso: una sola tarea consulta las filas
+# nuevas (id > último visto) y reparte el evento ya serializado a la cola de
+# cada cliente conectado. N pestañas abiertas = 1 consulta, no N dashboards.
+#
+# La tarea se despierta con notify() (on_commit de las escrituras de este
+# proceso) o cada LIVE_POLL_INTERVAL segundos, que cubre lo escrito por otros
+# workers o por comandos (seed, ingest desde otro proceso).
+# Canal None = superuser, ve todas las organizaciones.
+#
+# El cursor por modelo sigue la misma regla de huecos que los rollups
+# (core/rollups.py): los ids no llegan en orden de commit, así que no pasa un
+# hueco de la secuencia global hasta que lleva LIVE_GAP_SECONDS. Un error de
+# base en una vuelta se registra y se reintenta en la siguiente.
+
+_channels = {}  # org_id -> _OrgChannel
+
+
+def _measurement_event(m):
+    return "measurement", {
+        "id": m.id,
+        "device_id": m.device_id,
+        "device": m.device.name,
+        "value": m.value,
+        "created_at": m.created_at.isoformat(),
+    }
+
+
+def _alert_event(a):
+    return "alert", {
+        "id": a.id,
+        "device_id": a.device_id,
+        "device": a.device.name,
+        "priority": a.priority,
+        "message": a.message,
+        "created_at": a.created_at.isoformat(),
+    }
+
+
+def format_event(kind, data):
+    return f"event: {kind}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class _Cursor:
+    """Marca de agua en memoria de un modelo: último id emitido y desde cuándo hay un hueco pegado."""
+
+    def __init__(self, last_id=0):
+        self.last_id = last_id
+        self.gap_seen_at = None
+
+    async def next_high_id(self, model, batch_size):
+        """
+        Último id del próximo bloque que ya se puede emitir, o None. Igual que
+        rollups.next_high_id pero sobre todas las filas (de cualquier
+        organización, también las borradas): el bloque se corta en el primer
+        hueco y un hueco pegado al cursor se salta pasados LIVE_GAP_SECONDS.
+        """
+        ids = [
+            i async for i in model._base_manager.filter(id__gt=self.last_id)
+            .order_by("id").values_list("id", flat=True)[:batch_size]
+        ]
+        if not ids:
+            self.gap_seen_at = None
+            return None
+        now = time.monotonic()
+        ready = _contiguous(ids, self.last_id + 1)
+        if ready == 0:
+            if self.gap_seen_at is None:
+                self.gap_seen_at = now
+                return None
+            if now - self.gap_seen_at < settings.LIVE_GAP_SECONDS:
+                return None
+            ready = _contiguous(ids, ids[0])
+        self.gap_seen_at = now if ready < len(ids) else None
+        return ids[ready - 1]
+
+
+class _OrgChannel:
+    def __init__(self, org_id, loop):
+        self.org_id = org_id
+        self.loop = loop
+        self.subscribers = set()
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.cursors = {Measurement: _Cursor(), Alert: _Cursor()}
+
+    def _scoped(self, model):
+        qs = model.objects.select_related("device")
+        if self.org_id is not None:
+            qs = qs.filter(device__organization_id=self.org_id)
+        return qs
+
+    async def start(self):
+        """Solo interesa lo que llegue desde ahora: los cursores arrancan en el último id."""
+        for model in self.cursors:
+            last_id = await model._base_manager.order_by("-id").values_list("id", flat=True).afirst()
+            self.cursors[model] = _Cursor(last_id or 0)
+
+    async def poll(self):
+        """Eventos nuevos hasta donde la secuencia de ids no tiene huecos (ya formateados)."""
+        events = []
+        for model, to_event in ((Measurement, _measurement_event), (Alert, _alert_event)):
+            cursor = self.cursors[model]
+            high_id = await cursor.next_high_id(model, settings.LIVE_MAX_BATCH)
+            if high_id is None:
+                continue
+            rows = self._scoped(model).filter(id__gt=cursor.last_id, id__lte=high_id).order_by("id")
+            async for row in rows:
+                events.append(format_event(*to_event(row)))
+            cursor.last_id = high_id
+        return events
+
+    def publish(self, event):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Cliente lento: se vacía su cola y se le cierra el stream;
+                # EventSource reconecta solo.
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+                self.subscribers.discard(queue)
+
+    async def run(self):
+        started = False
+        while self.subscribers:
+            if started:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), settings.LIVE_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self.wakeup.clear()
+            try:
+                if not started:
+                    await self.start()
+                    started = True
+                    continue
+                events = await self.poll()
+            except Exception:
+                # Base caída o similar: si la tarea muriera, los clientes solo
+                # recibirían keepalives. Se registra y se reintenta.
+                logger.exception("Live poll failed (org %s)", self.org_id)
+                if not started:
+                    await asyncio.sleep(settings.LIVE_POLL_INTERVAL)
+                continue
+            for event in events:
+                self.publish(event)
+
+
+def subscribe(org_id):
+    """Registra un cliente en el canal de org_id; devuelve (canal, cola)."""
+    loop = asyncio.get_running_loop()
+    channel = _channels.get(org_id)
+    if channel is None or channel.loop is not loop:
+        channel = _channels[org_id] = _OrgChannel(org_id, loop)
+    queue = asyncio.Queue(maxsize=settings.LIVE_QUEUE_SIZE)
+    channel.subscribers.add(queue)
+    if channel.task is None or channel.task.done():
+        channel.task = loop.create_task(channel.run())
+    return channel, queue
+
+
+def unsubscribe(channel, queue):
+    channel.subscribers.discard(queue)
+    if not channel.subscribers:
+        if channel.task is not None:
+            channel.task.cancel()
+        if _channels.get(channel.org_id) is channel:
+            del _channels[channel.org_id]
+
+
+def notify(*org_ids):
+    """
+    Despierta los canales de esas organizaciones (y el de superuser). Se puede
+    llamar desde cualquier hilo: normalmente desde transaction.on_commit.
+    """
+    for org_id in {*org_ids, None}:
+        channel = _channels.get(org_id)
+        if channel is None:
+            continue
+        try:
+            channel.loop.call_soon_threadsafe(channel.wakeup.set)
+        except RuntimeError:
+            # Loop ya cerrado: el canal quedó huérfano
+            _channels.pop(org_id, None)
+
+
+def enabled(request):
+    """
+    True si el stream está activo (ASGI_LIVE) y la request llegó por ASGI. Bajo
+    WSGI cada cliente conectado ocuparía un worker mientras dure la conexión.
+    """
+    return settings.ASGI_LIVE and isinstance(request, ASGIRequest)
+
+
+async def event_stream(org_id):
+    """Cuerpo de la respuesta text/event-stream de un cliente."""
+    channel, queue = subscribe(org_id)
+    try:
+        yield f"retry: {settings.LIVE_RETRY_MS}\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), settings.LIVE_HEARTBEAT)
+            except asyncio.TimeoutError:
+                # Comentario SSE: mantiene viva la conexión a través de proxies
+                yield ": keepalive\n\n"
+                continue
+            if event is None:
+                break
+            yield event
+    finally:
+        unsubscribe(channel, queue)
@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.core.management.base import CommandError
+from django.utils import timezone
+
+from core.management.commands.prune_measurements import Command as PruneCommand
+from core.retention import archive_before
+
+
+class Command(PruneCommand):
+    help = "Move measurements older than a cutoff to the per-device monthly cold archive"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, required=True, help="Archive measurements older than this many days")
+        parser.add_argument("--org", type=int, action="append", dest="org_ids", help="Only this organization id (repeatable)")
+        parser.add_argument("--batch-size", type=int, help="Rows archived per transaction")
+        parser.add_argument("--sleep", type=float, default=0, help="Seconds to pause between batches")
+        parser.add_argument("--dry-run", action="store_true", help="Only count what would be archived")
+
+    def handle(self, *args, **options):
+        if options["days"] < 0:
+            raise CommandError("--days must be zero or positive.")
+        result = archive_before(
+            timezone.now() - timedelta(days=options["days"]),
+            org_ids=options["org_ids"],
+            batch_size=options["batch_size"],
+            sleep=options["sleep"],
+            dry_run=options["dry_run"],
+        )
+        self.report(result, {**options, "archive": True})
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from core import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Seed a throwaway test database, time every view and admin changelist, and compare against a JSON baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orgs", type=int, default=1)
+        parser.add_argument("--devices", type=int, default=50)
+        parser.add_argument("--measurements-per-device", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=5, help="Timed requests per endpoint")
+        parser.add_argument("--baseline", default=str(settings.BENCHMARK_BASELINE))
+        parser.add_argument("--threshold", type=float, default=settings.BENCHMARK_THRESHOLD,
+                            help="Allowed slowdown / memory growth (0.25 = +25%%)")
+        parser.add_argument("--update-baseline", action="store_true", help="Write the results as the new baseline")
+        parser.add_argument("--keepdb", action="store_true", help="Keep the benchmark database between runs")
+
+    def handle(self, *args, **options):
+        # Nunca se toca la base real: se crea la base de test de Django
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options["keepdb"])
+        try:
+            dataset = benchmarks.seed_dataset(options["orgs"], options["devices"], options["measurements_per_device"])
+            results = benchmarks.run_benchmarks(options["repeat"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options["keepdb"])
+            teardown_test_environment()
+
+        self.stdout.write(f"{'endpoint':<22}{'status':>7}{'wall ms':>10}{'queries':>9}{'peak KB':>10}")
+        for name, r in results.items():
+            self.stdout.write(f"{name:<22}{r['status']:>7}{r['wall_ms']:>10}{r['queries']:>9}{r['peak_kb']:>10}")
+
+        if options["update_baseline"]:
+            benchmarks.save_baseline(options["baseline"], results, dataset)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+            return
+
+        baseline = benchmarks.load_baseline(options["baseline"])
+        if baseline is None:
+            self.stdout.write(self.style.WARNING(f"No baseline at {options['baseline']} (use --update-baseline)."))
+            return
+
+        try:
+            regressions = benchmarks.compare(results, baseline, options["threshold"], dataset)
+        except benchmarks.BaselineMismatch as exc:
+            raise CommandError(f"{exc} Re-run with the same --orgs/--devices/--measurements-per-device or --update-baseline.")
+        for name, metric, before, after in regressions:
+            self.stdout.write(self.style.ERROR(f"REGRESSION {name} {metric}: {before} -> {after}"))
+        if regressions:
+            raise CommandError(f"{len(regressions)} performance regression(s) against the baseline.")
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
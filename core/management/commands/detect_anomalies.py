@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.anomaly import run
+
+
+class Command(BaseCommand):
+    help = "Run new measurements (newer than the stored watermark) through the EWMA anomaly detector"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, help="Measurements per transaction")
+        parser.add_argument("--follow", action="store_true", help="Keep polling for new measurements")
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds between polls with --follow")
+
+    def handle(self, *args, **options):
+        while True:
+            processed, created = run(options["batch_size"])
+            if processed or not options["follow"]:
+                self.stdout.write(self.style.SUCCESS(f"{processed} measurement(s) checked, {created} alert(s) created."))
+            if not options["follow"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,83 @@
+import json
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.dashboard import dashboard_querysets
+from core.models import Organization
+
+
+def _sqlite_full_scans(plan):
+    # "SCAN tabla" sin índice = recorrido completo; "SEARCH" o "USING INDEX" están bien.
+    # "USE TEMP B-TREE" = ordena/agrupa en memoria todas las filas que encontró
+    # (p. ej. todas las mediciones de la organización para quedarse con 10).
+    scans = []
+    for line in plan.splitlines():
+        match = re.search(r"\bSCAN (\w+)(.*)", line)
+        if match and "USING" not in match.group(2):
+            scans.append(match.group(1))
+        sort = re.search(r"USE TEMP B-TREE FOR ([\w ]+)", line)
+        if sort:
+            scans.append(f"temp b-tree ({sort.group(1).strip().lower()})")
+    return scans
+
+
+def _mysql_full_scans(plan):
+    scans = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            table = node.get("table")
+            if isinstance(table, dict) and table.get("access_type") == "ALL":
+                scans.append(table.get("table_name", "?"))
+            # ordering_operation / grouping_operation que ordenan en memoria
+            if node.get("using_filesort") or node.get("using_temporary_table"):
+                scans.append("filesort")
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(json.loads(plan))
+    return scans
+
+
+class Command(BaseCommand):
+    help = "Run EXPLAIN on every dashboard query and fail if any of them does a full table scan or an in-memory sort"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--org", type=int, help="Organization id (default: the first one)")
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        vendor = connections[options["database"]].vendor
+        if vendor not in ("sqlite", "mysql"):
+            raise CommandError(f"Unsupported database vendor: {vendor}")
+
+        orgs = Organization.objects.using(options["database"])
+        org = orgs.filter(id=options["org"]).first() if options["org"] else orgs.order_by("id").first()
+        if org is None:
+            raise CommandError("No organization found to explain the dashboard for.")
+
+        failures = []
+        for label, qs in dashboard_querysets(org).items():
+            qs = qs.using(options["database"])
+            if vendor == "mysql":
+                plan = qs.explain(format="JSON")
+                scans = _mysql_full_scans(plan)
+            else:
+                plan = qs.explain()
+                scans = _sqlite_full_scans(plan)
+
+            if options["verbosity"] > 1:
+                self.stdout.write(f"--- {label}\n{plan}")
+            if scans:
+                failures.append(label)
+                self.stdout.write(self.style.ERROR(f"FULL SCAN  {label}: {', '.join(scans)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"OK         {label}"))
+
+        if failures:
+            raise CommandError(f"{len(failures)} dashboard query(ies) fall back to a full scan or sort: {', '.join(failures)}")
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from core.retention import prune
+
+
+class Command(BaseCommand):
+    help = "Delete measurements older than each organization's retention (after rolling them up)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--org", type=int, action="append", dest="org_ids", help="Only this organization id (repeatable)")
+        parser.add_argument("--batch-size", type=int, help="Rows deleted per transaction")
+        parser.add_argument("--sleep", type=float, default=0, help="Seconds to pause between batches")
+        parser.add_argument("--dry-run", action="store_true", help="Only count what would be deleted")
+        parser.add_argument("--archive", action="store_true", help="Move expired rows to the cold archive instead of deleting them")
+
+    def handle(self, *args, **options):
+        result = prune(
+            org_ids=options["org_ids"],
+            batch_size=options["batch_size"],
+            sleep=options["sleep"],
+            dry_run=options["dry_run"],
+            archive=options["archive"],
+        )
+        self.report(result, options)
+
+    def report(self, result, options):
+        verb = "archived" if options.get("archive") else "deleted"
+        if options["dry_run"]:
+            verb = f"would be {verb}"
+        if result["rollups"]:
+            self.stdout.write(f"{result['rollups']} measurement(s) aggregated into rollups first.")
+        for name in result["partitions_created"]:
+            self.stdout.write(f"Partition {name} created.")
+        for name in result["partitions_dropped"]:
+            self.stdout.write(f"Partition {name} {'would be dropped' if options['dry_run'] else 'dropped'}.")
+        for org_id, n in sorted(result["deleted"].items()):
+            self.stdout.write(f"Organization {org_id}: {n} measurement(s) {verb}.")
+        if result["soft_deleted"]:
+            purged = "would be deleted" if options["dry_run"] else "deleted"
+            self.stdout.write(f"{result['soft_deleted']} soft-deleted measurement(s) {purged}.")
+        self.stdout.write(self.style.SUCCESS(f"{sum(result['deleted'].values())} measurement(s) {verb}."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.device_state import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute DeviceState (last reading and open alerts) for every device from Measurement and Alert"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, help="Devices per UPDATE")
+
+    def handle(self, *args, **options):
+        processed = rebuild(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"{processed} device state(s) rebuilt."))
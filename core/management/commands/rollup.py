@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.rollups import refresh_rollups, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Aggregate new measurements (newer than the stored watermark) into minute/hour/day rollups"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, help="Measurements per transaction")
+        parser.add_argument("--rebuild", action="store_true", help="Drop all rollups and recompute from scratch (loses history of pruned measurements)")
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            processed = rebuild_rollups(options["batch_size"])
+        else:
+            processed = refresh_rollups(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"{processed} measurement(s) aggregated into rollups."))
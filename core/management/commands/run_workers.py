@@ -0,0 +1,64 @@
+import multiprocessing
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.jobs import work, worker_name
+
+
+def _worker_main(index, burst, poll_interval):
+    # Con el método "spawn" el proceso hijo arranca sin Django configurado
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    signal.signal(signal.SIGINT, lambda *args: stop.set())
+    work(worker_name(index), burst=burst, poll_interval=poll_interval, stop=stop)
+
+
+class Command(BaseCommand):
+    help = "Run background job workers (DB-backed queue, see core/jobs.py)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=1, help="Worker processes")
+        parser.add_argument("--burst", action="store_true", help="Exit when the queue is empty")
+        parser.add_argument("--poll-interval", type=float, help="Seconds between polls of an empty queue")
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options["concurrency"])
+        burst, poll_interval = options["burst"], options["poll_interval"]
+
+        if concurrency == 1:
+            stop = threading.Event()
+            signal.signal(signal.SIGTERM, lambda *args: stop.set())
+            try:
+                ran = work(worker_name(), burst=burst, poll_interval=poll_interval, stop=stop)
+            except KeyboardInterrupt:
+                return
+            self.stdout.write(self.style.SUCCESS(f"{ran} job(s) run."))
+            return
+
+        # Cada proceso abre sus propias conexiones: no se heredan las del padre
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=_worker_main, args=(i, burst, poll_interval), name=f"worker-{i}")
+            for i in range(concurrency)
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f"{concurrency} worker(s) started.")
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            # Cada worker termina el trabajo en curso antes de salir
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
+        self.stdout.write(self.style.SUCCESS("Workers stopped."))
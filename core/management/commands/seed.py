@@ -1,61 +1,180 @@
-import random
-from datetime import datetime, timedelta
-from django.core.management.base import BaseCommand
+import time
+from datetime import timezone as dt_timezone
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core import device_state
+from core.cache import invalidate_org
 from core.models import Organization, Category, Zone, Device, Measurement, Alert
+from core.rollups import refresh_rollups
+
+CATEGORY_NAMES = ["Temperature Sensors", "Humidity Sensors", "Pressure Sensors"]
+ZONE_NAMES = ["Factory A", "Factory B"]
+ALERT_MESSAGES = {
+    "grave": "Temperatura muy alta",
+    "alto": "Nivel de batería bajo",
+    "medio": "Chequeo rutinario",
+}
+
+# PRAGMAs de carga masiva para SQLite (se restauran al terminar)
+SQLITE_LOAD_PRAGMAS = {"synchronous": "OFF", "cache_size": "-200000", "temp_store": "MEMORY"}
+
 
 class Command(BaseCommand):
-    help = "Populate database with sample data"
-
-    def handle(self, *args, **kwargs):
-        # lipio la base
-        Organization.objects.all().delete()
-        Category.objects.all().delete()
-        Zone.objects.all().delete()
-        Device.objects.all().delete()
-        Measurement.objects.all().delete()
-        Alert.objects.all().delete()
-
-        #  organización
-        org = Organization.objects.create(name="TechCorp")
-
-        #  categorías
-        categories = [
-            Category.objects.create(name="Temperature Sensors", organization=org),
-            Category.objects.create(name="Humidity Sensors", organization=org),
-            Category.objects.create(name="Pressure Sensors", organization=org),
-        ]
-
-        #  zonas
-        zones = [
-            Zone.objects.create(name="Factory A", organization=org),
-            Zone.objects.create(name="Factory B", organization=org),
-        ]
-
-        #  dispositivos
-        devices = []
-        for i in range(1, 11):
-            device = Device.objects.create(
-                name=f"Device {i}",
-                category=random.choice(categories),
-                zone=random.choice(zones),
-                organization=org
+    help = "Populate the database with synthetic data (load generator for capacity testing)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orgs", type=int, default=1)
+        parser.add_argument("--devices", type=int, default=10, help="Devices per organization")
+        parser.add_argument("--measurements-per-device", type=int, default=10)
+        parser.add_argument("--days", type=float, default=7, help="Spread timestamps over the last N days")
+        parser.add_argument("--alerts-ratio", type=float, default=0.15,
+                            help="Alerts to create, as a fraction of the measurements")
+        parser.add_argument("--seed", type=int, default=None, help="Random seed (deterministic output)")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--no-flush", action="store_true", help="Keep existing data")
+        parser.add_argument("--rollups", action="store_true", help="Aggregate rollups after loading")
+
+    def handle(self, *args, **options):
+        for name in ("orgs", "devices", "batch_size"):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be positive.")
+        if options["measurements_per_device"] < 0:
+            raise CommandError("--measurements-per-device must be zero or positive.")
+        if options["days"] <= 0:
+            raise CommandError("--days must be positive.")
+        if not 0 <= options["alerts_ratio"] <= 1:
+            raise CommandError("--alerts-ratio must be between 0 and 1.")
+
+        self.rng = np.random.default_rng(options["seed"])
+        self.verbosity = options["verbosity"]
+        self.batch_size = options["batch_size"]
+        self.now = timezone.now()
+        self.span_seconds = options["days"] * 86400
+        started = time.perf_counter()
+
+        previous = self._tune_sqlite()
+        try:
+            with transaction.atomic():
+                if not options["no_flush"]:
+                    self._flush()
+                orgs, device_ids = self._create_devices(options["orgs"], options["devices"])
+                n_measurements = self._create_measurements(device_ids, options["measurements_per_device"])
+                n_alerts = self._create_alerts(device_ids, round(n_measurements * options["alerts_ratio"]))
+        finally:
+            self._restore_sqlite(previous)
+
+        # bulk_create no dispara las señales que mantienen DeviceState:
+        # se recalcula por conjuntos (última lectura y alertas abiertas)
+        device_state.rebuild()
+        invalidate_org(*[o.id for o in orgs])
+        if options["rollups"]:
+            refresh_rollups()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {len(orgs)} org(s), {len(device_ids)} device(s), {n_measurements} measurement(s), "
+            f"{n_alerts} alert(s) inserted in {elapsed:.1f}s"
+        ))
+
+    # -------------------------------
+    # SQLite
+    # -------------------------------
+
+    def _tune_sqlite(self):
+        # synchronous no se puede cambiar dentro de una transacción (p. ej. en tests)
+        if connection.vendor != "sqlite" or connection.in_atomic_block:
+            return {}
+        previous = {}
+        with connection.cursor() as cursor:
+            for pragma, value in SQLITE_LOAD_PRAGMAS.items():
+                cursor.execute(f"PRAGMA {pragma}")
+                previous[pragma] = cursor.fetchone()[0]
+                cursor.execute(f"PRAGMA {pragma} = {value}")
+        return previous
+
+    def _restore_sqlite(self, previous):
+        if not previous:
+            return
+        with connection.cursor() as cursor:
+            for pragma, value in previous.items():
+                cursor.execute(f"PRAGMA {pragma} = {value}")
+
+    # -------------------------------
+    # Carga
+    # -------------------------------
+
+    def _flush(self):
+        # Measurement/Alert tienen receptores de señales: un .delete() del ORM los
+        # traería fila por fila. Se borran con DELETE directo y el resto con el ORM.
+        with connection.cursor() as cursor:
+            for model in (Alert, Measurement):
+                cursor.execute(f"DELETE FROM {connection.ops.quote_name(model._meta.db_table)}")
+        Device.all_objects.all().delete()
+        Category.all_objects.all().delete()
+        Zone.all_objects.all().delete()
+        # Las organizaciones con cuentas asociadas (PROTECT) se conservan
+        Organization.all_objects.filter(account__isnull=True).delete()
+
+    def _create_devices(self, n_orgs, per_org):
+        orgs, device_ids = [], []
+        for i in range(n_orgs):
+            org = Organization.objects.create(name="TechCorp" if i == 0 else f"TechCorp {i + 1}")
+            categories = [Category.objects.create(name=n, organization=org) for n in CATEGORY_NAMES]
+            zones = [Zone.objects.create(name=n, organization=org) for n in ZONE_NAMES]
+            cat_idx = self.rng.integers(0, len(categories), per_org)
+            zone_idx = self.rng.integers(0, len(zones), per_org)
+            Device.objects.bulk_create(
+                [
+                    Device(name=f"Device {j + 1}", category=categories[c], zone=zones[z], organization=org)
+                    for j, (c, z) in enumerate(zip(cat_idx, zone_idx))
+                ],
+                batch_size=self.batch_size,
+            )
+            # MySQL no devuelve los ids de bulk_create: se releen
+            device_ids.extend(Device.objects.filter(organization=org).order_by("id").values_list("id", flat=True))
+            orgs.append(org)
+        return orgs, np.asarray(device_ids, dtype=np.int64)
+
+    def _timestamps(self, n):
+        offsets = self.rng.uniform(0, self.span_seconds, n)
+        naive_now = np.datetime64(self.now.replace(tzinfo=None), "us")
+        stamps = (naive_now - (offsets * 1e6).astype("timedelta64[us]")).tolist()
+        return [ts.replace(tzinfo=dt_timezone.utc) for ts in stamps]
+
+    def _create_measurements(self, device_ids, per_device):
+        total = len(device_ids) * per_device
+        for start in range(0, total, self.batch_size):
+            n = min(self.batch_size, total - start)
+            owners = device_ids[np.arange(start, start + n) // per_device].tolist()
+            values = np.round(self.rng.uniform(10.0, 100.0, n), 2).tolist()
+            Measurement.objects.bulk_create(
+                [
+                    Measurement(device_id=d, value=v, created_at=ts)
+                    for d, v, ts in zip(owners, values, self._timestamps(n))
+                ],
+                batch_size=self.batch_size,
+            )
+            if self.verbosity > 1:
+                self.stdout.write(f"  {start + n}/{total} measurements")
+        return total
+
+    def _create_alerts(self, device_ids, total):
+        if not len(device_ids):
+            return 0
+        priorities = list(ALERT_MESSAGES)
+        for start in range(0, total, self.batch_size):
+            n = min(self.batch_size, total - start)
+            owners = self.rng.choice(device_ids, n).tolist()
+            chosen = self.rng.integers(0, len(priorities), n).tolist()
+            Alert.objects.bulk_create(
+                [
+                    Alert(device_id=d, message=ALERT_MESSAGES[priorities[p]], priority=priorities[p], created_at=ts)
+                    for d, p, ts in zip(owners, chosen, self._timestamps(n))
+                ],
+                batch_size=self.batch_size,
             )
-            devices.append(device)
-
-        #  mediciones
-        for device in devices:
-            for _ in range(10):  # 10 mediciones por dispositivo
-                Measurement.objects.create(
-                    device=device,
-                    value=round(random.uniform(10.0, 100.0), 2),
-                    created_at=datetime.now() - timedelta(minutes=random.randint(1, 500))
-                )
-
-        #  alertas
-        for device in devices[:5]:  # solo para algunos dispositivos
-            d1 = Device.objects.first()
-            Alert.objects.create(device=d1, message="Temperatura muy alta", priority="grave")
-            Alert.objects.create(device=d1, message="Nivel de batería bajo", priority="alto")
-            Alert.objects.create(device=d1, message="Chequeo rutinario", priority="medio")
-
-        self.stdout.write(self.style.SUCCESS("✅ Sample data inserted successfully!"))
+        return total
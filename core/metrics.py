@@ -0,0 +1,88 @@
+import threading
+from collections import defaultdict
+
+
+# ===============================
+# Registro de métricas en memoria (formato Prometheus)
+# ===============================
+# Un registro por proceso: con varios workers cada uno expone sus propios
+# contadores y Prometheus los suma por instancia.
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "observations")
+
+    def __init__(self):
+        self.counts = [0] * len(DURATION_BUCKETS)
+        self.total = 0.0
+        self.observations = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.observations += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = defaultdict(int)          # (view, method, status) -> n
+        self.duration = defaultdict(_Histogram)   # view -> histograma (s)
+        self.db_seconds = defaultdict(float)      # view -> s
+        self.queries = defaultdict(int)           # view -> n
+        self.duplicate_queries = defaultdict(int)  # view -> n
+        self.response_bytes = defaultdict(int)    # view -> bytes
+
+    def observe(self, view, method, status, duration, db_time, queries, duplicates, size):
+        with self._lock:
+            self.requests[(view, method, str(status))] += 1
+            self.duration[view].observe(duration)
+            self.db_seconds[view] += db_time
+            self.queries[view] += queries
+            self.duplicate_queries[view] += duplicates
+            if size is not None:
+                self.response_bytes[view] += size
+
+    def render(self):
+        with self._lock:
+            lines = []
+
+            def family(name, kind, help_text):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+            family("ecoenergy_requests_total", "counter", "Sampled requests by view, method and status.")
+            for (view, method, status), n in sorted(self.requests.items()):
+                lines.append(f'ecoenergy_requests_total{{view="{view}",method="{method}",status="{status}"}} {n}')
+
+            family("ecoenergy_request_duration_seconds", "histogram", "Wall time of sampled requests.")
+            for view, hist in sorted(self.duration.items()):
+                for bound, n in zip(DURATION_BUCKETS, hist.counts):
+                    lines.append(f'ecoenergy_request_duration_seconds_bucket{{view="{view}",le="{bound}"}} {n}')
+                lines.append(f'ecoenergy_request_duration_seconds_bucket{{view="{view}",le="+Inf"}} {hist.observations}')
+                lines.append(f'ecoenergy_request_duration_seconds_sum{{view="{view}"}} {hist.total:.6f}')
+                lines.append(f'ecoenergy_request_duration_seconds_count{{view="{view}"}} {hist.observations}')
+
+            for name, help_text, values, fmt in (
+                ("ecoenergy_db_seconds_total", "Time spent in database queries.", self.db_seconds, "{:.6f}"),
+                ("ecoenergy_db_queries_total", "Database queries executed.", self.queries, "{}"),
+                ("ecoenergy_db_duplicate_queries_total",
+                 "Queries repeating an SQL shape already seen in the same request (N+1).",
+                 self.duplicate_queries, "{}"),
+                ("ecoenergy_response_bytes_total", "Response body size (non-streaming).", self.response_bytes, "{}"),
+            ):
+                family(name, "counter", help_text)
+                for view, value in sorted(values.items()):
+                    lines.append(f'{name}{{view="{view}"}} {fmt.format(value)}')
+
+            return "\n".join(lines) + "\n"
+
+
+registry = Registry()
@@ -0,0 +1,140 @@
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.db import connection
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+# ===============================
+# Métricas por request
+# ===============================
+
+_IN_LIST = re.compile(r"\((?:%s, )+%s\)")
+
+
+class _QueryTracker:
+    """execute_wrapper: mide tiempo de base y cuenta formas de SQL repetidas."""
+
+    def __init__(self):
+        self.db_time = 0.0
+        self.count = 0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.count += 1
+            # El SQL ya viene parametrizado; solo se normalizan las listas IN
+            self.shapes[_IN_LIST.sub("(%s...)", sql)] += 1
+
+    def n_plus_one(self, threshold):
+        return {sql: n for sql, n in self.shapes.items() if n >= threshold}
+
+
+# El tracker del request viaja en una ContextVar: sync_to_async copia el
+# contexto, así el wrapper lo encuentra también en el hilo donde corre el ORM
+# async (que tiene su propia conexión, distinta de la del event loop).
+_current_tracker = ContextVar("request_metrics_tracker", default=None)
+
+
+def _dispatch(execute, sql, params, many, context):
+    tracker = _current_tracker.get()
+    if tracker is None:
+        return execute(sql, params, many, context)
+    return tracker(execute, sql, params, many, context)
+
+
+def _install():
+    """Deja _dispatch en la conexión del hilo actual (una sola vez por conexión)."""
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_dispatch)
+
+
+class RequestMetricsMiddleware:
+    """
+    Para una fracción de los requests (METRICS_SAMPLE_RATE) mide tiempo total,
+    tiempo de base, cantidad de queries, queries repetidas (firmas N+1) y tamaño
+    de la respuesta, y acumula en core.metrics. El header Server-Timing solo va
+    a usuarios staff (o con DEBUG): expone tiempos internos.
+    En respuestas en streaming solo se mide hasta que empieza el envío.
+    Funciona igual bajo WSGI y ASGI (no fuerza el paso a sync en ASGI).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            return self.get_response(request)
+
+        _install()
+        tracker = _QueryTracker()
+        token = _current_tracker.set(tracker)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_tracker.reset(token)
+        duration = time.perf_counter() - started
+        self._record(request, response, tracker, duration, getattr(request, "user", None))
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            return await self.get_response(request)
+
+        # El ORM async usa la conexión del hilo thread-sensitive, no la del
+        # event loop: el wrapper se instala allá
+        await sync_to_async(_install)()
+        tracker = _QueryTracker()
+        token = _current_tracker.set(tracker)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_tracker.reset(token)
+        duration = time.perf_counter() - started
+        user = await request.auser() if hasattr(request, "auser") else None
+        self._record(request, response, tracker, duration, user)
+        return response
+
+    def _record(self, request, response, tracker, duration, user):
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "unresolved"
+        size = None if response.streaming else len(response.content)
+        repeated = tracker.n_plus_one(settings.METRICS_N_PLUS_ONE_THRESHOLD)
+        duplicates = sum(n - 1 for n in repeated.values())
+        if repeated:
+            worst_sql, worst_n = max(repeated.items(), key=lambda item: item[1])
+            logger.warning("Possible N+1 in %s: %d× %s", view, worst_n, worst_sql[:200])
+
+        registry.observe(
+            view, request.method, response.status_code,
+            duration, tracker.db_time, tracker.count, duplicates, size,
+        )
+        if settings.DEBUG or getattr(user, "is_staff", False):
+            response["Server-Timing"] = ", ".join([
+                f"app;dur={(duration - tracker.db_time) * 1000:.1f}",
+                f'db;dur={tracker.db_time * 1000:.1f};desc="{tracker.count} queries"',
+                f"total;dur={duration * 1000:.1f}",
+            ])
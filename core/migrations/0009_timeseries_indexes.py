@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-18 00:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_measurement_created_at_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['device', '-created_at'], name='alert_device_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['-created_at'], name='alert_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['priority', 'created_at'], name='alert_priority_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['acknowledged', 'created_at'], name='alert_ack_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='measurement',
+            index=models.Index(fields=['device', '-created_at'], name='meas_device_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='measurement',
+            index=models.Index(fields=['-created_at'], name='meas_created_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-18 00:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_measurement_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertThreshold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('medio', models.FloatField(blank=True, null=True)),
+                ('alto', models.FloatField(blank=True, null=True)),
+                ('grave', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.category')),
+                ('device', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.device')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.organization')),
+            ],
+            options={
+                'constraints': [models.CheckConstraint(condition=models.Q(models.Q(('category__isnull', False), ('device__isnull', True)), models.Q(('category__isnull', True), ('device__isnull', False)), _connector='OR'), name='threshold_single_target'), models.UniqueConstraint(fields=('category',), name='uniq_threshold_category'), models.UniqueConstraint(fields=('device',), name='uniq_threshold_device')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 00:14
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_alert_thresholds'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='alert',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
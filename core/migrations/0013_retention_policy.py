@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 00:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_alert_created_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RetentionPolicy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('keep_days', models.PositiveIntegerField(default=365)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('organization', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='retention_policy', to='core.organization')),
+            ],
+            options={
+                'verbose_name_plural': 'retention policies',
+            },
+        ),
+    ]
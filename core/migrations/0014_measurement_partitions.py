@@ -0,0 +1,80 @@
+from datetime import date
+
+from django.db import migrations
+from django.utils import timezone
+
+# Particiones futuras al convertir la tabla (después las agrega
+# core.partitions.ensure_partitions). Las migraciones no importan código vivo:
+# el DDL de core/partitions.py está copiado acá.
+MONTHS_AHEAD = 3
+
+
+def _add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _definition(month):
+    upper = _add_months(month, 1)
+    return f"PARTITION p{month:%Y%m} VALUES LESS THAN (TO_DAYS('{upper:%Y-%m-%d}'))"
+
+
+def partition(apps, schema_editor):
+    # Solo MySQL (en SQLite no hay particiones). InnoDB pide que toda clave única
+    # incluya created_at y no admite FOREIGN KEY en tablas particionadas.
+    connection = schema_editor.connection
+    if connection.vendor != "mysql":
+        return
+    table = apps.get_model("core", "Measurement")._meta.db_table
+    now = timezone.now()
+    current = date(now.year, now.month, 1)
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN(created_at) FROM {table}")
+        oldest = cursor.fetchone()[0]
+        first = date(oldest.year, oldest.month, 1) if oldest else current
+
+        cursor.execute(
+            "SELECT CONSTRAINT_NAME FROM information_schema.KEY_COLUMN_USAGE "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = 'device_id' "
+            "AND REFERENCED_TABLE_NAME IS NOT NULL",
+            [table],
+        )
+        for (name,) in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE {table} DROP FOREIGN KEY `{name}`")
+
+        cursor.execute(f"ALTER TABLE {table} DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at)")
+
+        months = []
+        month = first
+        while month <= _add_months(current, MONTHS_AHEAD):
+            months.append(month)
+            month = _add_months(month, 1)
+        parts = ", ".join([_definition(m) for m in months] + ["PARTITION pmax VALUES LESS THAN MAXVALUE"])
+        cursor.execute(f"ALTER TABLE {table} PARTITION BY RANGE (TO_DAYS(created_at)) ({parts})")
+
+
+def unpartition(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "mysql":
+        return
+    Measurement = apps.get_model("core", "Measurement")
+    table = Measurement._meta.db_table
+    device_table = Measurement._meta.get_field("device").related_model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {table} REMOVE PARTITIONING")
+        cursor.execute(f"ALTER TABLE {table} DROP PRIMARY KEY, ADD PRIMARY KEY (id)")
+        cursor.execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT {table}_device_id_fk "
+            f"FOREIGN KEY (device_id) REFERENCES {device_table} (id)"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_retention_policy'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 00:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_measurement_partitions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['organization', 'name'], name='category_alive_org_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['organization', 'name'], name='device_alive_org_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='organization',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['name'], name='organization_alive_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='zone',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['organization', 'name'], name='zone_alive_org_name_idx'),
+        ),
+    ]
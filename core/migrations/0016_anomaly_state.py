@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-18 00:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_soft_delete'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnomalyState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mean', models.FloatField(default=0)),
+                ('var', models.FloatField(default=0)),
+                ('count', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('device', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='anomaly_state', to='core.device')),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 00:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceState',
+            fields=[
+                ('device', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='state', serialize=False, to='core.device')),
+                ('last_value', models.FloatField(blank=True, null=True)),
+                ('last_seen_at', models.DateTimeField(blank=True, null=True)),
+                ('open_alert_count', models.PositiveIntegerField(default=0)),
+                ('highest_open_priority', models.PositiveSmallIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['last_seen_at'], name='devstate_last_seen_idx'), models.Index(fields=['highest_open_priority'], name='devstate_priority_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_organization(apps, schema_editor):
+    # Un UPDATE por conjunto: la organización de cada DeviceState sale de su Device
+    Device = apps.get_model("core", "Device")
+    DeviceState = apps.get_model("core", "DeviceState")
+    DeviceState.objects.update(
+        organization_id=models.Subquery(
+            Device.objects.filter(id=models.OuterRef("device_id")).values("organization_id")[:1]
+        )
+    )
+
+
+def add_fulltext(apps, schema_editor):
+    # Solo MySQL: índice FULLTEXT con el parser ngram para ?q= (core/device_search.py)
+    if schema_editor.connection.vendor != "mysql":
+        return
+    schema_editor.execute("CREATE FULLTEXT INDEX device_name_ngram_idx ON core_device (name) WITH PARSER ngram")
+
+
+def drop_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor != "mysql":
+        return
+    schema_editor.execute("DROP INDEX device_name_ngram_idx ON core_device")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_device_state'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='devicestate',
+            name='devstate_last_seen_idx',
+        ),
+        migrations.AddField(
+            model_name='devicestate',
+            name='organization',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='device_states', to='core.organization'),
+        ),
+        migrations.RunPython(fill_organization, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='devicestate',
+            name='organization',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='device_states', to='core.organization'),
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['organization', 'category', 'name'], name='device_org_cat_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['organization', 'zone', 'name'], name='device_org_zone_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='devicestate',
+            index=models.Index(fields=['organization', 'last_seen_at', 'device'], name='devstate_org_last_seen_idx'),
+        ),
+        migrations.RunPython(add_fulltext, drop_fulltext),
+    ]
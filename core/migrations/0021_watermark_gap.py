@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_device_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rollupwatermark',
+            name='gap_seen_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
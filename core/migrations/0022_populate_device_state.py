@@ -0,0 +1,53 @@
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+# Copia de core.alerting.PRIORITY_RANK (las migraciones no importan código vivo)
+PRIORITY_RANK = {"medio": 1, "alto": 2, "grave": 3}
+
+
+def populate(apps, schema_editor):
+    # Un DeviceState por Device (incluidos los archivados) y su resumen por
+    # conjuntos: sin fila, el dispositivo no aparecería al ordenar por última lectura
+    Device = apps.get_model("core", "Device")
+    DeviceState = apps.get_model("core", "DeviceState")
+    Measurement = apps.get_model("core", "Measurement")
+    Alert = apps.get_model("core", "Alert")
+
+    missing = Device.objects.filter(state__isnull=True).order_by("id").values_list("id", "organization_id")
+    batch = []
+    for device_id, org_id in missing.iterator(chunk_size=1000):
+        batch.append(DeviceState(device_id=device_id, organization_id=org_id))
+        if len(batch) == 1000:
+            DeviceState.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    DeviceState.objects.bulk_create(batch, ignore_conflicts=True)
+
+    latest = Measurement.objects.filter(device_id=models.OuterRef("device_id")).order_by("-created_at", "-id")
+    open_alerts = Alert.objects.filter(device_id=models.OuterRef("device_id"), acknowledged=False).order_by()
+    rank = models.Case(
+        *[models.When(priority=p, then=models.Value(r)) for p, r in PRIORITY_RANK.items()],
+        default=models.Value(0), output_field=models.IntegerField(),
+    )
+    DeviceState.objects.update(
+        last_value=models.Subquery(latest.values("value")[:1]),
+        last_seen_at=models.Subquery(latest.values("created_at")[:1]),
+        open_alert_count=Coalesce(
+            models.Subquery(open_alerts.values("device_id").annotate(n=models.Count("id")).values("n")[:1]), 0,
+        ),
+        highest_open_priority=Coalesce(
+            models.Subquery(open_alerts.annotate(rank=rank).order_by("-rank").values("rank")[:1]), 0,
+        ),
+        updated_at=timezone.now(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_watermark_gap'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,98 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
+from django.db.models import Q, Subquery
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from .cache import invalidate_org
+
+
+# ===============================
+# Borrado lógico (deleted_at)
+# ===============================
+# `objects` oculta las filas con deleted_at; `all_objects` las incluye.
+# soft_delete()/restore() son UPDATE por conjunto (no save() fila por fila) y
+# bajan en cascada Organization -> Category/Zone/Device -> Measurement con la
+# MISMA marca de tiempo: restore() solo revive lo que cayó junto con el padre,
+# no lo que ya estaba borrado antes.
+
+ALIVE = Q(deleted_at__isnull=True)
+
+
+class SoftDeleteQuerySet(models.QuerySet):
+    def alive(self):
+        return self.filter(deleted_at__isnull=True)
+
+    def dead(self):
+        return self.filter(deleted_at__isnull=False)
+
+    def _cascade(self, stamp, restore=False):
+        """Hijos del queryset a marcar/revivir. Lo redefine cada modelo."""
+        return []
+
+    def _org_ids(self):
+        return []
+
+    def soft_delete(self, when=None):
+        """Marca las filas vivas (y sus hijos) como borradas. Devuelve cuántas del propio modelo."""
+        stamp = when or timezone.now()
+        targets = self.alive()
+        org_ids = targets._org_ids()
+        for children in targets._cascade(stamp):
+            children.filter(deleted_at__isnull=True).update(deleted_at=stamp)
+        updated = targets.update(deleted_at=stamp)
+        invalidate_org(*org_ids)
+        return updated
+
+    def restore(self):
+        """Revive las filas borradas y los hijos que cayeron con ellas."""
+        restored = 0
+        org_ids = self.dead()._org_ids()
+        for stamp in set(self.dead().values_list("deleted_at", flat=True)):
+            targets = self.filter(deleted_at=stamp)
+            for children in targets._cascade(stamp, restore=True):
+                children.filter(deleted_at=stamp).update(deleted_at=None)
+            restored += targets.update(deleted_at=None)
+        invalidate_org(*org_ids)
+        return restored
+
+
+class OrganizationQuerySet(SoftDeleteQuerySet):
+    def _org_ids(self):
+        return list(self.values_list("id", flat=True))
+
+    def _cascade(self, stamp, restore=False):
+        orgs = Subquery(self.values("id"))
+        devices = Device.all_objects.filter(organization_id__in=orgs)
+        return [
+            Measurement.all_objects.filter(device_id__in=Subquery(devices.values("id"))),
+            devices,
+            Category.all_objects.filter(organization_id__in=orgs),
+            Zone.all_objects.filter(organization_id__in=orgs),
+        ]
+
+
+class OrganizationScopedQuerySet(SoftDeleteQuerySet):
+    def _org_ids(self):
+        return list(self.values_list("organization_id", flat=True).distinct())
+
+
+class DeviceQuerySet(OrganizationScopedQuerySet):
+    def _cascade(self, stamp, restore=False):
+        return [Measurement.all_objects.filter(device_id__in=Subquery(self.values("id")))]
+
 
+class MeasurementQuerySet(SoftDeleteQuerySet):
+    def _org_ids(self):
+        return list(self.values_list("device__organization_id", flat=True).distinct())
+
+
+class AliveManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
 
 
 class Organization(models.Model):
@@ -10,9 +101,17 @@ class Organization(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     deleted_at = models.DateTimeField(null=True, blank=True)
 
+    objects = AliveManager.from_queryset(OrganizationQuerySet)()
+    all_objects = models.Manager.from_queryset(OrganizationQuerySet)()
+
     def __str__(self):
         return self.name
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["name"], condition=ALIVE, name="organization_alive_name_idx"),
+        ]
+
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -21,9 +120,17 @@ class Category(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     deleted_at = models.DateTimeField(null=True, blank=True)
 
+    objects = AliveManager.from_queryset(OrganizationScopedQuerySet)()
+    all_objects = models.Manager.from_queryset(OrganizationScopedQuerySet)()
+
     def __str__(self):
         return self.name
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["organization", "name"], condition=ALIVE, name="category_alive_org_name_idx"),
+        ]
+
 
 class Zone(models.Model):
     name = models.CharField(max_length=100)
@@ -32,9 +139,17 @@ class Zone(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     deleted_at = models.DateTimeField(null=True, blank=True)
 
+    objects = AliveManager.from_queryset(OrganizationScopedQuerySet)()
+    all_objects = models.Manager.from_queryset(OrganizationScopedQuerySet)()
+
     def __str__(self):
         return self.name
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["organization", "name"], condition=ALIVE, name="zone_alive_org_name_idx"),
+        ]
+
 
 class Device(models.Model):
     name = models.CharField(max_length=100)
@@ -45,6 +160,9 @@ class Device(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     deleted_at = models.DateTimeField(null=True, blank=True)
 
+    objects = AliveManager.from_queryset(DeviceQuerySet)()
+    all_objects = models.Manager.from_queryset(DeviceQuerySet)()
+
     def __str__(self):
         return self.name
 
@@ -67,15 +185,30 @@ class Device(models.Model):
             models.UniqueConstraint(fields=["organization", "name"], name="uniq_device_name_per_org"),
         ]
         ordering = ("name",)  # orden por defecto útil en admin/listas
+        indexes = [
+            models.Index(fields=["organization", "name"], condition=ALIVE, name="device_alive_org_name_idx"),
+            # device_list filtrado por categorías/zonas y ordenado por nombre (core/device_search.py);
+            # sin condición para que también existan en MySQL (no tiene índices parciales)
+            models.Index(fields=["organization", "category", "name"], name="device_org_cat_name_idx"),
+            models.Index(fields=["organization", "zone", "name"], name="device_org_zone_name_idx"),
+        ]
 
 
 class Measurement(models.Model):
+    # Rango aceptado para value (usado por clean() y por la ingesta masiva)
+    VALUE_MIN = 0
+    VALUE_MAX = 1000
+
     device = models.ForeignKey(Device, on_delete=models.CASCADE)
     value = models.FloatField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    # default en vez de auto_now_add: la ingesta conserva la hora de la lectura
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
     deleted_at = models.DateTimeField(null=True, blank=True)
 
+    objects = AliveManager.from_queryset(MeasurementQuerySet)()
+    all_objects = models.Manager.from_queryset(MeasurementQuerySet)()
+
     def clean(self):
         """
         Validación de negocio:
@@ -83,11 +216,104 @@ class Measurement(models.Model):
         """
         if self.value is None:
             raise ValidationError({"value": "Value is required."})
-        if not (0 <= self.value <= 1000):
-            raise ValidationError({"value": "Value must be between 0 and 1000."})
+        if not (self.VALUE_MIN <= self.value <= self.VALUE_MAX):
+            raise ValidationError({"value": f"Value must be between {self.VALUE_MIN} and {self.VALUE_MAX}."})
 
     class Meta:
         ordering = ("-created_at",)
+        # Sin índices parciales: retención/archivo recorren también lo borrado, y lo
+        # borrado se purga a los RETENTION_SOFT_DELETE_DAYS (el filtro residual es barato)
+        indexes = [
+            # Historial por dispositivo (device_detail) y últimas lecturas globales
+            models.Index(fields=["device", "-created_at"], name="meas_device_created_idx"),
+            models.Index(fields=["-created_at"], name="meas_created_idx"),
+        ]
+
+
+class DeviceState(models.Model):
+    """
+    Estado materializado de un dispositivo: última lectura y alertas abiertas.
+    Lo mantienen core/device_state.py desde la ingesta y las alertas (UPDATE
+    atómicos, sin leer antes) y `manage.py rebuild_device_state` lo recalcula.
+    """
+    device = models.OneToOneField(Device, on_delete=models.CASCADE, primary_key=True, related_name="state")
+    # Copia de device.organization: el orden por última lectura de una
+    # organización sale entero del índice (organization, last_seen_at, device)
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name="device_states")
+    last_value = models.FloatField(null=True, blank=True)
+    last_seen_at = models.DateTimeField(null=True, blank=True)
+    open_alert_count = models.PositiveIntegerField(default=0)
+    # 0 = ninguna, 1 = medio, 2 = alto, 3 = grave (core.alerting.PRIORITY_RANK)
+    highest_open_priority = models.PositiveSmallIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.device_id}: {self.last_value} @ {self.last_seen_at}"
+
+    @property
+    def offline(self):
+        if self.last_seen_at is None:
+            return True
+        return self.last_seen_at < timezone.now() - timedelta(minutes=settings.DEVICE_OFFLINE_MINUTES)
+
+    @property
+    def highest_open_priority_label(self):
+        return {1: "medio", 2: "alto", 3: "grave"}.get(self.highest_open_priority, "")
+
+    class Meta:
+        indexes = [
+            # Filtros de device_list: "sin conexión hace más de N minutos" y "con alertas grave";
+            # el de last_seen_at también sirve el orden por última lectura (con su desempate)
+            models.Index(fields=["organization", "last_seen_at", "device"], name="devstate_org_last_seen_idx"),
+            models.Index(fields=["highest_open_priority"], name="devstate_priority_idx"),
+        ]
+
+
+class MeasurementRollup(models.Model):
+    """
+    Agregado precalculado de Measurement por dispositivo y bucket de tiempo.
+    Lo mantiene core.rollups.refresh_rollups de forma incremental.
+    """
+    class Granularity(models.TextChoices):
+        MINUTE = "minute", "Minute"
+        HOUR = "hour", "Hour"
+        DAY = "day", "Day"
+
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name="rollups")
+    granularity = models.CharField(max_length=6, choices=Granularity.choices)
+    bucket = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+    sum = models.FloatField(default=0)
+    min = models.FloatField(null=True, blank=True)
+    max = models.FloatField(null=True, blank=True)
+
+    @property
+    def avg(self):
+        return self.sum / self.count if self.count else None
+
+    def __str__(self):
+        return f"{self.device_id} {self.granularity} {self.bucket:%Y-%m-%d %H:%M}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["device", "granularity", "bucket"], name="uniq_rollup_bucket"),
+        ]
+        indexes = [
+            # Gráficos a nivel organización (todas las series de un rango)
+            models.Index(fields=["granularity", "bucket"], name="rollup_gran_bucket_idx"),
+        ]
+
+
+class RollupWatermark(models.Model):
+    """Último Measurement.id ya procesado por un consumidor (rollups, detector de anomalías)."""
+    name = models.CharField(max_length=50, unique=True)
+    last_measurement_id = models.BigIntegerField(default=0)
+    # Desde cuándo falta el id siguiente a la marca (transacción sin commit o hueco definitivo)
+    gap_seen_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_measurement_id}"
 
 
 
@@ -103,13 +329,193 @@ class Alert(models.Model):
 
     # NUEVO -> requerido por el Admin y la acción
     acknowledged = models.BooleanField(default=False)
+    # Flujo de trabajo (core/workflow.py): pospuesta hasta / cerrada
+    snoozed_until = models.DateTimeField(null=True, blank=True)
+    closed_at = models.DateTimeField(null=True, blank=True)
 
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     def __str__(self):
         return f"{self.device.name} - {self.priority}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["device", "-created_at"], name="alert_device_created_idx"),
+            models.Index(fields=["-created_at"], name="alert_created_idx"),
+            # Contadores semanales por prioridad
+            models.Index(fields=["priority", "created_at"], name="alert_priority_created_idx"),
+            # Cola de alertas pendientes (no atendidas)
+            models.Index(fields=["acknowledged", "created_at"], name="alert_ack_created_idx"),
+        ]
+
+
+
+
+class AlertAudit(models.Model):
+    """Una fila por alerta y acción del flujo de trabajo: quién hizo qué y cuándo."""
+    class Action(models.TextChoices):
+        ACKNOWLEDGE = "acknowledge", "Acknowledge"
+        ESCALATE = "escalate", "Escalate"
+        SNOOZE = "snooze", "Snooze"
+        CLOSE = "close", "Close"
+
+    alert = models.ForeignKey(Alert, on_delete=models.CASCADE, related_name="audit")
+    action = models.CharField(max_length=12, choices=Action.choices)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    detail = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    def __str__(self):
+        return f"{self.alert_id} {self.action} {self.created_at:%Y-%m-%d %H:%M}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-created_at"], name="alertaudit_created_idx"),
+        ]
+
+
+class AnomalyState(models.Model):
+    """
+    Checkpoint del detector EWMA de core.anomaly para un dispositivo: media y
+    varianza exponenciales y cuántas lecturas lleva. Con esto un reinicio
+    sigue donde quedó sin volver a leer el historial.
+    """
+    device = models.OneToOneField(Device, on_delete=models.CASCADE, related_name="anomaly_state")
+    mean = models.FloatField(default=0)
+    var = models.FloatField(default=0)
+    count = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.device_id}: {self.mean:g} ± {self.var ** 0.5:g} ({self.count})"
+
+
+class AlertThreshold(models.Model):
+    """
+    Bandas de alerta por Category o por Device (el del Device tiene prioridad).
+    Una medición genera alerta de la banda más alta cuyo umbral alcanza:
+    value >= grave -> grave, value >= alto -> alto, value >= medio -> medio.
+    """
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True)
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, null=True, blank=True)
+    medio = models.FloatField(null=True, blank=True)
+    alto = models.FloatField(null=True, blank=True)
+    grave = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        target = f"device {self.device_id}" if self.device_id else f"category {self.category_id}"
+        return f"Threshold ({target})"
+
+    def clean(self):
+        """
+        - exactamente uno de category / device.
+        - el objetivo pertenece a la misma organization.
+        - bandas crecientes: medio <= alto <= grave.
+        """
+        if bool(self.category_id) == bool(self.device_id):
+            raise ValidationError("Set either a category or a device, not both.")
+        errors = {}
+        if self.organization_id:
+            if self.category_id and self.category.organization_id != self.organization_id:
+                errors["category"] = "Category must belong to the same Organization."
+            if self.device_id and self.device.organization_id != self.organization_id:
+                errors["device"] = "Device must belong to the same Organization."
+        bands = [b for b in (self.medio, self.alto, self.grave) if b is not None]
+        if not bands:
+            errors["medio"] = "Set at least one band."
+        elif bands != sorted(bands):
+            errors["grave"] = "Bands must be increasing: medio <= alto <= grave."
+        if errors:
+            raise ValidationError(errors)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=(
+                    models.Q(category__isnull=False, device__isnull=True)
+                    | models.Q(category__isnull=True, device__isnull=False)
+                ),
+                name="threshold_single_target",
+            ),
+            # NULL no choca con NULL (SQLite y MySQL): un umbral por category / device
+            models.UniqueConstraint(fields=["category"], name="uniq_threshold_category"),
+            models.UniqueConstraint(fields=["device"], name="uniq_threshold_device"),
+        ]
+
 
+class RetentionPolicy(models.Model):
+    """
+    Cuántos días de Measurement se conservan para una organización. Lo más
+    viejo se poda con `manage.py prune_measurements` (después de pasar a rollups).
+    Sin política rige settings.MEASUREMENT_RETENTION_DAYS (None = no se poda).
+    """
+    organization = models.OneToOneField(Organization, on_delete=models.CASCADE, related_name="retention_policy")
+    keep_days = models.PositiveIntegerField(default=365)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "retention policies"
+
+    def __str__(self):
+        return f"{self.organization} — {self.keep_days} days"
+
+
+
+class Job(models.Model):
+    """
+    Trabajo en segundo plano (core/jobs.py). Un worker lo toma con
+    UPDATE ... WHERE status='pending' (solo uno gana) y lo ejecuta; si falla se
+    reintenta con backoff hasta max_attempts.
+    """
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+        CANCELLED = "cancelled", "Cancelled"
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    priority = models.SmallIntegerField(default=0, help_text="Mayor = antes")
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, null=True, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+
+    progress = models.PositiveBigIntegerField(default=0)
+    total = models.PositiveBigIntegerField(null=True, blank=True)
+    message = models.CharField(max_length=200, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    worker = models.CharField(max_length=100, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    def __str__(self):
+        return f"{self.kind} #{self.id} ({self.status})"
+
+    @property
+    def percent(self):
+        if not self.total:
+            return None
+        return min(100, round(100 * self.progress / self.total))
+
+    class Meta:
+        indexes = [
+            # Cola: próximos pendientes por prioridad
+            models.Index(fields=["status", "-priority", "run_after"], name="job_queue_idx"),
+            models.Index(fields=["-created_at"], name="job_created_idx"),
+        ]
 
 
 class Account(models.Model):
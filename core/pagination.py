@@ -0,0 +1,285 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+
+
+# ===============================
+# Paginación por cursor (keyset)
+# ===============================
+# En vez de OFFSET se filtra por la última fila vista:
+#   WHERE (created_at, id) < (:created_at, :id) ORDER BY created_at DESC, id DESC
+# así la página N cuesta lo mismo que la página 1 (usa el índice de created_at).
+# Las claves que admiten NULL (p. ej. state__last_seen_at) ordenan los NULL como
+# el menor valor, igual que SQLite y MySQL por defecto, así el índice sigue sirviendo.
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+
+def _resolve_field(model, path):
+    field = None
+    for part in path.split("__"):
+        field = model._meta.get_field(part)
+        if field.is_relation:
+            model = field.related_model
+    return field
+
+
+def _item_value(item, path):
+    value = item
+    for part in path.split("__"):
+        try:
+            value = getattr(value, part)
+        except ObjectDoesNotExist:
+            # Relación inversa sin fila (LEFT JOIN vacío): cuenta como NULL
+            return None
+        if value is None:
+            return None
+    return value
+
+
+def _nullable(model, ordering):
+    return {key.lstrip("-") for key in ordering if _resolve_field(model, key.lstrip("-")).null}
+
+
+def encode_cursor(values, direction):
+    payload = json.dumps({"k": values, "d": direction}, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token, model, ordering):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        raw_values, direction = payload["k"], payload["d"]
+        if direction not in ("next", "prev") or len(raw_values) != len(ordering):
+            raise InvalidCursor(token)
+        values = []
+        for key, raw in zip(ordering, raw_values):
+            field = _resolve_field(model, key.lstrip("-"))
+            if raw is None and not field.null:
+                raise InvalidCursor(token)
+            values.append(field.to_python(raw))
+    except (ValueError, KeyError, TypeError, binascii.Error, ValidationError):
+        raise InvalidCursor(token)
+    return values, direction
+
+
+def _strictly_after(field, value, descending, nullable):
+    """Q "field viene estrictamente después de value" (NULL = el menor valor); None si nada."""
+    if value is None:
+        return None if descending else Q(**{f"{field}__isnull": False})
+    step = Q(**{f"{field}__{'lt' if descending else 'gt'}": value})
+    if descending and nullable:
+        step |= Q(**{f"{field}__isnull": True})
+    return step
+
+
+def _after(ordering, values, reverse=False, nullable=()):
+    """
+    Q lexicográfico "viene después de values" según ordering.
+    (a DESC, b DESC) después de (x, y)  ->  a < x OR (a = x AND b < y)
+    """
+    condition = Q()
+    for i in reversed(range(len(ordering))):
+        key = ordering[i]
+        field = key.lstrip("-")
+        descending = key.startswith("-") != reverse
+        step = _strictly_after(field, values[i], descending, field in nullable)
+        if i < len(ordering) - 1:
+            equal = Q(**{f"{field}__isnull": True} if values[i] is None else {field: values[i]})
+            step = equal & condition if step is None else step | (equal & condition)
+        condition = step
+    return condition
+
+
+def _reversed_ordering(ordering):
+    return [key[1:] if key.startswith("-") else f"-{key}" for key in ordering]
+
+
+def _order_by(ordering, nullable):
+    """Claves de order_by; las que admiten NULL con los NULL como el menor valor."""
+    keys = []
+    for key in ordering:
+        field = key.lstrip("-")
+        if field not in nullable:
+            keys.append(key)
+        elif key.startswith("-"):
+            keys.append(F(field).desc(nulls_last=True))
+        else:
+            keys.append(F(field).asc(nulls_first=True))
+    return keys
+
+
+def _window(queryset, cursor, page_size, ordering):
+    """Queryset de la ventana (page_size + 1 filas) y la dirección del cursor."""
+    direction = "next"
+    nullable = _nullable(queryset.model, ordering)
+    qs = queryset.order_by(*_order_by(ordering, nullable))
+    if cursor:
+        values, direction = decode_cursor(cursor, queryset.model, ordering)
+        if direction == "next":
+            qs = qs.filter(_after(ordering, values, nullable=nullable))
+        else:
+            qs = queryset.order_by(*_order_by(_reversed_ordering(ordering), nullable)).filter(
+                _after(ordering, values, reverse=True, nullable=nullable)
+            )
+    return qs[:page_size + 1], direction
+
+
+def _build_page(rows, direction, cursor, page_size, ordering):
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if direction == "prev":
+        rows.reverse()
+
+    def key_of(item):
+        return [_item_value(item, key.lstrip("-")) for key in ordering]
+
+    next_cursor = prev_cursor = None
+    if rows:
+        # Hacia adelante: hay más si sobró una fila, o si veníamos retrocediendo
+        if (direction == "next" and has_more) or (direction == "prev" and cursor):
+            next_cursor = encode_cursor(key_of(rows[-1]), "next")
+        if (direction == "prev" and has_more) or (direction == "next" and cursor):
+            prev_cursor = encode_cursor(key_of(rows[0]), "prev")
+    return KeysetPage(rows, next_cursor, prev_cursor)
+
+
+def paginate_keyset(queryset, cursor=None, page_size=None, ordering=("-created_at", "-id")):
+    """
+    Devuelve una KeysetPage con los ítems y los cursores next/prev (tokens opacos).
+    ordering debe terminar en una clave única (id) para que el orden sea estable.
+    """
+    page_size = page_size or settings.LIST_PAGE_SIZE
+    ordering = list(ordering)
+    qs, direction = _window(queryset, cursor, page_size, ordering)
+    return _build_page(list(qs), direction, cursor, page_size, ordering)
+
+
+async def apaginate_keyset(queryset, cursor=None, page_size=None, ordering=("-created_at", "-id")):
+    """Versión async de paginate_keyset (ORM async)."""
+    page_size = page_size or settings.LIST_PAGE_SIZE
+    ordering = list(ordering)
+    qs, direction = _window(queryset, cursor, page_size, ordering)
+    return _build_page([row async for row in qs], direction, cursor, page_size, ordering)
+
+
+def page_size_from(request):
+    try:
+        size = int(request.GET.get("size", settings.LIST_PAGE_SIZE))
+    except ValueError:
+        size = settings.LIST_PAGE_SIZE
+    return max(1, min(size, settings.LIST_MAX_PAGE_SIZE))
+
+
+# ===============================
+# Conteo estimado para el admin
+# ===============================
+# El changelist pagina con OFFSET y necesita un total. Sobre millones de filas
+# un COUNT(*) exacto es lo más caro de la página: sin filtros se usa la
+# estimación del motor (sqlite_stat1 / information_schema / pg_class) y con
+# filtros (también el de organización de OrgScopedAdmin) un COUNT acotado a
+# ADMIN_COUNT_LIMIT filas. Si el COUNT llega al tope el total es un mínimo:
+# se muestra como "≥ N" y se puede seguir avanzando páginas más allá.
+
+_ESTIMATE_SQL = {
+    "sqlite": "SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1",
+    "mysql": "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+    "postgresql": "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+}
+
+
+def estimated_count(model):
+    """Filas aproximadas de la tabla según las estadísticas del motor, o None si no hay."""
+    sql = _ESTIMATE_SQL.get(connection.vendor)
+    if sql is None:
+        return None
+    try:
+        # Savepoint: en SQLite sqlite_stat1 no existe hasta el primer ANALYZE
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, [model._meta.db_table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if not row or row[0] is None:
+        return None
+    # sqlite_stat1.stat es "filas [filas por valor del índice ...]"
+    return int(str(row[0]).split()[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator del admin que no cuenta millones de filas: el total es la
+    estimación de la tabla (sin filtros, sobre ADMIN_ESTIMATE_THRESHOLD) o un
+    conteo que se detiene en ADMIN_COUNT_LIMIT (con filtros). En ese caso
+    count_is_lower_bound es True y las páginas no se cortan en el total.
+    """
+
+    @cached_property
+    def _counted(self):
+        """(total, es_un_mínimo)."""
+        qs = self.object_list
+        # Sin WHERE, o solo el del manager por defecto (filas vivas)
+        unfiltered = not qs.query.where or qs.query.where == qs.model._default_manager.get_queryset().query.where
+        if unfiltered:
+            estimate = estimated_count(qs.model)
+            if estimate is not None and estimate > settings.ADMIN_ESTIMATE_THRESHOLD:
+                return estimate, False
+        count = qs.order_by()[:settings.ADMIN_COUNT_LIMIT].count()
+        return count, count >= settings.ADMIN_COUNT_LIMIT
+
+    @property
+    def count(self):
+        return self._counted[0]
+
+    @property
+    def count_is_lower_bound(self):
+        return self._counted[1]
+
+    def validate_number(self, number):
+        if not self.count_is_lower_bound:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages["invalid_page"])
+        if number < 1:
+            raise EmptyPage(self.error_messages["min_page"])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.count_is_lower_bound:
+            return super().page(number)
+        # Más allá del tope contado: OFFSET directo, sin recortar al total
+        bottom = (number - 1) * self.per_page
+        return self._get_page(self.object_list[bottom:bottom + self.per_page], number, self)
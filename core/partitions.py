@@ -0,0 +1,105 @@
+from datetime import date
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import Measurement
+
+
+# ===============================
+# Particiones mensuales de Measurement (solo MySQL)
+# ===============================
+# PARTITION BY RANGE (TO_DAYS(created_at)), una partición por mes más pmax.
+# MySQL elige solo las particiones que tocan un WHERE created_at ... (partition
+# pruning), así que las consultas acotadas por fecha no necesitan cambios.
+# Dos requisitos de InnoDB:
+#   - toda clave única debe incluir created_at -> PK pasa a (id, created_at).
+#   - las tablas particionadas no admiten FOREIGN KEY -> se quita la FK a
+#     core_device (Django sigue haciendo el CASCADE en Python) y ninguna otra
+#     tabla puede apuntar a core_measurement con FK.
+# La conversión de la tabla la hace la migración 0014; acá quedan el
+# mantenimiento mensual (ensure_partitions) y el DROP de meses vencidos.
+# En SQLite todo esto es un no-op.
+
+TABLE = Measurement._meta.db_table
+
+
+def supported():
+    return connection.vendor == "mysql"
+
+
+def add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _month_of(value):
+    return date(value.year, value.month, 1)
+
+
+def partition_name(month):
+    return f"p{month:%Y%m}"
+
+
+def _definition(month):
+    upper = add_months(month, 1)
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN (TO_DAYS('{upper:%Y-%m-%d}'))"
+
+
+def _maxvalue():
+    return "PARTITION pmax VALUES LESS THAN MAXVALUE"
+
+
+def existing_months():
+    """Meses con partición propia (sin pmax), en orden."""
+    if not supported():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    return [date(int(n[1:5]), int(n[5:7]), 1) for n in names if n != "pmax"]
+
+
+def is_partitioned():
+    return bool(existing_months())
+
+
+def ensure_partitions(ahead=None):
+    """Crea las particiones de los próximos meses partiendo pmax. Devuelve las nuevas."""
+    months = existing_months()
+    if not months:
+        return []
+    ahead = settings.PARTITION_MONTHS_AHEAD if ahead is None else ahead
+    target = add_months(_month_of(timezone.now()), ahead)
+    new = []
+    month = add_months(months[-1], 1)
+    while month <= target:
+        new.append(month)
+        month = add_months(month, 1)
+    if new:
+        parts = ", ".join([_definition(m) for m in new] + [_maxvalue()])
+        with connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {TABLE} REORGANIZE PARTITION pmax INTO ({parts})")
+    return [partition_name(m) for m in new]
+
+
+def droppable_before(cutoff):
+    """Meses cuya partición termina antes de cutoff (todas sus filas vencidas)."""
+    limit = cutoff.date() if hasattr(cutoff, "date") else cutoff
+    return [m for m in existing_months() if add_months(m, 1) <= limit]
+
+
+def drop_partitions(months):
+    """DROP PARTITION: instantáneo, sin DELETE fila por fila ni locks largos."""
+    if not months:
+        return []
+    names = [partition_name(m) for m in months]
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {TABLE} DROP PARTITION {', '.join(names)}")
+    return names
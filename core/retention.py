@@ -0,0 +1,159 @@
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import archive as cold_storage, partitions
+from .cache import invalidate_org
+from .models import Organization, Measurement, RetentionPolicy, RollupWatermark
+from .rollups import refresh_rollups, WATERMARK_NAME
+
+
+# ===============================
+# Retención de Measurement
+# ===============================
+# Antes de borrar se pasa todo a rollups (refresh_rollups) y solo se borran
+# filas con id <= marca de agua, así el histórico queda en MeasurementRollup.
+# El borrado va en lotes de ids, cada uno en su propia transacción corta: no
+# hay un DELETE gigante que bloquee la tabla. En MySQL particionado los meses
+# completamente vencidos se sueltan con DROP PARTITION.
+# Con archive=True las filas se copian antes al archivo frío (core/archive.py).
+
+# Lotes de ids para consultas IN (SQLite limita la cantidad de parámetros)
+_ID_CHUNK = 500
+
+
+def cutoffs(now=None, org_ids=None):
+    """{org_id: fecha límite} de las organizaciones que tienen retención."""
+    now = now or timezone.now()
+    default = settings.MEASUREMENT_RETENTION_DAYS
+    policies = dict(RetentionPolicy.objects.values_list("organization_id", "keep_days"))
+    # all_objects: lo borrado lógicamente también vence
+    orgs = Organization.all_objects.values_list("id", flat=True)
+    if org_ids:
+        orgs = orgs.filter(id__in=org_ids)
+    result = {}
+    for org_id in orgs:
+        days = policies.get(org_id, default)
+        if days is not None:
+            result[org_id] = now - timedelta(days=days)
+    return result
+
+
+def _rollup_watermark():
+    return (
+        RollupWatermark.objects.filter(name=WATERMARK_NAME)
+        .values_list("last_measurement_id", flat=True).first()
+    ) or 0
+
+
+def _delete_ids(ids):
+    # DELETE directo: el ORM traería cada fila para las señales post_delete
+    table = connection.ops.quote_name(Measurement._meta.db_table)
+    with connection.cursor() as cursor:
+        for i in range(0, len(ids), _ID_CHUNK):
+            chunk = ids[i:i + _ID_CHUNK]
+            cursor.execute(f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(chunk))})", chunk)
+
+
+def delete_in_batches(queryset, batch_size=None, sleep=0, dry_run=False, archive=False):
+    """
+    Borra las filas de queryset de a batch_size ids. Devuelve cuántas.
+    Con archive=True cada lote se escribe al archivo frío antes de borrarse.
+    """
+    if dry_run:
+        return queryset.count()
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    queryset = queryset.order_by("id")
+    deleted = 0
+    touched = set()
+    while True:
+        if archive:
+            rows = list(queryset.values_list("id", "device_id", "created_at", "value")[:batch_size])
+            touched |= cold_storage.write_rows(rows)
+            ids = [row[0] for row in rows]
+        else:
+            ids = list(queryset.values_list("id", flat=True)[:batch_size])
+        if not ids:
+            # Los segmentos de cada lote se unen al archivo del mes una sola vez
+            cold_storage.compact(touched)
+            return deleted
+        with transaction.atomic():
+            _delete_ids(ids)
+        deleted += len(ids)
+        if sleep:
+            time.sleep(sleep)
+
+
+def _drop_expired_partitions(limits, watermark, dry_run):
+    """DROP PARTITION de los meses vencidos para TODAS las organizaciones."""
+    if not limits or Organization.all_objects.exclude(id__in=limits.keys()).exists():
+        return []
+    months = partitions.droppable_before(min(limits.values()))
+    if months:
+        upper = partitions.add_months(months[-1], 1)
+        bound = datetime(upper.year, upper.month, 1, tzinfo=dt_timezone.utc)
+        # Todo lo que se suelta tiene que estar ya en rollups
+        if Measurement.all_objects.filter(created_at__lt=bound, id__gt=watermark).exists():
+            return []
+    if dry_run:
+        return [partitions.partition_name(m) for m in months]
+    return partitions.drop_partitions(months)
+
+
+def prune(now=None, org_ids=None, batch_size=None, sleep=0, dry_run=False, archive=False, limits=None):
+    """
+    Aplica la retención. Devuelve {"rollups", "deleted": {org_id: n},
+    "soft_deleted", "partitions_dropped", "partitions_created"}.
+    limits ({org_id: fecha}) reemplaza a las políticas de retención.
+    """
+    now = now or timezone.now()
+    result = {"rollups": 0, "deleted": {}, "soft_deleted": 0, "partitions_dropped": [], "partitions_created": []}
+    if dry_run:
+        # Sin refresh: se cuenta como si los rollups ya estuvieran al día
+        watermark = Measurement.all_objects.order_by("-id").values_list("id", flat=True).first() or 0
+    else:
+        result["rollups"] = refresh_rollups()
+        watermark = _rollup_watermark()
+    if limits is None:
+        limits = cutoffs(now, org_ids)
+
+    if partitions.is_partitioned():
+        if not dry_run:
+            result["partitions_created"] = partitions.ensure_partitions()
+        # DROP PARTITION no pasa por el archivo: solo cuando se borra de verdad
+        if not org_ids and not archive:
+            result["partitions_dropped"] = _drop_expired_partitions(limits, watermark, dry_run)
+
+    for org_id, cutoff in limits.items():
+        expired = Measurement.all_objects.filter(
+            device__organization_id=org_id, created_at__lt=cutoff, id__lte=watermark,
+        )
+        if archive:
+            # Lo borrado lógicamente no se archiva: lo purga el paso siguiente
+            expired = expired.filter(deleted_at__isnull=True)
+        deleted = delete_in_batches(expired, batch_size, sleep, dry_run, archive)
+        if deleted:
+            result["deleted"][org_id] = deleted
+
+    # Filas con borrado lógico viejo: ya nadie las muestra, solo ensucian los scans
+    soft = Measurement.all_objects.filter(
+        deleted_at__lt=now - timedelta(days=settings.RETENTION_SOFT_DELETE_DAYS), id__lte=watermark,
+    )
+    if org_ids:
+        soft = soft.filter(device__organization_id__in=org_ids)
+    result["soft_deleted"] = delete_in_batches(soft, batch_size, sleep, dry_run)
+
+    if not dry_run and (result["deleted"] or result["soft_deleted"] or result["partitions_dropped"]):
+        invalidate_org(*(org_ids or limits.keys()))
+    return result
+
+
+def archive_before(cutoff, org_ids=None, **options):
+    """Archiva (y quita de la tabla) las mediciones anteriores a cutoff."""
+    orgs = Organization.all_objects.values_list("id", flat=True)
+    if org_ids:
+        orgs = orgs.filter(id__in=org_ids)
+    return prune(org_ids=org_ids, archive=True, limits={org_id: cutoff for org_id in orgs}, **options)
@@ -0,0 +1,217 @@
+from datetime import timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum, Min, Max
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import Measurement, MeasurementRollup, RollupWatermark
+
+
+# ===============================
+# Rollups minute/hour/day de Measurement
+# ===============================
+# Incremental por id: cada corrida agrega solo las filas con id mayor a la
+# marca de agua guardada en RollupWatermark y combina min/max/sum/count con
+# los buckets existentes. Las filas que se borren después (también con borrado
+# lógico) no se descuentan; los gráficos sí ocultan los dispositivos borrados.
+#
+# Los ids no llegan en orden de commit: una transacción larga puede confirmar
+# ids más bajos que otra que ya terminó. La marca de agua no pasa un hueco en
+# la secuencia hasta que lleva WATERMARK_GAP_SECONDS (next_high_id); el mismo
+# criterio usa el detector de anomalías (core/anomaly.py).
+
+WATERMARK_NAME = "measurement_rollups"
+
+# Lotes de ids para consultas IN (SQLite limita la cantidad de parámetros)
+_ID_CHUNK = 500
+
+GRANULARITIES = [
+    MeasurementRollup.Granularity.MINUTE,
+    MeasurementRollup.Granularity.HOUR,
+    MeasurementRollup.Granularity.DAY,
+]
+
+
+def _contiguous(ids, start):
+    """Cuántos ids del principio siguen la secuencia start, start + 1, ..."""
+    breaks = np.flatnonzero(np.asarray(ids, dtype=np.int64) != np.arange(start, start + len(ids)))
+    return int(breaks[0]) if len(breaks) else len(ids)
+
+
+def _set_gap(watermark, seen_at):
+    if watermark.gap_seen_at != seen_at:
+        watermark.gap_seen_at = seen_at
+        RollupWatermark.objects.filter(id=watermark.id).update(gap_seen_at=seen_at)
+
+
+def next_high_id(watermark, batch_size):
+    """
+    Último id del próximo bloque (hasta batch_size ids > marca de agua) que ya
+    se puede procesar, o None. El bloque se corta en el primer hueco de la
+    secuencia: puede ser una transacción que todavía no hizo commit. Si el hueco
+    sigue pegado a la marca pasados WATERMARK_GAP_SECONDS se da por definitivo
+    (rollback o borrado) y se salta. Se llama dentro de la transacción que
+    bloquea la marca de agua.
+    """
+    low_id = watermark.last_measurement_id
+    ids = list(
+        Measurement.all_objects.filter(id__gt=low_id).order_by("id").values_list("id", flat=True)[:batch_size]
+    )
+    if not ids:
+        _set_gap(watermark, None)
+        return None
+    now = timezone.now()
+    # La primera corrida arranca en el id más bajo que haya
+    start = ids[0] if low_id == 0 else low_id + 1
+    ready = _contiguous(ids, start)
+    if ready == 0:
+        # Hueco pegado a la marca de agua: se espera antes de saltarlo
+        if watermark.gap_seen_at is None:
+            _set_gap(watermark, now)
+            return None
+        if now - watermark.gap_seen_at < timedelta(seconds=settings.WATERMARK_GAP_SECONDS):
+            return None
+        ready = _contiguous(ids, ids[0])
+    # Si el bloque terminó en un hueco, queda pegado a la nueva marca de agua
+    _set_gap(watermark, now if ready < len(ids) else None)
+    return ids[ready - 1]
+
+
+def _aggregate_range(low_id, high_id, granularity):
+    return (
+        Measurement.all_objects
+        .filter(id__gt=low_id, id__lte=high_id)
+        .annotate(bucket_start=Trunc("created_at", granularity, tzinfo=dt_timezone.utc))
+        .values("device_id", "bucket_start")
+        .annotate(n=Count("id"), total=Sum("value"), low=Min("value"), high=Max("value"))
+        .order_by()  # sin el ordering por defecto, que se metería en el GROUP BY
+    )
+
+
+def _merge(granularity, groups):
+    """Combina los grupos nuevos con los rollups existentes (update + create en bloque)."""
+    if not groups:
+        return
+    device_ids = sorted({g["device_id"] for g in groups})
+    buckets = {g["bucket_start"] for g in groups}
+    existing = {}
+    for i in range(0, len(device_ids), _ID_CHUNK):
+        for r in MeasurementRollup.objects.filter(
+            granularity=granularity,
+            device_id__in=device_ids[i:i + _ID_CHUNK],
+            bucket__gte=min(buckets),
+            bucket__lte=max(buckets),
+        ):
+            existing[(r.device_id, r.bucket)] = r
+
+    to_update, to_create = [], []
+    for g in groups:
+        rollup = existing.get((g["device_id"], g["bucket_start"]))
+        if rollup is None:
+            to_create.append(MeasurementRollup(
+                device_id=g["device_id"], granularity=granularity, bucket=g["bucket_start"],
+                count=g["n"], sum=g["total"], min=g["low"], max=g["high"],
+            ))
+            continue
+        rollup.count += g["n"]
+        rollup.sum += g["total"]
+        rollup.min = g["low"] if rollup.min is None else min(rollup.min, g["low"])
+        rollup.max = g["high"] if rollup.max is None else max(rollup.max, g["high"])
+        to_update.append(rollup)
+
+    MeasurementRollup.objects.bulk_create(to_create, batch_size=1000)
+    MeasurementRollup.objects.bulk_update(to_update, ["count", "sum", "min", "max"], batch_size=1000)
+
+
+def refresh_rollups(batch_size=None, max_batches=None):
+    """
+    Procesa las mediciones nuevas en bloques de batch_size ids, como mucho
+    max_batches bloques (None = hasta ponerse al día).
+    Devuelve cuántas mediciones se agregaron.
+    """
+    batch_size = batch_size or settings.ROLLUP_BATCH_SIZE
+    processed = batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=WATERMARK_NAME)
+            low_id = watermark.last_measurement_id
+            high_id = next_high_id(watermark, batch_size)
+            if high_id is None:
+                break
+
+            groups = {}
+            for granularity in GRANULARITIES:
+                groups[granularity] = list(_aggregate_range(low_id, high_id, granularity))
+                _merge(granularity, groups[granularity])
+
+            watermark.last_measurement_id = high_id
+            watermark.save(update_fields=["last_measurement_id", "updated_at"])
+            processed += sum(g["n"] for g in groups[MeasurementRollup.Granularity.DAY])
+        batches += 1
+    return processed
+
+
+def rebuild_rollups(batch_size=None):
+    """
+    Borra todos los rollups y los recalcula desde cero.
+    Ojo: lo ya podado por prune_measurements solo existe en los rollups y se pierde.
+    """
+    with transaction.atomic():
+        MeasurementRollup.objects.all().delete()
+        RollupWatermark.objects.filter(name=WATERMARK_NAME).update(last_measurement_id=0, gap_seen_at=None)
+    return refresh_rollups(batch_size)
+
+
+# ===============================
+# Lectura para gráficos
+# ===============================
+
+def _series_rows(granularity, since, device=None, org=None):
+    qs = MeasurementRollup.objects.filter(granularity=granularity, bucket__gte=since)
+    if device is not None:
+        qs = qs.filter(device=device)
+    else:
+        qs = qs.filter(device__deleted_at__isnull=True)
+        if org is not None:
+            qs = qs.filter(device__organization=org)
+    return (
+        qs.values("bucket")
+        .annotate(n=Sum("count"), total=Sum("sum"), low=Min("min"), high=Max("max"))
+        .order_by("bucket")
+    )
+
+
+def _points(rows):
+    points = [
+        {"bucket": r["bucket"], "avg": r["total"] / r["n"], "min": r["low"], "max": r["high"], "count": r["n"]}
+        for r in rows if r["n"]
+    ]
+    # Alto relativo de cada barra (0-100) para el mini gráfico de las plantillas
+    peak = max((p["avg"] for p in points), default=0)
+    for p in points:
+        p["pct"] = round(100 * p["avg"] / peak) if peak > 0 else 0
+    return points
+
+
+def series(granularity, since, device=None, org=None):
+    """
+    Serie agregada [{bucket, avg, min, max, count}] desde `since`.
+    Con device: la serie de ese dispositivo; si no, todos los de la org sumados.
+    """
+    return _points(list(_series_rows(granularity, since, device, org)))
+
+
+def _hourly_since(hours):
+    return timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=hours - 1)
+
+
+def hourly_series(hours=24, device=None, org=None):
+    return series(MeasurementRollup.Granularity.HOUR, _hourly_since(hours), device=device, org=org)
+
+
+async def ahourly_series(hours=24, device=None, org=None):
+    rows = _series_rows(MeasurementRollup.Granularity.HOUR, _hourly_since(hours), device, org)
+    return _points([r async for r in rows])
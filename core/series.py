@@ -0,0 +1,136 @@
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import Count, Max, Sum
+
+from . import archive
+from .models import Measurement, MeasurementRollup
+
+
+# ===============================
+# Series reducidas para gráficos
+# ===============================
+# Se elige la fuente más gruesa que todavía da al menos `points` valores en el
+# rango (rollups day/hour/minute o filas crudas + archivo frío) y se reduce con
+# NumPy: LTTB (forma de la curva) o min/max por bucket (banda). Un año de datos
+# por segundo sale de ~8.760 rollups horarios, no de 31M filas.
+
+MODE_LTTB = "lttb"
+MODE_MINMAX = "minmax"
+
+SOURCE_RAW = "raw"
+
+# De la más gruesa a la más fina
+_GRANULARITIES = [
+    (MeasurementRollup.Granularity.DAY, timedelta(days=1)),
+    (MeasurementRollup.Granularity.HOUR, timedelta(hours=1)),
+    (MeasurementRollup.Granularity.MINUTE, timedelta(minutes=1)),
+]
+
+
+def pick_source(start, end, points):
+    """Granularidad de rollup a usar, o SOURCE_RAW si el rango es corto."""
+    span = end - start
+    for granularity, width in _GRANULARITIES:
+        if span / width >= points:
+            return granularity
+    return SOURCE_RAW
+
+
+def _raw(device, start, end):
+    """(ts µs, value, value, value) del archivo frío + la tabla, ordenado por ts."""
+    cold = archive.read(device.id, start, end)
+    rows = list(
+        Measurement.objects.filter(device=device, created_at__gte=start, created_at__lte=end)
+        .order_by("created_at").values_list("created_at", "value")
+    )
+    ts = np.fromiter((archive.to_us(r[0]) for r in rows), dtype=float, count=len(rows))
+    values = np.fromiter((r[1] for r in rows), dtype=float, count=len(rows))
+    if len(cold):
+        ts = np.concatenate([cold["ts"].astype(float), ts])
+        values = np.concatenate([cold["value"], values])
+        order = np.argsort(ts, kind="stable")
+        ts, values = ts[order], values[order]
+    return ts, values, values, values
+
+
+def _rollups(device, granularity, start, end):
+    """(ts µs, avg, min, max) de los rollups del rango."""
+    rows = list(
+        MeasurementRollup.objects
+        .filter(device=device, granularity=granularity, bucket__gte=start, bucket__lte=end)
+        .order_by("bucket").values_list("bucket", "count", "sum", "min", "max")
+    )
+    if not rows:
+        return (np.empty(0),) * 4
+    buckets, count, total, low, high = zip(*rows)
+    ts = np.fromiter((archive.to_us(b) for b in buckets), dtype=float, count=len(rows))
+    avg = np.array(total, dtype=float) / np.maximum(np.array(count, dtype=float), 1)
+    return ts, avg, np.array(low, dtype=float), np.array(high, dtype=float)
+
+
+def lttb(x, y, n_out):
+    """Índices elegidos por Largest-Triangle-Three-Buckets (siempre incluye extremos)."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    chosen = np.empty(n_out, dtype=np.int64)
+    chosen[0], chosen[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        chosen[i + 1] = a
+    return chosen
+
+
+def minmax(x, low, high, n_out):
+    """(inicio, min, max) de n_out buckets de igual cantidad de puntos."""
+    n = len(x)
+    if n <= n_out:
+        return x, low, high
+    edges = np.linspace(0, n, n_out + 1).astype(np.int64)[:-1]
+    return x[edges], np.minimum.reduceat(low, edges), np.maximum.reduceat(high, edges)
+
+
+def fingerprint(device_id, start, end, points):
+    """
+    Resumen de los datos que usaría device_series (para el ETag): cantidad y
+    máximo de la fuente elegida en el rango. Cambia al llegar lecturas nuevas,
+    al actualizarse un rollup o al podar/archivar filas del rango.
+    """
+    source = pick_source(start, end, points)
+    if source == SOURCE_RAW:
+        rows = Measurement.objects.filter(device_id=device_id, created_at__gte=start, created_at__lte=end)
+        summary = rows.aggregate(n=Count("id"), last=Max("id"), newest=Max("created_at"))
+    else:
+        rows = MeasurementRollup.objects.filter(
+            device_id=device_id, granularity=source, bucket__gte=start, bucket__lte=end,
+        )
+        summary = rows.aggregate(n=Count("id"), samples=Sum("count"), newest=Max("bucket"))
+    return f"{source}:" + ":".join(str(summary[k]) for k in sorted(summary))
+
+
+def device_series(device, start, end, points, mode=MODE_LTTB):
+    """
+    {"source", "mode", "count", "points"}: points es [[ts_ms, valor]] en modo
+    lttb o [[ts_ms, min, max]] en modo minmax.
+    """
+    source = pick_source(start, end, points)
+    if source == SOURCE_RAW:
+        ts, avg, low, high = _raw(device, start, end)
+    else:
+        ts, avg, low, high = _rollups(device, source, start, end)
+
+    ms = ts / 1000
+    if mode == MODE_MINMAX:
+        x, lo, hi = minmax(ms, low, high, points)
+        data = np.column_stack([x.round(), lo, hi]).tolist()
+    else:
+        idx = lttb(ms, avg, points)
+        data = np.column_stack([ms[idx].round(), avg[idx]]).tolist()
+    return {"source": str(source), "mode": mode, "count": int(len(ts)), "points": data}
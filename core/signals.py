@@ -1,7 +1,11 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Account
+from .models import Account, Category, Device, DeviceState, Measurement, Alert, Zone
+from .cache import invalidate_org
+from . import device_search, device_state, live
 
 @receiver(post_save, sender=User)
 def create_account_for_user(sender, instance, created, **kwargs):
@@ -14,3 +18,73 @@ def create_account_for_user(sender, instance, created, **kwargs):
             user=instance,
             defaults={"organization": None, "role": Account.Role.MEMBER}
         )
+
+
+def _organization_id(instance):
+    if isinstance(instance, Device):
+        return instance.organization_id
+    # Measurement / Alert: usar el device ya cargado si lo hay
+    device = instance._state.fields_cache.get("device")
+    if device is not None:
+        return device.organization_id
+    return Device.all_objects.filter(pk=instance.device_id).values_list("organization_id", flat=True).first()
+
+
+@receiver(post_save, sender=Device)
+@receiver(post_save, sender=Measurement)
+@receiver(post_save, sender=Alert)
+@receiver(post_delete, sender=Device)
+@receiver(post_delete, sender=Measurement)
+@receiver(post_delete, sender=Alert)
+def invalidate_org_cache(sender, instance, **kwargs):
+    """
+    Cualquier cambio en Device/Measurement/Alert invalida la caché del dashboard
+    de su organización. Las escrituras masivas (bulk_create, update) no disparan
+    señales: esas rutas llaman a invalidate_org por su cuenta.
+    Las Measurement/Alert nuevas además despiertan el stream en vivo.
+    """
+    org_id = _organization_id(instance)
+    invalidate_org(org_id)
+    if sender is not Device and kwargs.get("created"):
+        transaction.on_commit(lambda: live.notify(org_id))
+
+
+@receiver(post_save, sender=Device)
+@receiver(post_save, sender=Measurement)
+@receiver(post_save, sender=Alert)
+@receiver(post_delete, sender=Alert)
+def update_device_state(sender, instance, **kwargs):
+    """
+    Mantiene DeviceState para las escrituras de a una (admin, shell). Las rutas
+    masivas (ingesta, alertas en lote, acciones del workflow) lo hacen por su cuenta.
+    Borrar una medición no lo retrocede: para eso está rebuild_device_state.
+    Las alertas que caen en cascada al borrar su dispositivo (u organización)
+    no se tocan: el DeviceState se borra con el dispositivo.
+    """
+    if sender is Device:
+        if kwargs.get("created"):
+            device_state.ensure([instance.id])
+        else:
+            # DeviceState copia la organización (índice del orden por última lectura)
+            DeviceState.objects.filter(device=instance).exclude(organization_id=instance.organization_id).update(
+                organization_id=instance.organization_id,
+            )
+    elif sender is Measurement:
+        device_state.record_readings([instance.device_id], [instance.value], [instance.created_at])
+    elif kwargs["signal"] is post_delete:
+        # post_delete: solo si se borró la alerta en sí, y sin crear filas
+        origin = kwargs.get("origin")
+        origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+        if origin_model is Alert:
+            device_state.refresh_alerts([instance.device_id], create=False)
+    else:
+        device_state.refresh_alerts([instance.device_id])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Zone)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Zone)
+def invalidate_device_filters(sender, instance, **kwargs):
+    """Las opciones de filtro de device_list se cachean por organización."""
+    device_search.invalidate_filter_options(instance.organization_id)
@@ -0,0 +1,192 @@
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Min, Sum
+from django.utils import timezone
+
+from .models import Measurement, MeasurementRollup
+
+
+# ===============================
+# Estadísticas por dispositivo
+# ===============================
+# Para un conjunto de dispositivos y una ventana: una consulta (por bloques de
+# ids) ordenada por (device, created_at) y una sola pasada de NumPy con
+# ufunc.reduceat sobre los grupos contiguos. Nada se calcula dispositivo por
+# dispositivo. El resultado va a la caché por (ventana, device) y vence por
+# TTL (STATS_CACHE_TTL): las escrituras de la organización no lo descartan,
+# así una ingesta constante no obliga a releer todas las lecturas crudas.
+# Los listados usan summary_for(), que sale de los rollups por hora.
+
+WINDOWS = {
+    "24h": timedelta(hours=24),
+    "7d": timedelta(days=7),
+    "30d": timedelta(days=30),
+}
+DEFAULT_WINDOW = "24h"
+
+PERCENTILES = (50, 95, 99)
+
+# Lotes de ids para consultas IN (SQLite limita la cantidad de parámetros)
+_ID_CHUNK = 500
+
+
+def _fetch(device_ids, since):
+    """Arrays (device_id, value) ordenados por device y luego por tiempo."""
+    ids, values = [], []
+    for i in range(0, len(device_ids), _ID_CHUNK):
+        rows = (
+            Measurement.objects
+            .filter(device_id__in=device_ids[i:i + _ID_CHUNK], created_at__gte=since)
+            .order_by("device_id", "created_at", "id")
+            .values_list("device_id", "value")
+        )
+        for device_id, value in rows.iterator(chunk_size=10000):
+            ids.append(device_id)
+            values.append(value)
+    return np.array(ids, dtype=np.int64), np.array(values, dtype=float)
+
+
+def _percentiles(values, device_ids, starts, counts):
+    """Percentiles por grupo con interpolación lineal, sin recorrer grupos."""
+    ordered = values[np.lexsort((values, device_ids))]
+    result = {}
+    for q in PERCENTILES:
+        pos = starts + (counts - 1) * (q / 100)
+        low = np.floor(pos).astype(np.int64)
+        high = np.minimum(low + 1, starts + counts - 1)
+        frac = pos - low
+        result[q] = ordered[low] * (1 - frac) + ordered[high] * frac
+    return result
+
+
+def rolling_z(values, group_start, window):
+    """
+    z de cada lectura contra las `window` anteriores del MISMO dispositivo
+    (media y desvío por sumas acumuladas). 0 si hay menos de 2 previas.
+    Cada dispositivo se centra en su propia media antes de acumular: las sumas
+    quedan del orden del desvío y no se pierde precisión con valores grandes
+    ni con muchas lecturas.
+    """
+    n = len(values)
+    if not n:
+        return np.zeros(0)
+    starts, group = np.unique(group_start, return_inverse=True)
+    counts = np.diff(np.append(starts, n))
+    centered = values - (np.add.reduceat(values, starts) / counts)[group]
+    c1 = np.concatenate([[0.0], np.cumsum(centered)])
+    c2 = np.concatenate([[0.0], np.cumsum(centered * centered)])
+    index = np.arange(n)
+    first = np.maximum(index - window, group_start)
+    k = index - first
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = (c1[index] - c1[first]) / k
+        var = (c2[index] - c2[first]) / k - mean * mean
+        std = np.sqrt(np.maximum(var, 0))
+        z = (centered - mean) / std
+    return np.where((k >= 2) & (std > 1e-12), z, 0.0)
+
+
+def compute(device_ids, since, rolling_window=None, z_threshold=None):
+    """{device_id: {count, mean, std, min, max, p50, p95, p99, last_z, max_z, anomalies}}."""
+    rolling_window = rolling_window or settings.STATS_ROLLING_WINDOW
+    z_threshold = z_threshold or settings.STATS_Z_THRESHOLD
+    device_ids = sorted(set(device_ids))
+    result = {device_id: {"count": 0} for device_id in device_ids}
+
+    ids, values = _fetch(device_ids, since)
+    if not len(ids):
+        return result
+
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    counts = np.diff(np.r_[starts, len(ids)])
+    sums = np.add.reduceat(values, starts)
+    means = sums / counts
+    # Desvío sobre las diferencias a la media (sin restar cuadrados grandes)
+    deviations = values - np.repeat(means, counts)
+    stds = np.sqrt(np.add.reduceat(deviations * deviations, starts) / counts)
+    mins = np.minimum.reduceat(values, starts)
+    maxs = np.maximum.reduceat(values, starts)
+    pct = _percentiles(values, ids, starts, counts)
+
+    group_start = np.repeat(starts, counts)
+    z = rolling_z(values, group_start, rolling_window)
+    abs_z = np.abs(z)
+    max_z = np.maximum.reduceat(abs_z, starts)
+    anomalies = np.add.reduceat((abs_z >= z_threshold).astype(np.int64), starts)
+    last_z = z[starts + counts - 1]
+
+    for i, device_id in enumerate(ids[starts].tolist()):
+        result[device_id] = {
+            "count": int(counts[i]),
+            "mean": float(means[i]),
+            "std": float(stds[i]),
+            "min": float(mins[i]),
+            "max": float(maxs[i]),
+            **{f"p{q}": float(pct[q][i]) for q in PERCENTILES},
+            "last_z": float(last_z[i]),
+            "max_z": float(max_z[i]),
+            "anomalies": int(anomalies[i]),
+        }
+    return result
+
+
+def _cache_key(device_id, window):
+    return f"stats:{window}:{device_id}"
+
+
+def stats_for(devices, window=DEFAULT_WINDOW):
+    """Estadísticas cacheadas de cada Device, {device_id: dict}; calcula solo lo que falta."""
+    if window not in WINDOWS:
+        raise ValueError(f"Unknown window: {window}")
+    keys = {device.id: _cache_key(device.id, window) for device in devices}
+    cached = cache.get_many(list(keys.values()))
+    result = {device_id: cached[key] for device_id, key in keys.items() if key in cached}
+
+    missing = [device_id for device_id in keys if device_id not in result]
+    if missing:
+        fresh = compute(missing, timezone.now() - WINDOWS[window])
+        cache.set_many({keys[device_id]: data for device_id, data in fresh.items()}, settings.STATS_CACHE_TTL)
+        result.update(fresh)
+    return result
+
+
+def summary_for(devices, window=DEFAULT_WINDOW):
+    """
+    Resumen liviano para listados, {device_id: {count, mean, min, max}}, desde
+    los rollups por hora: unas pocas filas por dispositivo en vez de todas las
+    lecturas de la ventana. La hora en curso aparece cuando corre refresh_rollups.
+    """
+    if window not in WINDOWS:
+        raise ValueError(f"Unknown window: {window}")
+    device_ids = sorted({device.id for device in devices})
+    since = (timezone.now() - WINDOWS[window]).replace(minute=0, second=0, microsecond=0)
+    result = {device_id: {"count": 0} for device_id in device_ids}
+    for i in range(0, len(device_ids), _ID_CHUNK):
+        rows = (
+            MeasurementRollup.objects
+            .filter(
+                device_id__in=device_ids[i:i + _ID_CHUNK],
+                granularity=MeasurementRollup.Granularity.HOUR, bucket__gte=since,
+            )
+            .values("device_id")
+            .annotate(n=Sum("count"), total=Sum("sum"), low=Min("min"), high=Max("max"))
+            .order_by()
+        )
+        for row in rows:
+            if row["n"]:
+                result[row["device_id"]] = {
+                    "count": row["n"], "mean": row["total"] / row["n"], "min": row["low"], "max": row["high"],
+                }
+    return result
+
+
+def attach(devices, window=DEFAULT_WINDOW):
+    """Pone device.stats (summary_for) en cada dispositivo, para las plantillas de listados."""
+    devices = list(devices)
+    by_device = summary_for(devices, window)
+    for device in devices:
+        device.stats = by_device[device.id]
+    return devices
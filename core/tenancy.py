@@ -0,0 +1,72 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from .models import Account
+
+
+# ===============================
+# Contexto de tenant por request
+# ===============================
+# Account + Organization del usuario se cargan UNA vez (select_related) y se
+# memorizan sobre el objeto user, que vive lo que dura el request. Los helpers
+# de views.py / admin.py leen de acá en vez de recorrer user.account.organization.
+
+class TenantContext:
+    __slots__ = ("account", "organization")
+
+    def __init__(self, account=None):
+        self.account = account
+        organization = account.organization if account and account.organization_id else None
+        # Organización con borrado lógico = como si no tuviera
+        self.organization = organization if organization and organization.deleted_at is None else None
+
+    @property
+    def organization_id(self):
+        return self.organization.id if self.organization else None
+
+    @property
+    def role(self):
+        return self.account.role if self.account else None
+
+
+def tenant_for(user):
+    tenant = getattr(user, "_tenant", None)
+    if tenant is not None:
+        return tenant
+    account = None
+    if user is not None and user.is_authenticated:
+        account = Account.objects.select_related("organization").filter(user_id=user.pk).first()
+        if account is not None:
+            # Cualquier acceso restante a user.account ya no va a la base
+            user._state.fields_cache["account"] = account
+    tenant = TenantContext(account)
+    if user is not None:
+        user._tenant = tenant
+    return tenant
+
+
+class TenantMiddleware:
+    """
+    Precarga request.tenant (va después de AuthenticationMiddleware). Bajo ASGI
+    corre async: la consulta va por sync_to_async sin pasar toda la cadena a sync.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.tenant = tenant_for(request.user)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        user = await request.auser()
+        # request.user ya resuelto: las plantillas lo leen sin ir a la base en contexto async
+        request.user = user
+        request.tenant = await sync_to_async(tenant_for)(user)
+        return await self.get_response(request)
@@ -1,3 +1,1208 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import re
+import tempfile
+import threading
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+from unittest import mock
 
-# prueba aca
+import numpy as np
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.http import StreamingHttpResponse
+from django.conf import settings
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.test import TestCase, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import alerting, anomaly, archive, cache as org_cache, benchmarks, device_state, ingest, jobs, live, partitions, retention, rollups, stats, workflow
+
+from .dashboard import dashboard_querysets
+from .middleware import RequestMetricsMiddleware
+from .pagination import EstimatedCountPaginator, paginate_keyset
+from .tenancy import TenantMiddleware
+from .models import (
+    Organization, Category, Zone, Device, DeviceState, Measurement, Alert, AlertAudit, AlertThreshold, Account, Job,
+    MeasurementRollup, RetentionPolicy, RollupWatermark,
+)
+
+
+def make_org_user(org, username="member@example.com", role=Account.Role.MEMBER):
+    user = User.objects.create_user(username=username, email=username, password="secret")
+    Account.objects.filter(user=user).update(organization=org, role=role)
+    return user
+
+
+def make_device(org, name, category=None, zone=None):
+    category = category or Category.objects.get_or_create(name="Cat", organization=org)[0]
+    zone = zone or Zone.objects.get_or_create(name="Zone", organization=org)[0]
+    return Device.objects.create(name=name, category=category, zone=zone, organization=org)
+
+
+class DashboardQueryCountTests(TestCase):
+    """El dashboard hace la misma cantidad de queries con 10 o 1000 categorías."""
+
+    # sesión + usuario + account/organization + 6 agregados + grid de dispositivos
+    EXPECTED_QUERIES = 10
+
+    def setUp(self):
+        cache.clear()
+        self.org = Organization.objects.create(name="Org")
+        self.user = make_org_user(self.org)
+        self.client.force_login(self.user)
+
+    def _populate(self, n):
+        categories = Category.objects.bulk_create(
+            [Category(name=f"Cat {i}", organization=self.org) for i in range(n)]
+        )
+        zones = Zone.objects.bulk_create(
+            [Zone(name=f"Zone {i}", organization=self.org) for i in range(n)]
+        )
+        devices = Device.objects.bulk_create([
+            Device(name=f"Device {i}", category=c, zone=z, organization=self.org)
+            for i, (c, z) in enumerate(zip(categories, zones))
+        ])
+        Measurement.objects.bulk_create([Measurement(device=d, value=10) for d in devices[:20]])
+        Alert.objects.bulk_create([
+            Alert(device=d, message="x", priority=p)
+            for d in devices[:5] for p in ("grave", "alto", "medio")
+        ])
+
+    def _assert_constant_queries(self, n):
+        self._populate(n)
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get(reverse("dashboard"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["devices_by_category"]), n)
+        self.assertEqual(response.context["grave_count"], 5)
+
+    def test_10_categories(self):
+        self._assert_constant_queries(10)
+
+    def test_1000_categories(self):
+        self._assert_constant_queries(1000)
+
+
+class OrgCacheTests(TestCase):
+    """Caché por organización: las escrituras suben la versión y un solo worker recalcula."""
+
+    def setUp(self):
+        cache.clear()
+        self.org = Organization.objects.create(name="Org")
+        self.device = make_device(self.org, "Meter")
+        self.calls = 0
+
+    def _compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_writes_bump_the_version(self):
+        writes = [
+            lambda: Measurement.objects.create(device=self.device, value=1),
+            lambda: Device.objects.filter(pk=self.device.pk).get().save(),
+            lambda: Alert.objects.create(device=self.device, message="x", priority="medio"),
+        ]
+        self.assertEqual(org_cache.cached_for_org(self.org.id, "block", self._compute), 1)
+        self.assertEqual(org_cache.cached_for_org(self.org.id, "block", self._compute), 1)
+        for expected, write in enumerate(writes, start=2):
+            version, global_version = org_cache.org_version(self.org.id), org_cache.org_version(None)
+            write()
+            self.assertGreater(org_cache.org_version(self.org.id), version)
+            self.assertGreater(org_cache.org_version(None), global_version)
+            self.assertEqual(org_cache.cached_for_org(self.org.id, "block", self._compute), expected)
+
+    def test_other_org_is_untouched(self):
+        other = Organization.objects.create(name="Other")
+        version = org_cache.org_version(other.id)
+        Measurement.objects.create(device=self.device, value=1)
+        self.assertEqual(org_cache.org_version(other.id), version)
+
+    def test_only_one_concurrent_miss_recomputes(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return self._compute()
+
+        results = []
+        first = threading.Thread(target=lambda: results.append(org_cache.cached_for_org(self.org.id, "slow", slow)))
+        first.start()
+        self.assertTrue(started.wait(5))
+        # El segundo encuentra el lock tomado (el primero sigue calculando hasta
+        # que el timer lo suelta): espera el valor en vez de recalcular
+        timer = threading.Timer(0.2, release.set)
+        timer.start()
+        second = org_cache.cached_for_org(self.org.id, "slow", slow)
+        first.join(5)
+        timer.join()
+        self.assertEqual((self.calls, results, second), (1, [1], 1))
+
+
+class ExplainDashboardTests(TestCase):
+    """explain_dashboard: ninguna consulta del dashboard recorre una tabla entera ni ordena en memoria."""
+
+    def test_plans_are_clean(self):
+        org = Organization.objects.create(name="Org")
+        devices = [make_device(org, f"D{i}") for i in range(12)]
+        Measurement.objects.bulk_create([Measurement(device=d, value=i) for i, d in enumerate(devices)])
+        device_state.rebuild()
+        Alert.objects.create(device=devices[0], message="x", priority="grave")
+        out = io.StringIO()
+        call_command("explain_dashboard", stdout=out)
+        self.assertIn("OK         latest_measurements", out.getvalue())
+
+    def test_latest_and_recent_match_a_plain_sort(self):
+        org = Organization.objects.create(name="Org")
+        devices = [make_device(org, f"D{i}") for i in range(15)]
+        make_device(Organization.objects.create(name="Other"), "Foreign")
+        now = timezone.now()
+        Measurement.objects.bulk_create([
+            Measurement(device=d, value=j, created_at=now - timedelta(minutes=i * 7 + j * 3))
+            for i, d in enumerate(devices) for j in range(4)
+        ])
+        device_state.rebuild()
+        Alert.objects.bulk_create([Alert(device=d, message="x") for d in devices[::2]])
+        qs = dashboard_querysets(org)
+        expected = Measurement.objects.filter(device__organization=org).order_by("-created_at")[:10]
+        self.assertEqual([m.id for m in qs["latest_measurements"]], [m.id for m in expected])
+        recent = list(qs["recent_alerts"])
+        self.assertEqual(len(recent), 5)
+        self.assertEqual({a.device.organization_id for a in recent}, {org.id})
+
+
+@tag("benchmark")
+class BenchmarkTests(TestCase):
+    """
+    Corre el harness de benchmarks sobre un dataset chico. Si existe el
+    baseline (settings.BENCHMARK_BASELINE) falla ante regresiones.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dataset = benchmarks.seed_dataset(orgs=2, devices=20, measurements_per_device=20)
+
+    def test_every_endpoint_within_baseline(self):
+        results = benchmarks.run_benchmarks(repeat=2)
+        self.assertGreaterEqual(set(results), {
+            "dashboard", "device_list", "device_detail", "measurement_list", "alert_list", "alerts_week",
+            "admin_measurement", "admin_alert", "admin_device",
+        })
+        for name, result in results.items():
+            self.assertEqual(result["status"], 200, name)
+
+        baseline = benchmarks.load_baseline(settings.BENCHMARK_BASELINE)
+        if baseline is None:
+            return
+        try:
+            regressions = benchmarks.compare(results, baseline, settings.BENCHMARK_THRESHOLD, self.dataset)
+        except benchmarks.BaselineMismatch as exc:
+            self.skipTest(str(exc))
+        self.assertEqual(regressions, [])
+
+    def test_baseline_of_another_dataset_is_refused(self):
+        baseline = {"dataset": {**self.dataset, "devices": 50}, "results": {}}
+        with self.assertRaises(benchmarks.BaselineMismatch):
+            benchmarks.compare({}, baseline, 0.25, self.dataset)
+
+    def test_does_not_clear_the_project_cache(self):
+        cache.set("bench-sentinel", 1)
+        benchmarks.run_benchmarks(repeat=1)
+        self.assertEqual(cache.get("bench-sentinel"), 1)
+
+
+class LiveStreamTests(TestCase):
+    """El stream SSE solo se abre bajo ASGI con ASGI_LIVE: con WSGI no ocupa workers."""
+
+    def setUp(self):
+        cache.clear()
+        self.org = Organization.objects.create(name="Org")
+        self.client.force_login(make_org_user(self.org))
+
+    def test_wsgi_request_gets_204(self):
+        with self.settings(ASGI_LIVE=True):
+            response = self.client.get(reverse("live_stream"))
+        self.assertEqual(response.status_code, 204)
+
+    def test_dashboard_omits_event_source_when_disabled(self):
+        response = self.client.get(reverse("dashboard"))
+        self.assertNotContains(response, "EventSource")
+
+    def _channel(self):
+        channel = live._OrgChannel(self.org.id, None)
+        async_to_sync(channel.start)()
+        return channel
+
+    def test_poll_waits_for_rows_committed_out_of_order(self):
+        device = make_device(self.org, "Sensor")
+        other = make_device(Organization.objects.create(name="Other"), "Ajeno")
+        channel = self._channel()
+        base = channel.cursors[Measurement].last_id
+        # base + 1 todavía sin commit; base + 2 (otra organización) y base + 3 ya confirmados
+        Measurement.objects.create(id=base + 2, device=other, value=2)
+        Measurement.objects.create(id=base + 3, device=device, value=3)
+        self.assertEqual(async_to_sync(channel.poll)(), [])
+
+        Measurement.objects.create(id=base + 1, device=device, value=1)
+        events = async_to_sync(channel.poll)()
+        ids = [json.loads(e.split("data: ")[1])["id"] for e in events]
+        self.assertEqual(ids, [base + 1, base + 3])
+        self.assertEqual(channel.cursors[Measurement].last_id, base + 3)
+
+    def test_poll_skips_gap_after_timeout(self):
+        device = make_device(self.org, "Sensor")
+        channel = self._channel()
+        base = channel.cursors[Measurement].last_id
+        Measurement.objects.create(id=base + 2, device=device, value=2)
+        with self.settings(LIVE_GAP_SECONDS=0):
+            self.assertEqual(async_to_sync(channel.poll)(), [])
+            self.assertEqual(len(async_to_sync(channel.poll)()), 1)
+        self.assertEqual(channel.cursors[Measurement].last_id, base + 2)
+
+    async def test_run_survives_poll_errors(self):
+        channel = live._OrgChannel(self.org.id, None)
+        queue = asyncio.Queue()
+        channel.subscribers.add(queue)
+        poll = mock.AsyncMock(side_effect=[RuntimeError("db down"), ["event"]])
+        with self.settings(LIVE_POLL_INTERVAL=0.01), \
+                mock.patch.object(channel, "start", mock.AsyncMock()), \
+                mock.patch.object(channel, "poll", poll), \
+                self.assertLogs("core.live", "ERROR"):
+            task = asyncio.create_task(channel.run())
+            try:
+                self.assertEqual(await asyncio.wait_for(queue.get(), 1), "event")
+            finally:
+                channel.subscribers.clear()
+                task.cancel()
+        self.assertEqual(poll.await_count, 2)
+
+
+class RequestMetricsTests(TestCase):
+    """Server-Timing solo para staff (o DEBUG); el middleware no fuerza sync bajo ASGI."""
+
+    def setUp(self):
+        cache.clear()
+        self.org = Organization.objects.create(name="Org")
+        self.user = make_org_user(self.org)
+
+    def test_member_gets_no_server_timing(self):
+        self.client.force_login(self.user)
+        with self.settings(METRICS_SAMPLE_RATE=1.0):
+            response = self.client.get(reverse("dashboard"))
+        self.assertNotIn("Server-Timing", response)
+
+    def test_staff_gets_server_timing(self):
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        self.client.force_login(self.user)
+        with self.settings(METRICS_SAMPLE_RATE=1.0):
+            response = self.client.get(reverse("dashboard"))
+        self.assertIn("db;dur=", response["Server-Timing"])
+
+    async def test_async_request_stays_async(self):
+        async def get_response(request):
+            return None
+
+        self.assertTrue(iscoroutinefunction(RequestMetricsMiddleware(get_response)))
+        self.assertTrue(iscoroutinefunction(TenantMiddleware(get_response)))
+
+        await sync_to_async(User.objects.filter(pk=self.user.pk).update)(is_staff=True)
+        await self.async_client.aforce_login(self.user)
+        with self.settings(METRICS_SAMPLE_RATE=1.0):
+            for name in ("dashboard_async", "device_list_async", "alert_list_async"):
+                response = await self.async_client.get(reverse(name))
+                self.assertEqual(response.status_code, 200)
+                # Las queries del ORM async (en otro hilo) también se cuentan
+                queries = int(re.search(r'desc="(\d+) queries"', response["Server-Timing"]).group(1))
+                self.assertGreater(queries, 0, name)
+
+
+class AsyncViewTests(TestCase):
+    """Las vistas async devuelven lo mismo que sus versiones sync, con el mismo scoping por organización."""
+
+    def setUp(self):
+        cache.clear()
+        self.org = Organization.objects.create(name="Org")
+        self.device = make_device(self.org, "Mine")
+        self.foreign = make_device(Organization.objects.create(name="Other"), "Foreign")
+        for device in (self.device, self.foreign):
+            Measurement.objects.bulk_create([Measurement(device=device, value=v) for v in (10, 20, 30)])
+            Alert.objects.create(device=device, message="x", priority="alto")
+        user = make_org_user(self.org)
+        self.client.force_login(user)
+        self.async_client.force_login(user)
+
+    def _pair(self, name, *args, **params):
+        sync = self.client.get(reverse(name, args=args), params)
+        cache.clear()
+        response = async_to_sync(self.async_client.get)(reverse(f"{name}_async", args=args), params)
+        self.assertEqual((sync.status_code, response.status_code), (200, 200))
+        return sync.context, response.context
+
+    @staticmethod
+    def _ids(items):
+        return [item.id for item in items]
+
+    def test_listings_match_and_are_scoped(self):
+        for name, key in (("device_list", "devices"), ("measurement_list", "measurements"),
+                          ("alert_list", "alerts"), ("alerts_week", "alerts")):
+            sync, result = self._pair(name)
+            self.assertEqual(self._ids(result[key]), self._ids(sync[key]), name)
+            self.assertTrue(result[key], name)
+            owner = (lambda item: item) if key == "devices" else (lambda item: item.device)
+            self.assertEqual({owner(item).organization_id for item in result[key]}, {self.org.id}, name)
+
+    def test_device_list_filters_match(self):
+        sync, result = self._pair("device_list", q="Mi", sort="-last_seen")
+        self.assertEqual(self._ids(result["devices"]), [self.device.id])
+        self.assertEqual(result["selected"], sync["selected"])
+
+    def test_dashboard_matches(self):
+        sync, result = self._pair("dashboard")
+        for key in ("devices_by_category", "devices_by_zone", "grave_count", "alto_count", "medio_count"):
+            self.assertEqual(result[key], sync[key], key)
+        for key in ("latest_measurements", "recent_alerts", "devices"):
+            self.assertEqual(self._ids(result[key]), self._ids(sync[key]), key)
+        self.assertEqual(self._ids(result["devices"]), [self.device.id])
+
+    def test_device_detail_matches_and_is_scoped(self):
+        sync, result = self._pair("device_detail", self.device.id)
+        for key in ("measurements", "alerts"):
+            self.assertEqual(self._ids(result[key]), self._ids(sync[key]), key)
+        self.assertEqual(result["stats"], sync["stats"])
+        self.assertEqual(result["hourly_series"], sync["hourly_series"])
+        response = async_to_sync(self.async_client.get)(reverse("device_detail_async", args=[self.foreign.id]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ExportViewTests(TestCase):
+    """Exports en streaming: CSV y NDJSON, límites de fecha, filtros y scoping por organización."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        override = self.settings(ARCHIVE_ROOT=tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.org = Organization.objects.create(name="Org")
+        self.device = make_device(self.org, "Meter")
+        foreign = make_device(Organization.objects.create(name="Other"), "Foreign")
+        day = datetime(2026, 1, 10, tzinfo=dt_timezone.utc)
+        self.rows = Measurement.objects.bulk_create([
+            Measurement(device=self.device, value=1, created_at=day),
+            Measurement(device=self.device, value=2, created_at=day + timedelta(hours=23, minutes=59)),
+            Measurement(device=self.device, value=3, created_at=day + timedelta(days=1)),
+            Measurement(device=foreign, value=4, created_at=day),
+        ])
+        Alert.objects.create(device=self.device, message="mine", priority="alto")
+        Alert.objects.create(device=foreign, message="theirs", priority="alto")
+        self.client.force_login(make_org_user(self.org))
+
+    def _get(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        if response.status_code != 200:
+            return response, None
+        self.assertIsInstance(response, StreamingHttpResponse)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_csv(self):
+        response, body = self._get("measurement_export")
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertIn('filename="measurements.csv"', response["Content-Disposition"])
+        lines = body.splitlines()
+        self.assertEqual(lines[0], "id,device_id,device_name,value,created_at")
+        # Solo la organización del usuario
+        self.assertEqual([line.split(",")[3] for line in lines[1:]], ["1.0", "2.0", "3.0"])
+
+    def test_ndjson(self):
+        response, body = self._get("alert_export", format="ndjson")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([(r["device_id"], r["message"], r["priority"]) for r in rows], [(self.device.id, "mine", "alto")])
+
+    def test_bounds_are_inclusive_by_day(self):
+        _, body = self._get("measurement_export", format="ndjson", start="2026-01-10", end="2026-01-10")
+        self.assertEqual([json.loads(line)["value"] for line in body.splitlines()], [1, 2])
+        _, body = self._get("measurement_export", format="ndjson", start="2026-01-10T23:59:00+00:00")
+        self.assertEqual([json.loads(line)["value"] for line in body.splitlines()], [2, 3])
+
+    def test_device_filter_is_scoped(self):
+        foreign_id = self.rows[3].device_id
+        _, body = self._get("measurement_export", format="ndjson", device=foreign_id)
+        self.assertEqual(body, "")
+
+    def test_invalid_parameters(self):
+        for params in ({"start": "yesterday"}, {"end": "2026-13-40"}, {"device": "x"}, {"format": "xml"}):
+            response, _ = self._get("measurement_export", **params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+class IngestTests(TestCase):
+    """Ingesta por lotes: rechazos por fila, scoping por organización y límites de tamaño."""
+
+    def setUp(self):
+        cache.clear()
+        self.org = Organization.objects.create(name="Org")
+        self.device = make_device(self.org, "Meter")
+        self.foreign = make_device(Organization.objects.create(name="Other"), "Foreign")
+        self.client.force_login(make_org_user(self.org, role=Account.Role.ORG_ADMIN))
+
+    def _post(self, body, content_type="application/x-ndjson"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse("measurement_ingest"), body, content_type=content_type)
+
+    def test_accepts_valid_rows_and_rejects_the_rest(self):
+        body = "\n".join([
+            f'{{"device": {self.device.id}, "value": 10}}',
+            f'{{"device": {self.foreign.id}, "value": 10}}',
+            "not json",
+            f'{{"device": {self.device.id}, "value": "x"}}',
+        ])
+        data = self._post(body).json()
+        self.assertEqual(data["accepted"], 1)
+        self.assertEqual([r["row"] for r in data["rejected"]], [2, 3, 4])
+        self.assertEqual(list(Measurement.objects.values_list("device_id", flat=True)), [self.device.id])
+        self.assertEqual(DeviceState.objects.get(device=self.device).last_value, 10)
+
+    def test_csv(self):
+        body = f"device,value\n{self.device.id},1.5\n{self.device.id},2.5\n"
+        self.assertEqual(self._post(body, "text/csv").json()["accepted"], 2)
+
+    def test_too_many_rows_stops_parsing(self):
+        body = "\n".join(f'{{"device": {self.device.id}, "value": 1}}' for _ in range(4))
+        with self.assertRaises(ingest.IngestError):
+            ingest.parse_batch(body.encode(), ingest.FORMAT_NDJSON, max_rows=3)
+        with self.settings(INGEST_MAX_ROWS=3):
+            response = self._post(body)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Measurement.objects.exists())
+
+    def test_out_of_range_device_id_is_a_row_rejection(self):
+        body = "\n".join([
+            '{"device": 100000000000000000000, "value": 1}',
+            '{"device": true, "value": 1}',
+            f'{{"device": {self.device.id}, "value": 1}}',
+        ])
+        response = self._post(body)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["accepted"], [r["row"] for r in data["rejected"]]), (1, [1, 2]))
+
+    def test_json_array_is_read_incrementally(self):
+        row = f'{{"device": {self.device.id}, "value": 1}}'
+        self.assertEqual(self._post(f" [ {row} , {row} ] ").json()["accepted"], 2)
+        self.assertEqual(self._post("[]").json()["accepted"], 0)
+        for bad in (f"[{row},]", f"[{row}] x", f"[{row} {row}]", "[1, "):
+            self.assertEqual(self._post(bad).status_code, 400, bad)
+        # Cortado en el límite: el resto (aunque sea inválido) no se decodifica
+        body = f"[{row}, {row}, {row}, {row}, not json"
+        with self.assertRaisesMessage(ingest.IngestError, "Batch too large"):
+            ingest.parse_batch(body.encode(), ingest.FORMAT_NDJSON, max_rows=3)
+
+    def test_oversize_payload_rejected_before_reading(self):
+        body = f'{{"device": {self.device.id}, "value": 1}}\n' * 10
+        with self.settings(DATA_UPLOAD_MAX_MEMORY_SIZE=100):
+            response = self._post(body)
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Measurement.objects.exists())
+
+
+class KeysetPaginationTests(TestCase):
+    """Recorrer por cursor (con created_at repetidos) devuelve cada fila una vez, en orden, en ambos sentidos."""
+
+    def setUp(self):
+        cache.clear()
+        self.org = Organization.objects.create(name="Org")
+        device = make_device(self.org, "Meter")
+        base = timezone.now()
+        # Grupos de 3 alertas con el mismo created_at: el desempate es el id
+        alerts = Alert.objects.bulk_create([Alert(device=device, message=str(i)) for i in range(10)])
+        for i, alert in enumerate(alerts):
+            Alert.objects.filter(pk=alert.pk).update(created_at=base - timedelta(minutes=i // 3))
+        self.expected = list(Alert.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+
+    def test_forward_and_backward(self):
+        pages, cursor = [], None
+        while True:
+            page = paginate_keyset(Alert.objects.all(), cursor, page_size=4)
+            pages.append([a.id for a in page])
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual([len(p) for p in pages], [4, 4, 2])
+        self.assertEqual(sum(pages, []), self.expected)
+
+        back = []
+        while page.has_previous:
+            page = paginate_keyset(Alert.objects.all(), page.prev_cursor, page_size=4)
+            back.insert(0, [a.id for a in page])
+        self.assertEqual(back, pages[:-1])
+
+    def test_view_rejects_invalid_cursor(self):
+        self.client.force_login(make_org_user(self.org))
+        self.assertEqual(self.client.get(reverse("alert_list"), {"cursor": "garbage"}).status_code, 400)
+        response = self.client.get(reverse("alert_list"), {"size": 4})
+        self.assertEqual([a.id for a in response.context["alerts"]], self.expected[:4])
+
+
+class AlertingTests(TestCase):
+    """Motor de umbrales: bandas, regla del dispositivo sobre la de su categoría y deduplicación."""
+
+    def setUp(self):
+        self.org = Organization.objects.create(name="Org")
+        self.device = make_device(self.org, "Meter")
+        self.other = make_device(self.org, "Other")
+        AlertThreshold.objects.create(organization=self.org, category=self.device.category, medio=10, alto=20, grave=30)
+
+    def _evaluate(self, device, *values):
+        return alerting.evaluate_batch([device.id] * len(values), list(values))
+
+    def test_band_boundaries(self):
+        bands = alerting.band_matrix([self.device.id])
+        levels = alerting.classify(np.array([9.99, 10, 19.99, 20, 30, 1e9]), np.repeat(bands, 6, axis=0))
+        self.assertEqual(levels.tolist(), [0, 1, 1, 2, 3, 3])
+
+    def test_device_rule_overrides_category(self):
+        AlertThreshold.objects.create(organization=self.org, device=self.device, grave=100)
+        bands = alerting.band_matrix([self.device.id, self.other.id])
+        self.assertTrue(np.isnan(bands[0, :2]).all())
+        self.assertEqual(bands[0, 2], 100)
+        self.assertEqual(bands[1].tolist(), [10, 20, 30])
+        self.assertEqual(self._evaluate(self.device, 50), [])
+
+    def test_one_alert_per_device_with_the_highest_band(self):
+        alerts = self._evaluate(self.device, 12, 35, 25)
+        self.assertEqual([(a.device_id, a.priority) for a in alerts], [(self.device.id, "grave")])
+        self.assertIn("35", alerts[0].message)
+        self.assertEqual(DeviceState.objects.get(device=self.device).open_alert_count, 1)
+
+    def test_dedupes_against_open_alerts(self):
+        self._evaluate(self.device, 25)
+        # Misma prioridad o menor: nada nuevo; mayor: una alerta más
+        self.assertEqual(self._evaluate(self.device, 22, 12), [])
+        self.assertEqual([a.priority for a in self._evaluate(self.device, 31)], ["grave"])
+        self.assertEqual(self._evaluate(self.device, 40), [])
+
+    def test_new_alert_after_acknowledge(self):
+        self._evaluate(self.device, 25)
+        Alert.objects.filter(device=self.device).update(acknowledged=True)
+        self.assertEqual([a.priority for a in self._evaluate(self.device, 21)], ["alto"])
+
+
+class DeviceStateSignalTests(TestCase):
+    """DeviceState sigue a las escrituras de a una y no rompe los borrados en cascada."""
+
+    def setUp(self):
+        self.org = Organization.objects.create(name="Org")
+        self.device = make_device(self.org, "D1")
+
+    def test_alerts_update_open_summary(self):
+        grave = Alert.objects.create(device=self.device, message="x", priority="grave")
+        Alert.objects.create(device=self.device, message="y", priority="medio")
+        state = DeviceState.objects.get(device=self.device)
+        self.assertEqual((state.open_alert_count, state.highest_open_priority_label), (2, "grave"))
+
+        grave.delete()
+        state.refresh_from_db()
+        self.assertEqual((state.open_alert_count, state.highest_open_priority_label), (1, "medio"))
+
+    def test_measurement_only_moves_forward(self):
+        now = timezone.now()
+        Measurement.objects.create(device=self.device, value=5, created_at=now)
+        Measurement.objects.create(device=self.device, value=9, created_at=now - timedelta(hours=1))
+        state = DeviceState.objects.get(device=self.device)
+        self.assertEqual((state.last_value, state.last_seen_at), (5, now))
+
+    def test_deleting_device_with_alerts(self):
+        Alert.objects.create(device=self.device, message="x", priority="alto")
+        self.device.delete()
+        connection.check_constraints()
+        self.assertFalse(DeviceState.objects.exists())
+
+    def test_bulk_deleting_devices_with_alerts(self):
+        Alert.objects.create(device=self.device, message="x", priority="alto")
+        Device.objects.filter(id=self.device.id).delete()
+        connection.check_constraints()
+        self.assertFalse(DeviceState.objects.exists())
+
+
+class SeedTests(TestCase):
+    """manage.py seed: carga con bulk_create y deja el estado derivado al día."""
+
+    def _seed(self, **options):
+        options = {"orgs": 2, "devices": 5, "measurements_per_device": 3, "seed": 1, **options}
+        call_command("seed", stdout=io.StringIO(), **options)
+
+    def _snapshot(self):
+        return (
+            list(Device.objects.order_by("id").values_list("name", "category__name", "zone__name")),
+            list(Measurement.objects.order_by("id").values_list("device__name", "device__organization__name", "value")),
+            list(Alert.objects.order_by("id").values_list("device__name", "priority")),
+        )
+
+    def test_counts(self):
+        self._seed(orgs=2, devices=4, measurements_per_device=5, alerts_ratio=0.5)
+        self.assertEqual(Organization.objects.count(), 2)
+        self.assertEqual(Device.objects.count(), 8)
+        self.assertEqual(Measurement.objects.count(), 40)
+        self.assertEqual(Alert.objects.count(), 20)
+        self.assertEqual(set(Measurement.objects.values_list("device", flat=True)), set(Device.objects.values_list("id", flat=True)))
+
+    def test_same_seed_same_data(self):
+        self._seed(seed=7)
+        first = self._snapshot()
+        self._seed(seed=7)
+        self.assertEqual(self._snapshot(), first)
+        self._seed(seed=8)
+        self.assertNotEqual(self._snapshot(), first)
+
+    def test_invalid_counts(self):
+        for options in ({"devices": 0}, {"orgs": -1}, {"measurements_per_device": -5},
+                        {"batch_size": 0}, {"alerts_ratio": 2}, {"days": 0}):
+            with self.assertRaises(CommandError, msg=options):
+                self._seed(**options)
+        self.assertFalse(Device.objects.exists())
+
+    def test_fills_device_state(self):
+        self._seed()
+        self.assertEqual(DeviceState.objects.count(), 10)
+        self.assertFalse(DeviceState.objects.filter(last_seen_at__isnull=True).exists())
+        open_alerts = Alert.objects.filter(device_id=OuterRef("device_id"), acknowledged=False)
+        self.assertFalse(
+            DeviceState.objects.annotate(expected=Exists(open_alerts))
+            .filter(expected=True, open_alert_count=0).exists()
+        )
+
+
+class SoftDeleteAlertTests(TestCase):
+    """Las alertas de un dispositivo borrado desaparecen de listados y dashboard, y vuelven con restore()."""
+
+    def setUp(self):
+        cache.clear()
+        self.org = Organization.objects.create(name="Org")
+        self.device = make_device(self.org, "Gone")
+        self.alert = Alert.objects.create(device=self.device, message="x", priority="grave")
+        self.client.force_login(make_org_user(self.org))
+
+    def _visible(self):
+        listed = [a.id for a in self.client.get(reverse("alert_list")).context["alerts"]]
+        week = [a.id for a in self.client.get(reverse("alerts_week")).context["alerts"]]
+        dashboard = self.client.get(reverse("dashboard")).context
+        recent = [a.id for a in dashboard["recent_alerts"]]
+        return listed, week, recent, dashboard["grave_count"]
+
+    def test_cascade_and_restore(self):
+        self.assertEqual(self._visible(), ([self.alert.id], [self.alert.id], [self.alert.id], 1))
+        Device.objects.filter(pk=self.device.pk).soft_delete()
+        self.assertEqual(self._visible(), ([], [], [], 0))
+        Device.all_objects.filter(pk=self.device.pk).restore()
+        self.assertEqual(self._visible(), ([self.alert.id], [self.alert.id], [self.alert.id], 1))
+
+
+class AlertWorkflowTests(TestCase):
+    """Acciones masivas: por bloques, con auditoría y reanudables por cursor."""
+
+    def setUp(self):
+        self.org = Organization.objects.create(name="Org")
+        self.device = make_device(self.org, "D1")
+        self.alerts = Alert.objects.bulk_create(
+            [Alert(device=self.device, message=str(i), priority="medio") for i in range(5)]
+        )
+
+    def test_acknowledge_writes_audit_and_state(self):
+        device_state.rebuild()
+        updated, cursor, done = workflow.apply(workflow.ACKNOWLEDGE, Alert.objects.all())
+        self.assertEqual((updated, cursor, done), (5, self.alerts[-1].id, True))
+        self.assertFalse(Alert.objects.filter(acknowledged=False).exists())
+        self.assertEqual(AlertAudit.objects.filter(action=workflow.ACKNOWLEDGE).count(), 5)
+        self.assertEqual(DeviceState.objects.get(device=self.device).open_alert_count, 0)
+
+    def test_escalate_resumes_without_escalating_twice(self):
+        alerts = Alert.objects.all()
+        updated, cursor, done = workflow.apply(workflow.ESCALATE, alerts, chunk_size=2, time_budget=0)
+        self.assertEqual((updated, done), (2, False))
+        while not done:
+            n, cursor, done = workflow.apply(workflow.ESCALATE, alerts, chunk_size=2, time_budget=0, after=cursor)
+            updated += n
+        self.assertEqual(updated, 5)
+        self.assertEqual(set(Alert.objects.values_list("priority", flat=True)), {"alto"})
+        self.assertEqual(AlertAudit.objects.count(), 5)
+
+    def test_snooze_skips_alerts_already_snoozed(self):
+        until = timezone.now() + timedelta(hours=1)
+        workflow.apply(workflow.SNOOZE, Alert.objects.all(), until=until)
+        updated, _, done = workflow.apply(workflow.SNOOZE, Alert.objects.all(), until=until)
+        self.assertEqual((updated, done), (0, True))
+
+    def test_bulk_api_passes_cursor_back(self):
+        self.client.force_login(make_org_user(self.org, role=Account.Role.ORG_ADMIN))
+        url = reverse("alert_bulk_action")
+        body = {"action": "escalate", "filter": {"device": self.device.id}}
+        with self.settings(ALERT_ACTION_CHUNK_SIZE=3, ALERT_ACTION_TIME_BUDGET=0):
+            first = self.client.post(url, body, content_type="application/json").json()
+            self.assertEqual((first["updated"], first["done"]), (3, False))
+            second = self.client.post(url, {**body, "cursor": first["cursor"]}, content_type="application/json").json()
+        self.assertEqual((second["updated"], second["done"]), (2, True))
+        self.assertEqual(set(Alert.objects.values_list("priority", flat=True)), {"alto"})
+
+    def test_filter_alerts_validation(self):
+        alerts = Alert.objects.all()
+        self.assertEqual(workflow.filter_alerts(alerts, {"priority": ["medio"], "acknowledged": False}).count(), 5)
+        for params in ({}, {"acknowledged": "false"}, {"priority": "urgente"}, {"device": "x"}, {"prioirty": "medio"}):
+            with self.assertRaises(workflow.WorkflowError, msg=params):
+                workflow.filter_alerts(alerts, params)
+        self.assertEqual(workflow.filter_alerts(alerts, {"all": True}).count(), 5)
+
+    def test_bulk_api_rejects_empty_filter(self):
+        self.client.force_login(make_org_user(self.org, role=Account.Role.ORG_ADMIN))
+        response = self.client.post(
+            reverse("alert_bulk_action"), {"action": "close", "filter": {}}, content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Alert.objects.filter(closed_at__isnull=False).exists())
+
+
+class JobQueueTests(TestCase):
+    """Cola de trabajos: un solo worker gana cada trabajo y los errores se reintentan."""
+
+    def setUp(self):
+        self.org = Organization.objects.create(name="Org")
+
+    def test_claim_is_exclusive(self):
+        job = jobs.enqueue("refresh_rollups")
+        claimed = jobs.claim("w1")
+        self.assertEqual((claimed.id, claimed.status, claimed.attempts), (job.id, Job.Status.RUNNING, 1))
+        self.assertIsNone(jobs.claim("w2"))
+
+    def test_failure_is_retried_with_backoff_then_fails(self):
+        job = jobs.enqueue("alert_action", {"action": "nope", "filter": {"all": True}}, max_attempts=2)
+        jobs.run_job(jobs.claim("w1"))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.PENDING, 1))
+        self.assertGreater(job.run_after, timezone.now())
+
+        Job.objects.filter(id=job.id).update(run_after=timezone.now())
+        jobs.run_job(jobs.claim("w1"))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.FAILED, 2))
+        self.assertIn("WorkflowError", job.error)
+
+    def test_stale_job_is_requeued(self):
+        jobs.enqueue("refresh_rollups")
+        job = jobs.claim("w1")
+        Job.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(jobs.claim("w2").attempts, 2)
+
+    def test_alert_action_job_finishes(self):
+        device = make_device(self.org, "D1")
+        Alert.objects.bulk_create([Alert(device=device, message=str(i), priority="medio") for i in range(7)])
+        jobs.enqueue("alert_action", {"action": "escalate", "filter": {"all": True}}, organization=self.org)
+        with self.settings(ALERT_ACTION_CHUNK_SIZE=2, ALERT_ACTION_TIME_BUDGET=0):
+            self.assertEqual(jobs.work(burst=True), 1)
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.result), (Job.Status.DONE, {"updated": 7, "done": True}))
+        self.assertEqual(set(Alert.objects.values_list("priority", flat=True)), {"alto"})
+
+    def test_background_export_matches_sync(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        live = make_device(self.org, "Live")
+        gone = make_device(self.org, "Gone")
+        Alert.objects.create(device=live, message="live", priority="alto")
+        Alert.objects.create(device=gone, message="gone", priority="alto")
+        Device.objects.filter(pk=gone.pk).soft_delete()
+        self.client.force_login(make_org_user(self.org))
+        url = reverse("alert_export")
+        with self.settings(JOB_OUTPUT_ROOT=Path(tmp.name)):
+            sync = b"".join(self.client.get(url, {"format": "ndjson"}).streaming_content).decode()
+            self.assertEqual(self.client.get(url, {"format": "ndjson", "background": 1}).status_code, 202)
+            self.assertEqual(jobs.work(burst=True), 1)
+            background = jobs.export_path(Job.objects.get()).read_text()
+        self.assertEqual(background, sync)
+        self.assertEqual([json.loads(line)["message"] for line in sync.splitlines()], ["live"])
+
+
+class DeviceSearchTests(TestCase):
+    """device_list: búsqueda, filtros, estado y orden por última lectura con cursor."""
+
+    def setUp(self):
+        cache.clear()
+        self.org = Organization.objects.create(name="Org")
+        pumps = Category.objects.create(name="Pumps", organization=self.org)
+        valves = Category.objects.create(name="Valves", organization=self.org)
+        self.fresh = make_device(self.org, "Pump 1", category=pumps)
+        self.stale = make_device(self.org, "Pump 2", category=valves)
+        self.silent = make_device(self.org, "Valve", category=valves)
+        make_device(Organization.objects.create(name="Other"), "Pump other")
+        now = timezone.now()
+        device_state.record_readings([self.fresh.id, self.stale.id], [1.0, 2.0], [now, now - timedelta(hours=2)])
+        self.client.force_login(make_org_user(self.org))
+
+    def _names(self, **params):
+        response = self.client.get(reverse("device_list"), params)
+        self.assertEqual(response.status_code, 200)
+        return [d.name for d in response.context["devices"]], response.context["page"]
+
+    def test_search_and_filters(self):
+        self.assertEqual(self._names(q="pump")[0], ["Pump 1", "Pump 2"])
+        self.assertEqual(self._names(category=self.stale.category_id)[0], ["Pump 2", "Valve"])
+        self.assertEqual(self._names(status="online")[0], ["Pump 1"])
+        self.assertEqual(self._names(status="offline")[0], ["Pump 2", "Valve"])
+        self.assertEqual(self._names(sort="bogus", category="all")[0], ["Pump 1", "Pump 2", "Valve"])
+
+    def test_sort_by_last_seen_pages_through_nulls(self):
+        names, page = self._names(sort="-last_seen", size=2)
+        self.assertEqual(names, ["Pump 1", "Pump 2"])
+        rest, page = self._names(sort="-last_seen", size=2, cursor=page.next_cursor)
+        self.assertEqual(rest, ["Valve"])
+        self.assertFalse(page.has_next)
+        self.assertEqual(self._names(sort="last_seen")[0], ["Valve", "Pump 2", "Pump 1"])
+
+
+class DeviceSeriesTests(TestCase):
+    """Serie reducida de un dispositivo: solo para usuarios de su organización."""
+
+    def setUp(self):
+        cache.clear()
+        self.org = Organization.objects.create(name="Org")
+        self.device = make_device(self.org, "D1")
+        now = timezone.now()
+        Measurement.objects.bulk_create(
+            [Measurement(device=self.device, value=i, created_at=now - timedelta(minutes=i)) for i in range(50)]
+        )
+        self.url = reverse("device_series", args=[self.device.id])
+
+    def test_member_gets_series(self):
+        self.client.force_login(make_org_user(self.org))
+        start = (timezone.now() - timedelta(hours=2)).isoformat()
+        data = self.client.get(self.url, {"start": start, "points": 500}).json()
+        self.assertEqual((data["device"], data["source"], data["count"]), (self.device.id, "raw", 50))
+        self.assertEqual(len(data["points"]), 50)
+
+    def test_etag_follows_the_data(self):
+        self.client.force_login(make_org_user(self.org))
+        now = timezone.now()
+        params = {"start": (now - timedelta(hours=2)).isoformat(), "end": now.isoformat(), "points": 500}
+        etag = self.client.get(self.url, params)["ETag"]
+        self.assertEqual(self.client.get(self.url, params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Measurement.objects.create(device=self.device, value=1, created_at=timezone.now() - timedelta(hours=1))
+        response = self.client.get(self.url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_user_without_org_is_forbidden(self):
+        user = User.objects.create_user(username="nobody@example.com", password="secret")
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"x"').status_code, 403)
+
+    def test_other_org_gets_404(self):
+        self.client.force_login(make_org_user(Organization.objects.create(name="Other")))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class RollingZTests(TestCase):
+    """rolling_z no pierde precisión con valores grandes ni con muchos dispositivos."""
+
+    @staticmethod
+    def _naive(values, window):
+        z = []
+        for i, value in enumerate(values):
+            prev = values[max(0, i - window):i]
+            std = np.std(prev) if len(prev) >= 2 else 0
+            z.append((value - np.mean(prev)) / std if std > 1e-12 else 0.0)
+        return np.array(z)
+
+    def test_matches_direct_computation_per_group(self):
+        rng = np.random.default_rng(0)
+        # Un dispositivo con valores enormes seguido de otro con valores chicos
+        big = 1e9 + rng.normal(0, 0.5, 300)
+        small = rng.normal(10, 2, 300)
+        values = np.concatenate([big, small])
+        group_start = np.repeat([0, 300], 300)
+        z = stats.rolling_z(values, group_start, 20)
+        expected = np.concatenate([self._naive(big, 20), self._naive(small, 20)])
+        np.testing.assert_allclose(z, expected, atol=1e-6)
+
+
+class StatsTests(TestCase):
+    """Estadísticas: caché por dispositivo con TTL y resumen de listados desde los rollups."""
+
+    def setUp(self):
+        cache.clear()
+        self.org = Organization.objects.create(name="Org")
+        self.device = make_device(self.org, "Meter")
+        now = timezone.now()
+        Measurement.objects.bulk_create(
+            [Measurement(device=self.device, value=v, created_at=now - timedelta(minutes=v)) for v in (1, 2, 3, 6)]
+            + [Measurement(device=self.device, value=100, created_at=now - timedelta(days=3))]
+        )
+        rollups.refresh_rollups()
+
+    def test_summary_from_rollups(self):
+        summary = stats.summary_for([self.device])[self.device.id]
+        self.assertEqual(summary, {"count": 4, "mean": 3.0, "min": 1.0, "max": 6.0})
+        other = make_device(self.org, "Empty")
+        self.assertEqual(stats.summary_for([other])[other.id], {"count": 0})
+
+    def test_cache_is_per_device_and_survives_org_writes(self):
+        self.assertEqual(stats.stats_for([self.device])[self.device.id]["count"], 4)
+        # Una escritura de la organización ya no descarta lo cacheado (vence por TTL)
+        Measurement.objects.create(device=self.device, value=5)
+        self.assertEqual(stats.stats_for([self.device])[self.device.id]["count"], 4)
+        cache.clear()
+        self.assertEqual(stats.stats_for([self.device])[self.device.id]["count"], 5)
+
+    def test_device_list_does_not_read_raw_measurements(self):
+        self.client.force_login(make_org_user(self.org))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("device_list"))
+        self.assertEqual(response.context["devices"][0].stats["count"], 4)
+        table = Measurement._meta.db_table
+        self.assertFalse([q for q in queries.captured_queries if f'FROM "{table}"' in q["sql"]])
+
+
+class RollupTests(TestCase):
+    """Rollups incrementales: la marca de agua no pasa ids que todavía pueden aparecer."""
+
+    def setUp(self):
+        self.org = Organization.objects.create(name="Org")
+        self.device = make_device(self.org, "D1")
+        self.at = timezone.now().replace(second=0, microsecond=0) - timedelta(hours=1)
+
+    def _add(self, *values):
+        return Measurement.objects.bulk_create(
+            [Measurement(device=self.device, value=v, created_at=self.at) for v in values]
+        )
+
+    def _minute(self):
+        return MeasurementRollup.objects.get(device=self.device, granularity="minute")
+
+    def test_refresh_merges_into_existing_buckets(self):
+        self._add(1, 2, 3)
+        self.assertEqual(rollups.refresh_rollups(), 3)
+        self._add(10, -1)
+        self.assertEqual(rollups.refresh_rollups(), 2)
+        minute = self._minute()
+        self.assertEqual((minute.count, minute.sum, minute.min, minute.max), (5, 15, -1, 10))
+        self.assertEqual(MeasurementRollup.objects.filter(granularity="day").get().count, 5)
+
+    def test_gap_holds_the_watermark_until_it_expires(self):
+        rows = self._add(1, 2, 3, 4, 5)
+        # Un id intermedio que todavía no se ve (transacción sin commit)
+        Measurement.all_objects.filter(id=rows[2].id).delete()
+        self.assertEqual(rollups.refresh_rollups(), 2)
+        self.assertEqual(rollups.refresh_rollups(), 0)
+        watermark = RollupWatermark.objects.get(name=rollups.WATERMARK_NAME)
+        self.assertEqual(watermark.last_measurement_id, rows[1].id)
+
+        RollupWatermark.objects.filter(id=watermark.id).update(gap_seen_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(rollups.refresh_rollups(), 2)
+        self.assertEqual(self._minute().count, 4)
+
+    def test_max_batches_bounds_the_work(self):
+        self._add(*range(10))
+        self.assertEqual(rollups.refresh_rollups(batch_size=3, max_batches=2), 6)
+        self.assertEqual(rollups.refresh_rollups(batch_size=3), 4)
+
+
+class AnomalyTests(TestCase):
+    """Detector EWMA: alerta ante un salto y respeta la marca de agua."""
+
+    def setUp(self):
+        self.org = Organization.objects.create(name="Org")
+        self.device = make_device(self.org, "D1")
+
+    def _add(self, values):
+        return Measurement.objects.bulk_create([Measurement(device=self.device, value=v) for v in values])
+
+    def test_spike_raises_an_alert(self):
+        self._add([10 + (i % 3) * 0.1 for i in range(40)] + [500])
+        processed, created = anomaly.run(detector=anomaly.Detector())
+        self.assertEqual((processed, created), (41, 1))
+        self.assertEqual(Alert.objects.get().priority, "grave")
+
+    def test_waits_for_missing_ids(self):
+        rows = self._add([10, 11, 12, 13])
+        Measurement.all_objects.filter(id=rows[1].id).delete()
+        detector = anomaly.Detector()
+        self.assertEqual(anomaly.run(detector=detector), (1, 0))
+        self.assertEqual(anomaly.run(detector=detector, max_batches=1), (0, 0))
+        RollupWatermark.objects.filter(name=anomaly.WATERMARK_NAME).update(
+            gap_seen_at=timezone.now() - timedelta(hours=1),
+        )
+        self.assertEqual(anomaly.run(detector=detector), (2, 0))
+
+
+class RetentionTests(TestCase):
+    """Poda de Measurement: límites por organización, dry run, borrado lógico viejo y lotes."""
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.kept = Organization.objects.create(name="Policy")
+        self.default = Organization.objects.create(name="Default")
+        RetentionPolicy.objects.create(organization=self.kept, keep_days=10)
+        self.policy_device = make_device(self.kept, "P")
+        self.default_device = make_device(self.default, "D")
+        for device in (self.policy_device, self.default_device):
+            Measurement.objects.bulk_create([
+                Measurement(device=device, value=days, created_at=self.now - timedelta(days=days))
+                for days in (1, 5, 15, 25, 45)
+            ])
+
+    def _ages(self, device):
+        return sorted(Measurement.all_objects.filter(device=device).values_list("value", flat=True))
+
+    def test_policy_overrides_default(self):
+        with self.settings(MEASUREMENT_RETENTION_DAYS=30):
+            limits = retention.cutoffs(self.now)
+            result = retention.prune(self.now)
+        self.assertEqual(limits, {
+            self.kept.id: self.now - timedelta(days=10),
+            self.default.id: self.now - timedelta(days=30),
+        })
+        self.assertEqual(result["deleted"], {self.kept.id: 3, self.default.id: 1})
+        self.assertEqual(self._ages(self.policy_device), [1, 5])
+        self.assertEqual(self._ages(self.default_device), [1, 5, 15, 25])
+
+    def test_without_default_only_policies_apply(self):
+        with self.settings(MEASUREMENT_RETENTION_DAYS=None):
+            self.assertEqual(list(retention.cutoffs(self.now)), [self.kept.id])
+
+    def test_dry_run_deletes_nothing(self):
+        with self.settings(MEASUREMENT_RETENTION_DAYS=30):
+            result = retention.prune(self.now, dry_run=True)
+        self.assertEqual(result["deleted"], {self.kept.id: 3, self.default.id: 1})
+        self.assertEqual(Measurement.all_objects.count(), 10)
+        self.assertFalse(RollupWatermark.objects.exists())
+
+    def test_purges_old_soft_deleted_rows(self):
+        Measurement.objects.filter(device=self.default_device, value__in=[1, 5]).update(
+            deleted_at=self.now - timedelta(days=40),
+        )
+        Measurement.objects.filter(device=self.default_device, value=15).update(deleted_at=self.now)
+        with self.settings(MEASUREMENT_RETENTION_DAYS=None, RETENTION_SOFT_DELETE_DAYS=30):
+            result = retention.prune(self.now)
+        self.assertEqual(result["soft_deleted"], 2)
+        self.assertEqual(self._ages(self.default_device), [15, 25, 45])
+
+    def test_batches(self):
+        queryset = Measurement.objects.filter(device=self.policy_device)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(retention.delete_in_batches(queryset, batch_size=2), 5)
+        deletes = [q["sql"] for q in queries.captured_queries if q["sql"].startswith("DELETE")]
+        self.assertEqual(len(deletes), 3)
+        self.assertEqual(self._ages(self.policy_device), [])
+        # Un lote exacto: la vuelta siguiente encuentra la tabla vacía y termina
+        self.assertEqual(retention.delete_in_batches(Measurement.objects.filter(device=self.default_device), batch_size=5), 5)
+
+    def test_partition_drop_waits_for_every_org_and_for_rollups(self):
+        months = [date(2020, 1, 1), date(2020, 2, 1)]
+        Measurement.objects.all().delete()
+        old = Measurement.objects.create(device=self.default_device, value=1)
+        Measurement.objects.filter(pk=old.pk).update(created_at=datetime(2020, 1, 5, tzinfo=dt_timezone.utc))
+        limits = {self.kept.id: datetime(2020, 3, 1, tzinfo=dt_timezone.utc)}
+        with mock.patch.object(partitions, "existing_months", return_value=months), \
+                mock.patch.object(partitions, "drop_partitions", side_effect=lambda m: [partitions.partition_name(x) for x in m]):
+            # Una organización sin límite: no se suelta nada
+            self.assertEqual(retention._drop_expired_partitions(limits, watermark=old.id, dry_run=False), [])
+            limits[self.default.id] = datetime(2020, 2, 15, tzinfo=dt_timezone.utc)
+            # Filas sin pasar a rollups: tampoco
+            self.assertEqual(retention._drop_expired_partitions(limits, watermark=old.id - 1, dry_run=False), [])
+            self.assertEqual(retention._drop_expired_partitions(limits, watermark=old.id, dry_run=False), ["p202001"])
+
+
+class ArchiveTests(TestCase):
+    """Archivo frío: un segmento por lote, unidos al final, y visible en los exports."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        override = self.settings(ARCHIVE_ROOT=tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.org = Organization.objects.create(name="Org")
+        self.device = make_device(self.org, "D1")
+        self.at = datetime(2026, 1, 10, tzinfo=dt_timezone.utc)
+
+    def _rows(self, ids):
+        return [(i, self.device.id, self.at + timedelta(minutes=i), float(i)) for i in ids]
+
+    def test_batches_are_segments_until_compacted(self):
+        touched = archive.write_rows(self._rows(range(1, 4)))
+        touched |= archive.write_rows(self._rows(range(3, 6)))  # el 3 repetido (corrida cortada)
+        self.assertEqual(len(list(archive.device_dir(self.device.id).glob("*.seg.npy"))), 2)
+        self.assertEqual(archive.read(self.device.id)["id"].tolist(), [1, 2, 3, 4, 5])
+
+        archive.compact(touched)
+        self.assertEqual([p.name for p in archive.device_dir(self.device.id).iterdir()], ["2026-01.npy"])
+        self.assertEqual(archive.read(self.device.id)["id"].tolist(), [1, 2, 3, 4, 5])
+        self.assertEqual([m.id for m in archive.latest(self.device, 2)], [5, 4])
+
+    def test_archive_before_moves_rows(self):
+        Measurement.objects.bulk_create(
+            [Measurement(device=self.device, value=i, created_at=self.at + timedelta(days=i)) for i in range(40)]
+        )
+        result = retention.archive_before(self.at + timedelta(days=35), batch_size=7)
+        self.assertEqual(result["deleted"], {self.org.id: 35})
+        self.assertEqual(Measurement.objects.count(), 5)
+        self.assertEqual(len(archive.read(self.device.id)), 35)
+        self.assertFalse(list(archive.device_dir(self.device.id).glob("*.seg.npy")))
+
+    def test_admin_export_all_includes_archive(self):
+        archive.compact(archive.write_rows(self._rows([1, 2])))
+        live = Measurement.objects.create(device=self.device, value=7)
+        self.client.force_login(User.objects.create_superuser("root", "root@example.com", "secret"))
+        response = self.client.post(reverse("admin:core_measurement_changelist"), {
+            "action": "export_csv", "select_across": "1", "index": "0", "_selected_action": [live.id],
+        })
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([line.split(",")[0] for line in lines[1:]], ["1", "2", str(live.id)])
+
+
+class AdminChangelistTests(TestCase):
+    """Changelists del admin sobre tablas grandes: conteo acotado sin cortar la paginación."""
+
+    def setUp(self):
+        self.org = Organization.objects.create(name="Org")
+        self.devices = [make_device(self.org, f"D{i}") for i in range(5)]
+
+    def test_capped_count_is_a_lower_bound(self):
+        queryset = Device.objects.filter(organization=self.org).order_by("id")
+        with self.settings(ADMIN_COUNT_LIMIT=3):
+            paginator = EstimatedCountPaginator(queryset, 2)
+            self.assertEqual((paginator.count, paginator.count_is_lower_bound), (3, True))
+            self.assertEqual(list(paginator.page(3).object_list), self.devices[4:])
+            self.assertEqual(list(paginator.page(4).object_list), [])
+
+    def test_exact_count_below_the_cap(self):
+        paginator = EstimatedCountPaginator(Device.objects.filter(organization=self.org).order_by("id"), 2)
+        self.assertEqual((paginator.count, paginator.count_is_lower_bound), (5, False))
+
+    def test_org_admin_sees_lower_bound(self):
+        user = make_org_user(self.org, role=Account.Role.ORG_ADMIN)
+        User.objects.filter(id=user.id).update(is_staff=True)
+        self.client.force_login(user)
+        with self.settings(ADMIN_COUNT_LIMIT=3):
+            response = self.client.get(reverse("admin:core_device_changelist"))
+        self.assertContains(response, "≥ 3")
+
+    def test_audit_changelist_queries_do_not_grow_with_rows(self):
+        alert = Alert.objects.create(device=self.devices[0], message="x", priority="medio")
+        self.client.force_login(User.objects.create_superuser("root", "root@example.com", "secret"))
+        url = reverse("admin:core_alertaudit_changelist")
+        AlertAudit.objects.create(alert=alert, action=workflow.ACKNOWLEDGE)
+        with CaptureQueriesContext(connection) as one:
+            self.client.get(url)
+        AlertAudit.objects.bulk_create([AlertAudit(alert=alert, action=workflow.ESCALATE) for _ in range(10)])
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(url)
+        self.assertEqual(len(one.captured_queries), len(many.captured_queries))
@@ -1,16 +1,37 @@
 from django.urls import path
-from . import views
+from . import views, views_async
 
 urlpatterns = [
     path("", views.dashboard, name="dashboard"),
 
     path("devices/", views.device_list, name="device_list"),
     path("devices/<int:device_id>/", views.device_detail, name="device_detail"),
+    path("devices/<int:device_id>/series/", views.device_series, name="device_series"),
 
     path("measurements/", views.measurement_list, name="measurement_list"),
+    path("measurements/export/", views.measurement_export, name="measurement_export"),
     path("alerts/", views.alert_list, name="alert_list"),
+    path("alerts/export/", views.alert_export, name="alert_export"),
     path("alerts/week/", views.alerts_week, name="alerts_week"),
 
+    path("api/measurements/ingest/", views.measurement_ingest, name="measurement_ingest"),
+    path("api/alerts/bulk/", views.alert_bulk_action, name="alert_bulk_action"),
+    path("api/jobs/<int:job_id>/", views.job_status, name="job_status"),
+    path("api/jobs/<int:job_id>/download/", views.job_download, name="job_download"),
+
+    path("metrics", views.metrics_view, name="metrics"),
+
+    # Versiones async (ASGI) de las vistas de lectura
+    path("async/", views_async.dashboard, name="dashboard_async"),
+    path("async/devices/", views_async.device_list, name="device_list_async"),
+    path("async/devices/<int:device_id>/", views_async.device_detail, name="device_detail_async"),
+    path("async/measurements/", views_async.measurement_list, name="measurement_list_async"),
+    path("async/alerts/", views_async.alert_list, name="alert_list_async"),
+    path("async/alerts/week/", views_async.alerts_week, name="alerts_week_async"),
+    path("live/", views_async.live_stream, name="live_stream"),
+
+    path("no-org/", views.no_org_view, name="no_org"),
+
     path("login/", views.login_view, name="login"),
     path("register/", views.register_view, name="register"),
     path("logout/", views.logout_view, name="logout"),
@@ -3,22 +3,38 @@ from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, HttpResponseBadRequest
+from django.views.decorators.http import require_POST, condition
 
+import hashlib
+import json
+
+from django.conf import settings
+from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
 
 from .models import (
-    Device, Measurement, Alert, Category, Zone,
+    Device, Measurement, Alert,
     Organization,  
     Account,       
+    Job,
 )
 from .models import Account
+from .api import api_login_required
+from .tenancy import tenant_for
+from .admin import is_org_admin, is_verifier
+from . import archive, device_search, ingest, exports, jobs, live, metrics, series, stats, workflow
+from .dashboard import dashboard_data, dashboard_devices
+from .cache import cached_for_org
+from .rollups import hourly_series
+from .pagination import paginate_keyset, page_size_from, InvalidCursor
 
 def _require_org_or_redirect(request):
     # Superuser puede acceder siempre, aunque no tenga organization
     if request.user.is_superuser:
         return True
-    return hasattr(request.user, "account") and request.user.account.organization is not None
+    return tenant_for(request.user).organization is not None
 
 
 def no_org_view(request):
@@ -29,8 +45,15 @@ def no_org_view(request):
 def _user_org_or_none(user):
     if user.is_superuser:
         return None
-    acc = getattr(user, "account", None)
-    return acc.organization if acc else None
+    return tenant_for(user).organization
+
+
+def _keyset_page(request, queryset):
+    """Página por cursor (?cursor=...&size=...) ordenada por (-created_at, -id)."""
+    try:
+        return paginate_keyset(queryset, request.GET.get("cursor"), page_size_from(request))
+    except InvalidCursor:
+        return None
 
 
 
@@ -43,64 +66,20 @@ def dashboard(request):
         return redirect("no_org")
     org = _user_org_or_none(request.user)  
 
-    categories = Category.objects.all()
-    zones = Zone.objects.all()
-    if org:
-        categories = categories.filter(organization=org)
-        zones = zones.filter(organization=org)
-
-    # Devices base filtrados por org
-    devices_qs = Device.objects.select_related("category", "zone", "organization")
-    if org:
-        devices_qs = devices_qs.filter(organization=org)
-
-    devices_by_category = {c.name: devices_qs.filter(category=c).count() for c in categories}
-    devices_by_zone = {z.name: devices_qs.filter(zone=z).count() for z in zones}
-
-    # Construye el queryset, filtra (si aplica) y recién ahí corta
-    latest_measurements_qs = Measurement.objects.select_related("device").order_by("-created_at")
-    if org:
-        latest_measurements_qs = latest_measurements_qs.filter(device__organization=org)
-    latest_measurements = latest_measurements_qs[:10]
-
-    recent_alerts_qs = Alert.objects.select_related("device").order_by("-created_at")
-    if org:
-        recent_alerts_qs = recent_alerts_qs.filter(device__organization=org)
-    recent_alerts = recent_alerts_qs[:5]
-
-    # Contadores semanales por prioridad (filtra antes)
-    now = timezone.now()
-    week_ago = now - timedelta(days=7)
-    weekly_alerts_qs = Alert.objects.filter(created_at__gte=week_ago)
-    if org:
-        weekly_alerts_qs = weekly_alerts_qs.filter(device__organization=org)
-
-    grave_count = weekly_alerts_qs.filter(priority="grave").count()
-    alto_count  = weekly_alerts_qs.filter(priority="alto").count()
-    medio_count = weekly_alerts_qs.filter(priority="medio").count()
+    context = dict(cached_for_org(getattr(org, "id", None), "dashboard", lambda: dashboard_data(org)))
 
     # Filtros del grid de dispositivos del dashboard
     category_id = request.GET.get("category")
     zone_id = request.GET.get("zone")
 
-    devices = devices_qs
+    devices = dashboard_devices(org)
     if category_id and category_id != "all":
         devices = devices.filter(category_id=category_id)
     if zone_id and zone_id != "all":
         devices = devices.filter(zone_id=zone_id)
 
-    context = {
-        "devices_by_category": devices_by_category,
-        "devices_by_zone": devices_by_zone,
-        "latest_measurements": latest_measurements,
-        "recent_alerts": recent_alerts,
-        "grave_count": grave_count,
-        "alto_count": alto_count,
-        "medio_count": medio_count,
-        "categories": categories,
-        "zones": zones,
-        "devices": devices,
-    }
+    context["devices"] = devices
+    context["live"] = live.enabled(request)
     return render(request, "core/dashboard.html", context)
 
 
@@ -113,29 +92,24 @@ def device_list(request):
     
     org = _user_org_or_none(request.user)
 
-    devices = Device.objects.select_related("category", "zone", "organization").all()
-    categories = Category.objects.all()
-    zones = Zone.objects.all()
-
+    # state: última lectura y alertas abiertas materializadas (un JOIN, sin subconsultas)
+    # Sin JOIN a organization: con él SQLite arranca por esa tabla y deja de usar
+    # el índice (organization, name) para ordenar
+    devices = Device.objects.select_related("category", "zone", "state")
     if org:
         devices = devices.filter(organization=org)
-        categories = categories.filter(organization=org)
-        zones = zones.filter(organization=org)
-
-    category_id = request.GET.get("category", "all")
-    zone_id = request.GET.get("zone", "all")
-
-    if category_id != "all":
-        devices = devices.filter(category_id=category_id)
-    if zone_id != "all":
-        devices = devices.filter(zone_id=zone_id)
+    devices, ordering, selected = device_search.filter_devices(devices, request.GET, org)
+    try:
+        page = paginate_keyset(devices, request.GET.get("cursor"), page_size_from(request), ordering)
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor.")
 
     context = {
-        "devices": devices,
-        "categories": categories,
-        "zones": zones,
-        "selected_category": category_id,
-        "selected_zone": zone_id,
+        # Resumen de las últimas 24 h, en bloque para los dispositivos de la página
+        "devices": stats.attach(page),
+        "page": page,
+        "selected": selected,
+        **device_search.filter_options(org),
     }
     return render(request, "core/device_list.html", context)
 
@@ -148,17 +122,88 @@ def device_detail(request, device_id):
         base = base.filter(organization=org)
     device = get_object_or_404(base, id=device_id)
 
-    measurements = Measurement.objects.filter(device=device).order_by("-created_at")[:20]
+    measurements = list(Measurement.objects.filter(device=device).order_by("-created_at")[:20])
+    if len(measurements) < 20:
+        # Lo más viejo puede estar ya en el archivo frío
+        measurements += archive.latest(device, 20 - len(measurements))
     alerts = Alert.objects.filter(device=device).order_by("-created_at")[:10]
 
+    window = request.GET.get("window", stats.DEFAULT_WINDOW)
+    if window not in stats.WINDOWS:
+        window = stats.DEFAULT_WINDOW
+
     context = {
         "device": device,
         "measurements": measurements,
         "alerts": alerts,
+        "hourly_series": hourly_series(48, device=device),
+        "stats": stats.stats_for([device], window)[device.id],
+        "stats_window": window,
+        "stats_windows": list(stats.WINDOWS),
     }
     return render(request, "core/device_detail.html", context)
 
 
+def _series_params(request):
+    """(start, end, points, mode) del GET de device_series; ValueError si no son válidos."""
+    end = exports.parse_bound(request.GET.get("end"), end=True) or timezone.now()
+    start = exports.parse_bound(request.GET.get("start")) or end - timedelta(hours=settings.SERIES_DEFAULT_HOURS)
+    points = int(request.GET.get("points", settings.SERIES_POINTS))
+    mode = request.GET.get("mode", series.MODE_LTTB)
+    if mode not in (series.MODE_LTTB, series.MODE_MINMAX):
+        raise ValueError("Invalid mode.")
+    if start >= end:
+        raise ValueError("start must be before end.")
+    return start, end, max(3, min(points, settings.SERIES_MAX_POINTS)), mode
+
+
+def _series_etag(request, device_id):
+    # Sin organización no hay ETag: la vista responde 403 (nunca 304)
+    if not _require_org_or_redirect(request):
+        return None
+    org = _user_org_or_none(request.user)
+    devices = Device.objects.filter(id=device_id)
+    if org:
+        devices = devices.filter(organization=org)
+    try:
+        start, end, points, mode = _series_params(request)
+    except ValueError:
+        return None
+    if not devices.exists():
+        return None
+    # Sale de los datos del rango (no de una versión en memoria del proceso):
+    # igual en todos los workers. Sin ?end= la ventana avanza con el reloj: se parte por minuto
+    clock = "" if request.GET.get("end") else timezone.now().strftime("%Y%m%d%H%M")
+    raw = f"{device_id}:{request.GET.urlencode()}:{clock}:{series.fingerprint(device_id, start, end, points)}"
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+@login_required
+@condition(etag_func=_series_etag)
+def device_series(request, device_id):
+    """
+    JSON con la serie del dispositivo reducida en el servidor.
+    ?start=&end= (ISO, por defecto las últimas SERIES_DEFAULT_HOURS horas),
+    ?points= (máx. SERIES_MAX_POINTS) y ?mode=lttb|minmax.
+    """
+    if not _require_org_or_redirect(request):
+        return JsonResponse({"detail": "User has no organization."}, status=403)
+    org = _user_org_or_none(request.user)
+    base = Device.objects.all()
+    if org:
+        base = base.filter(organization=org)
+    device = get_object_or_404(base, id=device_id)
+
+    try:
+        start, end, points, mode = _series_params(request)
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc) or "Invalid parameters.")
+
+    data = series.device_series(device, start, end, points, mode)
+    data.update({"device": device.id, "start": start.isoformat(), "end": end.isoformat()})
+    return JsonResponse(data)
+
+
 @login_required
 def measurement_list(request):
 
@@ -166,10 +211,13 @@ def measurement_list(request):
         return redirect("no_org")
     
     org = _user_org_or_none(request.user)
-    measurements = Measurement.objects.select_related("device").order_by("-created_at")
+    measurements = Measurement.objects.select_related("device")
     if org:
         measurements = measurements.filter(device__organization=org)
-    return render(request, "core/measurement_list.html", {"measurements": measurements})
+    page = _keyset_page(request, measurements)
+    if page is None:
+        return HttpResponseBadRequest("Invalid cursor.")
+    return render(request, "core/measurement_list.html", {"measurements": page, "page": page})
 
 
 @login_required
@@ -179,10 +227,14 @@ def alert_list(request):
         return redirect("no_org")
     
     org = _user_org_or_none(request.user)
-    alerts = Alert.objects.select_related("device").order_by("-created_at")
+    # Las alertas de dispositivos borrados (lógicamente) no se listan
+    alerts = Alert.objects.select_related("device").filter(device__deleted_at__isnull=True)
     if org:
         alerts = alerts.filter(device__organization=org)
-    return render(request, "core/alert_list.html", {"alerts": alerts})
+    page = _keyset_page(request, alerts)
+    if page is None:
+        return HttpResponseBadRequest("Invalid cursor.")
+    return render(request, "core/alert_list.html", {"alerts": page, "page": page})
 
 
 @login_required
@@ -194,10 +246,214 @@ def alerts_week(request):
     org = _user_org_or_none(request.user)
     today = timezone.now()
     week_ago = today - timedelta(days=7)
-    alerts = Alert.objects.filter(created_at__gte=week_ago).order_by("-created_at")
+    alerts = Alert.objects.select_related("device").filter(
+        created_at__gte=week_ago, device__deleted_at__isnull=True,
+    )
+    if org:
+        alerts = alerts.filter(device__organization=org)
+    page = _keyset_page(request, alerts)
+    if page is None:
+        return HttpResponseBadRequest("Invalid cursor.")
+    return render(request, "core/alerts_week.html", {"alerts": page, "page": page})
+
+
+
+# EXPORTACIÓN (CSV / NDJSON en streaming)
+
+def _export(request, queryset, filename, archived_devices=None):
+    """
+    archived_devices: dispositivos cuyo archivo frío se emite antes de las filas vivas.
+    Con ?background=1 se encola un Job "export" y se responde 202 con su estado.
+    """
+    fmt = request.GET.get("format", exports.FORMAT_CSV)
+    if fmt not in (exports.FORMAT_CSV, exports.FORMAT_NDJSON):
+        return HttpResponseBadRequest("Invalid format.")
+    try:
+        queryset, extra_rows = exports.export_rows(queryset, request.GET, archived_devices)
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+    if request.GET.get("background"):
+        params = request.GET.copy()
+        params.pop("background")
+        job = jobs.enqueue(
+            "export",
+            {"model": queryset.model._meta.model_name, "query": params.urlencode(), "format": fmt},
+            organization=_user_org_or_none(request.user),
+            user=request.user,
+        )
+        return JsonResponse(_job_json(job), status=202)
+    return exports.export_response(queryset, fmt, filename, extra_rows)
+
+
+@login_required
+def measurement_export(request):
+
+    if not _require_org_or_redirect(request):
+        return redirect("no_org")
+
+    org = _user_org_or_none(request.user)
+    measurements = Measurement.objects.all()
+    devices = Device.objects.all()
+    if org:
+        measurements = measurements.filter(device__organization=org)
+        devices = devices.filter(organization=org)
+    return _export(request, measurements, "measurements", archived_devices=devices)
+
+
+@login_required
+def alert_export(request):
+
+    if not _require_org_or_redirect(request):
+        return redirect("no_org")
+
+    org = _user_org_or_none(request.user)
+    alerts = Alert.objects.all()
     if org:
         alerts = alerts.filter(device__organization=org)
-    return render(request, "core/alerts_week.html", {"alerts": alerts})
+    return _export(request, alerts, "alerts")
+
+
+
+# API: ingesta masiva de mediciones
+
+@api_login_required
+@require_POST
+def measurement_ingest(request):
+    """
+    Recibe lotes de lecturas en NDJSON (una por línea) o CSV con columnas
+    device,value[,created_at]. Responde cuántas se aceptaron y los rechazos por fila.
+    """
+    user = request.user
+    if not (user.is_superuser or is_org_admin(user)):
+        return JsonResponse({"detail": "Permission denied."}, status=403)
+    org = _user_org_or_none(user)
+    if not user.is_superuser and org is None:
+        return JsonResponse({"detail": "User has no organization."}, status=403)
+
+    # Payload demasiado grande: se rechaza por Content-Length antes de leerlo
+    try:
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        length = 0
+    limit = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+    if limit is not None and length > limit:
+        return JsonResponse({"detail": f"Payload too large (max {limit} bytes)."}, status=413)
+
+    fmt = ingest.detect_format(request.content_type, request.GET.get("format"))
+    try:
+        result = ingest.ingest(request.body, fmt, org=org)
+    except ingest.IngestError as exc:
+        return JsonResponse({"detail": str(exc)}, status=400)
+    return JsonResponse(result)
+
+
+# API: acciones masivas sobre alertas (por filtro)
+
+@api_login_required
+@require_POST
+def alert_bulk_action(request):
+    """
+    Body JSON: {"action": "acknowledge|escalate|snooze|close", "filter": {...},
+    "snooze_minutes": n, "cursor": n}. Ver workflow.filter_alerts para los
+    filtros. Responde {"updated": n, "done": bool, "cursor": n}; con done=false
+    se repite el mismo request con el "cursor" recibido.
+    """
+    user = request.user
+    if not (user.is_superuser or is_org_admin(user) or is_verifier(user)):
+        return JsonResponse({"detail": "Permission denied."}, status=403)
+    org = _user_org_or_none(user)
+    if not user.is_superuser and org is None:
+        return JsonResponse({"detail": "User has no organization."}, status=403)
+
+    try:
+        payload = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"detail": "Invalid JSON."}, status=400)
+    if not isinstance(payload, dict) or "filter" not in payload:
+        return JsonResponse({"detail": "Body must include 'action' and 'filter'."}, status=400)
+
+    alerts = Alert.objects.all() if org is None else Alert.objects.filter(device__organization=org)
+    action = payload.get("action")
+    cursor = payload.get("cursor", 0)
+    if isinstance(cursor, bool) or not isinstance(cursor, int) or cursor < 0:
+        return JsonResponse({"detail": "Invalid cursor."}, status=400)
+    until = None
+    if action == workflow.SNOOZE:
+        try:
+            until = timezone.now() + timedelta(minutes=float(payload.get("snooze_minutes", 60)))
+        except (TypeError, ValueError):
+            return JsonResponse({"detail": "Invalid snooze_minutes."}, status=400)
+    try:
+        alerts = workflow.filter_alerts(alerts, payload["filter"])
+        if payload.get("background"):
+            if action not in workflow.ACTIONS:
+                raise workflow.WorkflowError(f"Unknown action: {action}")
+            job = jobs.enqueue(
+                "alert_action",
+                {"action": action, "filter": payload["filter"], "until": until.isoformat() if until else None},
+                organization=org,
+                user=user,
+            )
+            return JsonResponse(_job_json(job), status=202)
+        updated, cursor, done = workflow.apply(action, alerts, user=user, until=until, after=cursor)
+    except workflow.WorkflowError as exc:
+        return JsonResponse({"detail": str(exc)}, status=400)
+    return JsonResponse({"action": action, "updated": updated, "done": done, "cursor": cursor})
+
+
+# API: estado de trabajos en segundo plano (core/jobs.py)
+
+def _job_json(job):
+    data = {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "total": job.total,
+        "percent": job.percent,
+        "message": job.message,
+        "attempts": job.attempts,
+        "result": job.result,
+        "status_url": reverse("job_status", args=[job.id]),
+    }
+    if job.kind == "export" and job.status == Job.Status.DONE:
+        data["download_url"] = reverse("job_download", args=[job.id])
+    return data
+
+
+def _visible_job(request, job_id):
+    jobs_qs = Job.objects.all()
+    if not request.user.is_superuser:
+        org = _user_org_or_none(request.user)
+        if org is None:
+            raise Http404
+        jobs_qs = jobs_qs.filter(organization=org)
+    return get_object_or_404(jobs_qs, id=job_id)
+
+
+@api_login_required
+def job_status(request, job_id):
+    return JsonResponse(_job_json(_visible_job(request, job_id)))
+
+
+@api_login_required
+def job_download(request, job_id):
+    job = _visible_job(request, job_id)
+    path = jobs.export_path(job)
+    if job.kind != "export" or job.status != Job.Status.DONE or not path.exists():
+        raise Http404
+    model = job.payload.get("model", "export")
+    return FileResponse(open(path, "rb"), as_attachment=True, filename=f"{model}s{path.suffix}")
+
+
+
+# MÉTRICAS (formato Prometheus, solo staff)
+
+@api_login_required
+def metrics_view(request):
+    if not request.user.is_staff:
+        return JsonResponse({"detail": "Permission denied."}, status=403)
+    return HttpResponse(metrics.registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 
@@ -0,0 +1,185 @@
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.shortcuts import render, redirect
+from django.utils import timezone
+
+from . import archive, device_search, live, stats
+from .cache import acached_for_org
+from .dashboard import adashboard_data, dashboard_devices
+from .models import Device, Measurement, Alert
+from .pagination import apaginate_keyset, page_size_from, InvalidCursor
+from .rollups import ahourly_series
+from .tenancy import tenant_for
+
+
+# ===============================
+# Versiones async (ASGI) de las vistas protegidas
+# ===============================
+# Mismas plantillas y mismo scoping que views.py, con el ORM async. Todo se
+# materializa antes de render() para que la plantilla no toque la base.
+# Nota: Django ejecuta el ORM async en un único executor thread-sensitive (una
+# conexión por request): las consultas de una vista corren una detrás de otra,
+# no en paralelo, y por eso se esperan en secuencia. Estas vistas sirven para
+# no bloquear el event loop (p. ej. junto al stream SSE), no para bajar la
+# latencia de un request.
+
+async def _org_or_redirect(request):
+    """(org, None) o (None, redirect). org=None para superuser."""
+    user = await request.auser()
+    if user.is_superuser:
+        return None, None
+    tenant = getattr(request, "tenant", None) or await sync_to_async(tenant_for)(user)
+    if tenant.organization is None:
+        return None, redirect("no_org")
+    return tenant.organization, None
+
+
+async def _as_list(queryset):
+    return [obj async for obj in queryset]
+
+
+@login_required
+async def dashboard(request):
+    org, response = await _org_or_redirect(request)
+    if response:
+        return response
+
+    category_id = request.GET.get("category")
+    zone_id = request.GET.get("zone")
+    devices = dashboard_devices(org)
+    if category_id and category_id != "all":
+        devices = devices.filter(category_id=category_id)
+    if zone_id and zone_id != "all":
+        devices = devices.filter(zone_id=zone_id)
+
+    data = await acached_for_org(getattr(org, "id", None), "dashboard", lambda: adashboard_data(org))
+    devices = await _as_list(devices)
+    context = dict(data)
+    context["devices"] = devices
+    context["live"] = live.enabled(request)
+    return render(request, "core/dashboard.html", context)
+
+
+@login_required
+async def device_list(request):
+    org, response = await _org_or_redirect(request)
+    if response:
+        return response
+
+    # state: última lectura y alertas abiertas materializadas (un JOIN, sin subconsultas)
+    devices = Device.objects.select_related("category", "zone", "state")
+    if org:
+        devices = devices.filter(organization=org)
+    devices, ordering, selected = device_search.filter_devices(devices, request.GET, org)
+    try:
+        page = await apaginate_keyset(devices, request.GET.get("cursor"), page_size_from(request), ordering)
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor.")
+    options = await sync_to_async(device_search.filter_options)(org)
+    context = {
+        "devices": await sync_to_async(stats.attach)(page),
+        "page": page,
+        "selected": selected,
+        **options,
+    }
+    return render(request, "core/device_list.html", context)
+
+
+@login_required
+async def device_detail(request, device_id):
+    org, response = await _org_or_redirect(request)
+    if response:
+        return response
+
+    base = Device.objects.select_related("category", "zone", "organization")
+    if org:
+        base = base.filter(organization=org)
+    device = await base.filter(id=device_id).afirst()
+    if device is None:
+        raise Http404("No Device matches the given query.")
+
+    measurements = await _as_list(Measurement.objects.filter(device=device).order_by("-created_at")[:20])
+    alerts = await _as_list(Alert.objects.filter(device=device).order_by("-created_at")[:10])
+    hourly = await ahourly_series(48, device=device)
+    if len(measurements) < 20:
+        measurements += await sync_to_async(archive.latest, thread_sensitive=False)(device, 20 - len(measurements))
+    window = request.GET.get("window", stats.DEFAULT_WINDOW)
+    if window not in stats.WINDOWS:
+        window = stats.DEFAULT_WINDOW
+    device_stats = await sync_to_async(stats.stats_for)([device], window)
+    context = {
+        "device": device,
+        "measurements": measurements,
+        "alerts": alerts,
+        "hourly_series": hourly,
+        "stats": device_stats[device.id],
+        "stats_window": window,
+        "stats_windows": list(stats.WINDOWS),
+    }
+    return render(request, "core/device_detail.html", context)
+
+
+async def _listing(request, queryset, template, name):
+    try:
+        page = await apaginate_keyset(queryset, request.GET.get("cursor"), page_size_from(request))
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor.")
+    return render(request, template, {name: page, "page": page})
+
+
+@login_required
+async def measurement_list(request):
+    org, response = await _org_or_redirect(request)
+    if response:
+        return response
+    measurements = Measurement.objects.select_related("device")
+    if org:
+        measurements = measurements.filter(device__organization=org)
+    return await _listing(request, measurements, "core/measurement_list.html", "measurements")
+
+
+@login_required
+async def alert_list(request):
+    org, response = await _org_or_redirect(request)
+    if response:
+        return response
+    # Las alertas de dispositivos borrados (lógicamente) no se listan
+    alerts = Alert.objects.select_related("device").filter(device__deleted_at__isnull=True)
+    if org:
+        alerts = alerts.filter(device__organization=org)
+    return await _listing(request, alerts, "core/alert_list.html", "alerts")
+
+
+@login_required
+async def alerts_week(request):
+    org, response = await _org_or_redirect(request)
+    if response:
+        return response
+    week_ago = timezone.now() - timedelta(days=7)
+    alerts = Alert.objects.select_related("device").filter(
+        created_at__gte=week_ago, device__deleted_at__isnull=True,
+    )
+    if org:
+        alerts = alerts.filter(device__organization=org)
+    return await _listing(request, alerts, "core/alerts_week.html", "alerts")
+
+
+@login_required
+async def live_stream(request):
+    """
+    Server-Sent Events con las Measurement/Alert nuevas de la organización.
+    Solo bajo ASGI y con ASGI_LIVE: si no, 204 (EventSource deja de reconectar).
+    """
+    if not live.enabled(request):
+        return HttpResponse(status=204)
+    org, response = await _org_or_redirect(request)
+    if response:
+        return response
+    return StreamingHttpResponse(
+        live.event_stream(getattr(org, "id", None)),
+        content_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
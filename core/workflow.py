@@ -0,0 +1,162 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from .models import Alert, AlertAudit
+from .cache import invalidate_org
+from . import device_state
+from .exports import parse_bound
+
+
+# ===============================
+# Acciones masivas sobre alertas
+# ===============================
+# acknowledge / escalate / snooze / close sobre un queryset (filas marcadas en
+# el admin, "seleccionar todas" o un filtro de la API). Se avanza por id en
+# bloques de ALERT_ACTION_CHUNK_SIZE: cada bloque es un UPDATE por conjunto más
+# un bulk_create en AlertAudit, en su propia transacción. Pasado
+# ALERT_ACTION_TIME_BUDGET se corta y se informa done=False junto con el cursor
+# (último id procesado): la siguiente llamada con after=cursor sigue desde ahí.
+# El cursor es lo que evita volver a escalar las alertas ya escaladas (siguen
+# siendo escalables) o volver a posponer las ya pospuestas.
+
+ACKNOWLEDGE = AlertAudit.Action.ACKNOWLEDGE
+ESCALATE = AlertAudit.Action.ESCALATE
+SNOOZE = AlertAudit.Action.SNOOZE
+CLOSE = AlertAudit.Action.CLOSE
+
+ACTIONS = [ACKNOWLEDGE, ESCALATE, SNOOZE, CLOSE]
+
+NEXT_PRIORITY = {"medio": "alto", "alto": "grave"}
+
+FILTER_KEYS = {"ids", "priority", "device", "zone", "category", "acknowledged", "older_than_hours", "before"}
+
+
+class WorkflowError(Exception):
+    """Acción o filtro inválido (se responde 400)."""
+
+
+def eligible(action, queryset, until=None):
+    """Las alertas del queryset a las que la acción todavía les cambia algo."""
+    if action == ACKNOWLEDGE:
+        return queryset.filter(acknowledged=False)
+    if action == ESCALATE:
+        return queryset.filter(closed_at__isnull=True, priority__in=list(NEXT_PRIORITY))
+    if action == SNOOZE and until is not None:
+        return queryset.filter(Q(snoozed_until__isnull=True) | Q(snoozed_until__lt=until), closed_at__isnull=True)
+    return queryset.filter(closed_at__isnull=True)
+
+
+def _changes(action, now, until):
+    if action == ACKNOWLEDGE:
+        return {"acknowledged": True}
+    if action == ESCALATE:
+        whens = [When(priority=old, then=Value(new)) for old, new in NEXT_PRIORITY.items()]
+        return {"priority": Case(*whens, default=F("priority"))}
+    if action == SNOOZE:
+        return {"snoozed_until": until}
+    return {"acknowledged": True, "closed_at": now, "snoozed_until": None}
+
+
+def _detail(action, priority, until):
+    if action == ESCALATE:
+        return f"{priority} -> {NEXT_PRIORITY[priority]}"
+    if action == SNOOZE:
+        return f"hasta {until:%Y-%m-%d %H:%M}"
+    return ""
+
+
+def apply(action, queryset, user=None, until=None, chunk_size=None, time_budget=None, after=0):
+    """
+    Ejecuta la acción sobre las alertas del queryset con id > after. `until` es
+    obligatorio para snooze. Devuelve (alertas modificadas, cursor, done): si
+    done es False, se continúa llamando de nuevo con after=cursor.
+    """
+    if action not in ACTIONS:
+        raise WorkflowError(f"Unknown action: {action}")
+    if action == SNOOZE and until is None:
+        raise WorkflowError("Snooze needs an end time.")
+    chunk_size = chunk_size or settings.ALERT_ACTION_CHUNK_SIZE
+    time_budget = settings.ALERT_ACTION_TIME_BUDGET if time_budget is None else time_budget
+    deadline = time.monotonic() + time_budget
+
+    pending = eligible(action, queryset, until).order_by("id")
+    user_id = getattr(user, "id", None)
+    updated, last_id, org_ids = 0, int(after or 0), set()
+    try:
+        # Al menos un bloque por llamada, aunque el presupuesto sea mínimo
+        while True:
+            with transaction.atomic():
+                rows = list(
+                    pending.filter(id__gt=last_id).select_for_update(of=("self",))
+                    .values_list("id", "priority", "device__organization_id", "device_id")[:chunk_size]
+                )
+                if not rows:
+                    break
+                now = timezone.now()
+                ids = [row[0] for row in rows]
+                Alert.objects.filter(id__in=ids).update(**_changes(action, now, until))
+                AlertAudit.objects.bulk_create(
+                    [
+                        AlertAudit(alert_id=alert_id, action=action, user_id=user_id,
+                                   detail=_detail(action, priority, until), created_at=now)
+                        for alert_id, priority, _, _ in rows
+                    ],
+                    batch_size=chunk_size,
+                )
+                if action != SNOOZE:
+                    # Cambian las alertas abiertas (o su prioridad) de esos dispositivos
+                    device_state.refresh_alerts({row[3] for row in rows})
+            last_id = ids[-1]
+            updated += len(rows)
+            org_ids.update(row[2] for row in rows)
+            if time.monotonic() >= deadline:
+                break
+    finally:
+        invalidate_org(*org_ids)
+    return updated, last_id, not pending.filter(id__gt=last_id).exists()
+
+
+def filter_alerts(queryset, params):
+    """
+    Filtros de la API sobre un queryset de Alert. params es un dict (JSON):
+    ids, priority (str o lista), device, zone, category, acknowledged (true/false),
+    older_than_hours, before (fecha o fecha/hora ISO). Hace falta al menos un
+    filtro, o "all": true para actuar sobre todas las alertas visibles.
+    Lanza WorkflowError con valores inválidos o claves desconocidas.
+    """
+    if not isinstance(params, dict):
+        raise WorkflowError("'filter' must be an object.")
+    unknown = set(params) - FILTER_KEYS - {"all"}
+    if unknown:
+        raise WorkflowError(f"Unknown filter: {', '.join(sorted(unknown))}.")
+    if not set(params) & FILTER_KEYS and params.get("all") is not True:
+        raise WorkflowError("'filter' needs at least one condition, or \"all\": true.")
+    try:
+        if "ids" in params:
+            queryset = queryset.filter(id__in=[int(i) for i in params["ids"]])
+        if "priority" in params:
+            priorities = params["priority"] if isinstance(params["priority"], list) else [params["priority"]]
+            if not set(priorities) <= {p for p, _ in Alert.PRIORITY_CHOICES}:
+                raise WorkflowError("Invalid priority.")
+            queryset = queryset.filter(priority__in=priorities)
+        for key, lookup in (("device", "device_id"), ("zone", "device__zone_id"), ("category", "device__category_id")):
+            if key in params:
+                queryset = queryset.filter(**{lookup: int(params[key])})
+        if "acknowledged" in params:
+            # Solo booleanos JSON: bool("false") sería True
+            if not isinstance(params["acknowledged"], bool):
+                raise WorkflowError("'acknowledged' must be true or false.")
+            queryset = queryset.filter(acknowledged=params["acknowledged"])
+        if "older_than_hours" in params:
+            hours = float(params["older_than_hours"])
+            queryset = queryset.filter(created_at__lt=timezone.now() - timedelta(hours=hours))
+        if params.get("before"):
+            queryset = queryset.filter(created_at__lt=parse_bound(str(params["before"])))
+    except (TypeError, ValueError):
+        raise WorkflowError("Invalid filter value.")
+    return queryset